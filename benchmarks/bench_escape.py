@@ -0,0 +1,75 @@
+"""Compare escaping and parsing the decoded text with the byte-level pipeline.
+
+The text pipeline is what get_domain_objects did before: decode the body,
+escape the illegal &-characters with re.sub on the str and parse the str.
+"""
+
+import re
+import time
+import tracemalloc
+
+from fixtures import load_fixture
+
+from haanna import Haanna
+from haanna.stream import escape_ampersands
+from haanna.xmlbackend import get_backend
+
+SCALE = 200
+HISTORY = 20
+ROUNDS = 5
+
+
+def text_pipeline(body, backend):
+    """Decode, escape and parse the str."""
+    text = body.decode("utf-8")
+    text = re.sub(r"&([^a-zA-Z#])", r"&amp;\1", text)
+    return get_backend(backend).fromstring(text)
+
+
+def bytes_pipeline(body, backend):
+    """Escape and parse the bytes."""
+    return Haanna.parse_xml(body, backend)
+
+
+def measure(pipeline, body, backend):
+    """Get the best seconds and the peak allocation of a pipeline."""
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        pipeline(body, backend)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    root = pipeline(body, backend)
+    dummy, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del root
+    return best, peak
+
+
+def main():
+    """Run both pipelines on a clean and a dirty multi-MB body."""
+    clean = load_fixture("anna_domain_objects", SCALE, HISTORY).encode()
+    dirty = clean.replace(b"<name>Anna</name>", b"<name>Anna & Co</name>")
+    backends = ["etree"]
+    try:
+        get_backend("lxml")
+        backends.append("lxml")
+    except ImportError:
+        pass
+    for label, body in (("clean", clean), ("dirty", dirty)):
+        start = time.perf_counter()
+        escape_ampersands(body)
+        print("{} body {:.1f} MB, escaping the bytes {:.2f} ms".format(
+            label, len(body) / 1e6, (time.perf_counter() - start) * 1000
+        ))
+        for backend in backends:
+            for name, pipeline in (("text", text_pipeline), ("bytes", bytes_pipeline)):
+                seconds, peak = measure(pipeline, body, backend)
+                print("  {:<6} {:<6} {:8.1f} ms {:8.1f} MB/s {:8.1f} MB peak".format(
+                    backend, name, seconds * 1000, len(body) / seconds / 1e6, peak / 1e6
+                ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Compare a serial sweep over 100 gateways with the fleet poller."""
+
+import time
+
+from haanna import Haanna, HaannaFleet
+from haanna.emulator import SmileEmulator, serve_fleet, stop_fleet
+
+GATEWAYS = 100
+LATENCY = 0.05
+SLOW_LATENCY = 3
+DEADLINE = 1
+
+
+def main():
+    """Serve 99 regular and 1 slow emulated gateway and sweep them both ways."""
+    emulators = serve_fleet(GATEWAYS - 1, latency=LATENCY)
+    emulators.append(SmileEmulator.from_fixture(latency=SLOW_LATENCY).start())
+    configs = [
+        emulator.config("gw{}".format(index))
+        for index, emulator in enumerate(emulators)
+    ]
+
+    start = time.perf_counter()
+    failed = 0
+    for config in configs:
+        config = dict(config)
+        del config["name"]
+        with Haanna(timeout=DEADLINE, **config) as anna:
+            try:
+                anna.get_domain_objects()
+            except OSError:
+                failed += 1
+    serial = time.perf_counter() - start
+    print("serial sweep      {:6.2f} s ({} failed)".format(serial, failed))
+
+    with HaannaFleet(configs, max_workers=32, deadline=DEADLINE) as fleet:
+        start = time.perf_counter()
+        results = fleet.poll()
+        parallel = time.perf_counter() - start
+        failed = sum(1 for result in results.values() if not result.ok)
+        print("fleet sweep       {:6.2f} s ({} failed)".format(parallel, failed))
+    print("speedup: {:.1f}x".format(serial / parallel))
+    stop_fleet(emulators)
+
+
+if __name__ == "__main__":
+    main()
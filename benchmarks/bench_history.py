@@ -0,0 +1,63 @@
+"""Compare per-element dateutil parsing of a week of point log history with iter_history."""
+
+import time
+
+from dateutil.parser import parse
+from fixtures import load_fixture
+
+from haanna import Haanna
+from haanna.history import iter_history
+
+HISTORY = 24 * 7
+LOG_TYPES = ("temperature", "boiler_temperature", "central_heater_water_pressure")
+ROUNDS = 3
+CHUNK_SIZE = 16384
+
+
+def tree_history(text):
+    """Parse the whole tree and every timestamp with dateutil into lists."""
+    series = {}
+    root = Haanna.parse_xml(text)
+    for point_log in root.iter("point_log"):
+        if point_log.findtext("type") not in LOG_TYPES:
+            continue
+        timestamps, values = series.setdefault(point_log.attrib["id"], ([], []))
+        for measurement in point_log.iterfind("period/measurement"):
+            timestamps.append(parse(measurement.attrib["log_date"]))
+            values.append(float(measurement.text))
+    return series
+
+
+def streamed_history(body):
+    """Collect the same series page by page into arrays."""
+    chunks = (body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+    return list(iter_history(chunks, LOG_TYPES))
+
+
+def bench(label, call):
+    """Get the best time of ROUNDS calls."""
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        call()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("{:<16} {:8.1f} ms".format(label, best * 1000))
+    return best
+
+
+def main():
+    """Run both variants on a fixture with a week of hourly measurements."""
+    text = load_fixture("anna_domain_objects", history=HISTORY)
+    body = text.encode()
+    pages = streamed_history(body)
+    print("fixture: {} kB, {} measurements".format(
+        len(body) // 1024, sum(len(page) for page in pages)
+    ))
+    old = bench("tree + dateutil", lambda: tree_history(text))
+    new = bench("iter_history", lambda: streamed_history(body))
+    print("speedup: {:.2f}x".format(old / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Compare the parse throughput of this process with the parse offload per worker count."""
+
+import os
+import time
+
+from fixtures import load_fixture
+
+from haanna import Haanna, ParseOffload
+
+RESPONSES = 64
+SCALE = 50
+BATCH_SIZE = 8
+
+
+def main():
+    """Parse RESPONSES large domain objects into states, in this process and in 1..N workers."""
+    data = load_fixture("anna_domain_objects", SCALE).encode()
+    payloads = [(data, False)] * RESPONSES
+    print("{} responses of {} kB, {} cores".format(
+        RESPONSES, len(data) // 1024, os.cpu_count()))
+
+    anna = Haanna("smile", "x", "127.0.0.1", 80)
+    start = time.perf_counter()
+    for dummy in range(RESPONSES):
+        anna.get_state(anna.parse_xml(data, anna.xml_backend))
+    serial = RESPONSES / (time.perf_counter() - start)
+    print("in process        {:7.1f} responses/s".format(serial))
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        with ParseOffload(max_workers=workers, batch_size=BATCH_SIZE) as offload:
+            # Start the workers before timing
+            offload.map(payloads[:workers * BATCH_SIZE])
+            start = time.perf_counter()
+            offload.map(payloads)
+            throughput = RESPONSES / (time.perf_counter() - start)
+        print("{:2d} workers        {:7.1f} responses/s ({:.1f}x)".format(
+            workers, throughput, throughput / serial))
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Compare a warm start from the saved snapshot with parsing a large gateway."""
+
+import os
+import tempfile
+import time
+
+from fixtures import load_fixture
+
+from haanna import Haanna
+
+SCALE = 50
+ROUNDS = 20
+
+
+def best(call):
+    """Get the best seconds of ROUNDS calls."""
+    times = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Save the values of a large gateway once and time loading them."""
+    data = load_fixture("anna_domain_objects", SCALE).encode()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "anna.snapshot")
+        anna = Haanna("smile", "x", "127.0.0.1", 80, snapshot_path=path)
+        anna.save_snapshot(anna.parse_xml(data, anna.xml_backend))
+        parse = best(lambda: anna.get_state(anna.parse_xml(data, anna.xml_backend)))
+        load = best(anna.load_snapshot)
+        print("response {:6d} kB  snapshot {:6d} B".format(
+            len(data) // 1024, os.path.getsize(path)))
+    print("parse and get_state {:8.3f} ms".format(parse * 1000))
+    print("load_snapshot       {:8.3f} ms ({:.0f}x)".format(load * 1000, parse / load))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compare fixed-interval polling with the adaptive UpdatePoller on an emulated gateway.
+
+The gateway changes twice: once through a setter and once through another
+client (e.g. the app switching the preset). Time is scaled down, 1 s stands for a minute.
+"""
+
+import threading
+import time
+
+from haanna import Haanna, Metrics, UpdatePoller
+from haanna.diff import ChangeTracker
+from haanna.emulator import SmileEmulator
+
+DURATION = 12
+SETTER_AT = 3
+EXTERNAL_AT = 8
+FIXED_INTERVAL = 0.5
+MIN_INTERVAL = 0.25
+MAX_INTERVAL = 4
+PROBE_INTERVAL = 1
+
+
+def scenario(anna, other, changed):
+    """Change the gateway through a setter, then through another client."""
+    start = time.monotonic()
+    time.sleep(SETTER_AT)
+    changed["setter"] = time.monotonic()
+    anna.set_temperature(anna.get_domain_objects(), 21.0)
+    time.sleep(start + EXTERNAL_AT - time.monotonic())
+    changed["external"] = time.monotonic()
+    other.set_preset(other.get_domain_objects(), "away")
+
+
+def observe(changes, changed, seen):
+    """Note when each change of the scenario was first seen."""
+    now = time.monotonic()
+    if "target_temperature" in changes.state and "setter" in changed:
+        seen.setdefault("setter", now)
+    if "current_preset" in changes.state and "external" in changed:
+        seen.setdefault("external", now)
+
+
+def fixed(anna, changed, seen, stop):
+    """Fetch on a fixed interval."""
+    tracker = ChangeTracker(anna)
+    while not stop.wait(FIXED_INTERVAL):
+        observe(tracker.update(anna.get_domain_objects()), changed, seen)
+
+
+def adaptive(anna, changed, seen, stop):
+    """Fetch with the adaptive poller."""
+    poller = UpdatePoller(
+        anna, MIN_INTERVAL, MAX_INTERVAL, probe_interval=PROBE_INTERVAL
+    )
+
+    def stopper():
+        stop.wait()
+        poller.stop()
+
+    threading.Thread(target=stopper, daemon=True).start()
+    poller.run(lambda changes: observe(changes, changed, seen))
+
+
+def run(label, poll):
+    """Run the scenario with a polling strategy and print its cost and latency."""
+    metrics = Metrics()
+    changed, seen = {}, {}
+    stop = threading.Event()
+    with SmileEmulator.from_fixture() as emulator, Haanna(
+        metrics=metrics, **emulator.config()
+    ) as anna, Haanna(**emulator.config()) as other:
+        thread = threading.Thread(target=poll, args=(anna, changed, seen, stop))
+        thread.start()
+        scenario(anna, other, changed)
+        time.sleep(DURATION - EXTERNAL_AT)
+        stop.set()
+        thread.join()
+    requests = {
+        endpoint: summary.count for endpoint, summary in metrics.requests.items()
+    }
+    latency = {
+        name: "{:.2f} s".format(seen[name] - changed[name]) if name in seen else "missed"
+        for name in ("setter", "external")
+    }
+    print("{:<10} fetches {:3d}  probes {:3d}  setter {}  external {}".format(
+        label,
+        requests.get("/core/domain_objects", 0),
+        requests.get("/ping", 0),
+        latency["setter"],
+        latency["external"],
+    ))
+
+
+def main():
+    """Run both strategies."""
+    run("fixed", fixed)
+    run("adaptive", adaptive)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare the dateutil + sort last-active schema lookup with the rule index."""
+
+import datetime
+import time
+
+from dateutil.parser import parse
+from fixtures import load_fixture
+
+from haanna import Haanna
+from haanna.snapshot import DomainSnapshot
+
+SCALE = 150
+TREES = 10
+ROUNDS = 5
+
+
+def sorted_last_active_name(root, schema_ids):
+    """Find the last modified schema the way the getter did before the rule index."""
+    schemas = {}
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    rules = DomainSnapshot.of(root).rules
+    for schema_id in schema_ids:
+        schema_name = rules[schema_id].find("name").text
+        schema_date = rules[schema_id].find("modified_date").text
+        schemas[schema_name] = (parse(schema_date) - epoch).total_seconds()
+    return sorted(schemas.items(), key=lambda kv: kv[1])[-1][0]
+
+
+def bench(label, lookup, text):
+    """Time the lookup on fresh trees, so the rule index is built in the lookup."""
+    best = None
+    for _ in range(ROUNDS):
+        trees = [Haanna.parse_xml(text) for _ in range(TREES)]
+        ids = [list(DomainSnapshot.of(root).rules) for root in trees]
+        start = time.perf_counter()
+        for root, schema_ids in zip(trees, ids):
+            name = lookup(root, schema_ids)
+        elapsed = (time.perf_counter() - start) / TREES
+        best = elapsed if best is None else min(best, elapsed)
+    print("{:<16} {:8.3f} ms/lookup ({})".format(label, best * 1000, name))
+    return best
+
+
+def main():
+    """Run both lookups over a gateway with hundreds of rules."""
+    text = load_fixture("anna_domain_objects", SCALE)
+    rules = len(DomainSnapshot.of(Haanna.parse_xml(text)).rules)
+    print("rules: {}".format(rules))
+    old = bench("dateutil + sort", sorted_last_active_name, text)
+    new = bench("rule index", Haanna.get_last_active_name, text)
+    print("speedup: {:.2f}x".format(old / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Compare per-request latency of one-shot requests against the pooled session."""
+
+import time
+
+import requests
+
+from haanna import Haanna
+from haanna.emulator import SmileEmulator
+
+BODY = b"<domain_objects><gateway id='0'/></domain_objects>"
+ROUNDS = 500
+
+
+def bench(label, call):
+    """Run the call ROUNDS times and print the mean latency."""
+    call()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        call()
+    elapsed = time.perf_counter() - start
+    print("{:<24} {:8.3f} ms/request".format(label, elapsed / ROUNDS * 1000))
+    return elapsed
+
+
+def main():
+    """Start an emulated gateway and run both variants against it."""
+    with SmileEmulator(BODY) as emulator:
+        url = "http://{}:{}/core/domain_objects".format(emulator.host, emulator.port)
+
+        one_shot = bench(
+            "requests.get", lambda: requests.get(url, auth=("smile", "x"), timeout=10)
+        )
+        with Haanna(**emulator.config()) as anna:
+            pooled = bench("Haanna pooled session", anna.get_domain_objects)
+    print("speedup: {:.2f}x".format(one_shot / pooled))
+
+
+if __name__ == "__main__":
+    main()
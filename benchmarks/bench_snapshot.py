@@ -0,0 +1,112 @@
+"""Compare a full HA update with per-getter XPath scans against the snapshot index."""
+
+import time
+import xml.etree.ElementTree as Etree
+
+from fixtures import load_fixture
+
+from haanna import Haanna
+
+SCALE = 50
+TREES = 20
+ROUNDS = 5
+
+LOG_TYPES = (
+    "schedule_temperature",
+    "temperature",
+    "target_temperature",
+    "thermostat",
+    "outdoor_temperature",
+    "illuminance",
+    "boiler_temperature",
+    "central_heater_water_pressure",
+)
+STATES = (
+    ("thermostat", "schedule_state"),
+    ("thermostat", "preset_state"),
+    ("heater_central", "boiler_state"),
+    ("heater_central", "central_heating_state"),
+    ("heater_central", "cooling_state"),
+    ("heater_central", "domestic_hot_water_state"),
+)
+
+
+def xpath_update(root):
+    """Read the values the way the getters did before the snapshot index."""
+    values = []
+    for log_type in LOG_TYPES:
+        locator = (
+            "module/services/*[@log_type='" + log_type + "']/functionalities/point_log"
+        )
+        if root.find(locator) is not None:
+            point_log_id = root.find(locator).attrib["id"]
+            locator = "*/logs/point_log[@id='" + point_log_id + "']/period/measurement"
+            if root.find(locator) is not None:
+                values.append(root.find(locator).text)
+    for appliance_type, log_type in STATES:
+        locator = (
+            "appliance[type='" + appliance_type + "']/logs/point_log[type='"
+            + log_type
+            + "']/period/measurement"
+        )
+        if root.find(locator) is not None:
+            values.append(root.find(locator).text)
+    tag = "zone_preset_based_on_time_and_presence_with_override"
+    for rule in root.findall("rule"):
+        if rule.find("template").attrib["tag"] == tag:
+            if root.find("rule[@id='" + rule.attrib["id"] + "']/active").text == "true":
+                values.append(root.find("rule[@id='" + rule.attrib["id"] + "']/name").text)
+    return values
+
+
+def snapshot_update(anna, root):
+    """Read the same values through the getters."""
+    return [
+        anna.get_schedule_temperature(root),
+        anna.get_current_temperature(root),
+        anna.get_target_temperature(root),
+        anna.get_thermostat_temperature(root),
+        anna.get_outdoor_temperature(root),
+        anna.get_illuminance(root),
+        anna.get_boiler_temperature(root),
+        anna.get_water_pressure(root),
+        anna.get_schema_state(root),
+        anna.get_current_preset(root),
+        anna.get_boiler_status(root),
+        anna.get_heating_status(root),
+        anna.get_cooling_status(root),
+        anna.get_domestic_hot_water_status(root),
+        anna.get_active_schema_name(root),
+    ]
+
+
+def bench(label, update):
+    """Time ROUNDS updates over TREES freshly parsed trees."""
+    best = None
+    for _ in range(ROUNDS):
+        trees = [Haanna.parse_xml(TEXT) for _ in range(TREES)]
+        start = time.perf_counter()
+        for root in trees:
+            update(root)
+        elapsed = (time.perf_counter() - start) / TREES
+        best = elapsed if best is None else min(best, elapsed)
+    print("{:<16} {:8.3f} ms/update".format(label, best * 1000))
+    return best
+
+
+TEXT = load_fixture("anna_domain_objects", SCALE)
+
+
+def main():
+    """Run both update variants on the inflated fixture."""
+    anna = Haanna("smile", "short_id", "127.0.0.1", 80)
+    print("fixture: {} kB, {} elements".format(
+        len(TEXT) // 1024, sum(1 for _ in Etree.fromstring(TEXT.replace(" & ", " &amp; ")).iter())
+    ))
+    old = bench("xpath scans", xpath_update)
+    new = bench("snapshot", lambda root: snapshot_update(anna, root))
+    print("speedup: {:.2f}x".format(old / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare the individual getters of an HA update with the one-call get_state."""
+
+import time
+import tracemalloc
+
+from fixtures import load_fixture
+
+from haanna import Haanna
+
+SCALE = 10
+TREES = 50
+ROUNDS = 5
+
+
+def getters_update(anna, root):
+    """Read the values with the individual getters."""
+    return [
+        anna.get_current_temperature(root),
+        anna.get_target_temperature(root),
+        anna.get_thermostat_temperature(root),
+        anna.get_schedule_temperature(root),
+        anna.get_outdoor_temperature(root),
+        anna.get_illuminance(root),
+        anna.get_boiler_temperature(root),
+        anna.get_water_pressure(root),
+        anna.get_boiler_status(root),
+        anna.get_heating_status(root),
+        anna.get_cooling_status(root),
+        anna.get_domestic_hot_water_status(root),
+        anna.get_schema_state(root),
+        anna.get_current_preset(root),
+        anna.get_active_schema_name(root),
+    ]
+
+
+def bench(label, update, trees):
+    """Time the updates of the trees, then measure the memory of one pass."""
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for root in trees:
+            update(root)
+        elapsed = (time.perf_counter() - start) / len(trees)
+        best = elapsed if best is None else min(best, elapsed)
+    # The memory of the values kept by a caller, e.g. to compare the next update
+    tracemalloc.start()
+    kept = [update(root) for root in trees]
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<12} {:8.1f} us/update {:8d} B kept/update {:8d} B peak".format(
+        label, best * 1e6, size // len(kept), peak
+    ))
+    return best
+
+
+def main():
+    """Run both variants over trees whose snapshots are already built."""
+    anna = Haanna("smile", "short_id", "127.0.0.1", 80)
+    text = load_fixture("anna_domain_objects", SCALE)
+    trees = [Haanna.parse_xml(text) for _ in range(TREES)]
+    for root in trees:
+        anna.get_state(root)
+    old = bench("getters", lambda root: getters_update(anna, root), trees)
+    new = bench("get_state", anna.get_state, trees)
+    print("speedup: {:.2f}x".format(old / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compare memory and latency of buffered parsing against streaming parsing."""
+
+import time
+import tracemalloc
+
+from fixtures import load_fixture
+
+from haanna import Haanna
+from haanna.emulator import SmileEmulator
+
+ROUNDS = 5
+
+
+def bench(label, anna):
+    """Fetch the domain objects ROUNDS times, print best latency and peak memory."""
+    anna.get_domain_objects()
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        root = anna.get_domain_objects()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    assert anna.get_current_temperature(root) == 20.62
+    del root
+    tracemalloc.start()
+    root = anna.get_domain_objects()
+    dummy, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<10} {:8.1f} ms/fetch {:8.1f} MB peak".format(
+        label, best * 1000, peak / 1024 / 1024
+    ))
+    return best, peak
+
+
+def main():
+    """Serve a large fixture with a long log history and fetch it both ways."""
+    with SmileEmulator(load_fixture("anna_domain_objects", scale=10, history=200)) as emulator:
+        body = emulator.state.body("/core/domain_objects")
+        print("payload: {:.1f} MB".format(len(body) / 1024 / 1024))
+        with Haanna(**emulator.config()) as anna:
+            buffered_time, buffered_peak = bench("buffered", anna)
+        with Haanna(streaming=True, **emulator.config()) as anna:
+            stream_time, stream_peak = bench("streaming", anna)
+    print("latency: {:.2f}x, peak memory: {:.2f}x".format(
+        buffered_time / stream_time, buffered_peak / stream_peak
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Benchmark fetching, parsing, the getters and the setters against an emulated gateway.
+
+The results are written to a JSON file, a previous results file can be given
+to print the change of every benchmark. Run it from this directory with the
+repository root on the path:
+
+    PYTHONPATH=.. python bench_suite.py --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import platform
+import time
+
+from fixtures import load_fixture
+
+from haanna import Haanna
+from haanna.emulator import SmileEmulator
+
+GETTERS = (
+    "get_presets",
+    "get_schema_names",
+    "get_active_schema_name",
+    "get_last_active_schema_name",
+    "get_schema_state",
+    "get_current_preset",
+    "get_schedule_temperature",
+    "get_current_temperature",
+    "get_target_temperature",
+    "get_thermostat_temperature",
+    "get_outdoor_temperature",
+    "get_illuminance",
+    "get_boiler_temperature",
+    "get_water_pressure",
+)
+DIRECT_GETTERS = (
+    "get_boiler_status",
+    "get_heating_status",
+    "get_cooling_status",
+    "get_domestic_hot_water_status",
+)
+SETTINGS = {
+    False: {"preset": "away", "schema": "Winter"},
+    True: {"preset": "away", "schema": "Thuis"},
+}
+
+
+def bench(rounds, call, setup=None):
+    """Get the best and mean seconds per call of rounds calls."""
+    times = []
+    for _ in range(rounds):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is None:
+            call()
+        else:
+            call(argument)
+        times.append(time.perf_counter() - start)
+    return {"best": min(times), "mean": sum(times) / len(times)}
+
+
+def update_cycle(anna):
+    """Fetch and read everything the Home Assistant component reads per update."""
+    domain_objects = anna.get_domain_objects()
+    direct_objects = anna.get_direct_objects()
+    for name in GETTERS:
+        getattr(anna, name)(domain_objects)
+    for name in DIRECT_GETTERS:
+        getattr(anna, name)(direct_objects)
+
+
+def run_gateway(legacy, args):
+    """Run every benchmark against one emulated gateway."""
+    name = "legacy_anna_domain_objects" if legacy else "anna_domain_objects"
+    emulator = SmileEmulator(
+        load_fixture(name, args.scale, args.history), latency=args.latency
+    ).start()
+    text = emulator.state.body("/core/domain_objects").decode()
+    results = {}
+    with Haanna(**emulator.config()) as anna:
+        results["fetch_domain_objects"] = bench(args.rounds, anna.get_domain_objects)
+        results["fetch_direct_objects"] = bench(args.rounds, anna.get_direct_objects)
+        results["parse_domain_objects"] = bench(
+            args.rounds, lambda: Haanna.parse_xml(text)
+        )
+        # Every getter on a fresh tree, so the snapshot is built in the first one
+        for name in GETTERS + DIRECT_GETTERS:
+            results[name] = bench(
+                args.rounds, getattr(anna, name), lambda: Haanna.parse_xml(text)
+            )
+        results["update_cycle"] = bench(args.rounds, lambda: update_cycle(anna))
+        root = anna.get_domain_objects()
+        settings = SETTINGS[legacy]
+        results["set_temperature"] = bench(
+            args.rounds, lambda: anna.set_temperature(root, 20.5)
+        )
+        results["set_preset"] = bench(
+            args.rounds, lambda: anna.set_preset(root, settings["preset"])
+        )
+        results["set_schema_state"] = bench(
+            args.rounds,
+            lambda: anna.set_schema_state(root, settings["schema"], "true"),
+        )
+    emulator.stop()
+    return results
+
+
+def compare(results, previous):
+    """Print the change of the best time of every benchmark."""
+    for gateway, benchmarks in results["gateways"].items():
+        for name, result in benchmarks.items():
+            before = previous.get("gateways", {}).get(gateway, {}).get(name)
+            if before is None or not before["best"]:
+                continue
+            change = result["best"] / before["best"] - 1
+            print("{:<8} {:<32} {:+7.1%}".format(gateway, name, change))
+
+
+def main():
+    """Run the suite on a modern and a legacy Anna and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="a previous results file")
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0, help="seconds per request")
+    parser.add_argument("--scale", type=int, default=0, help="extra copies of every object")
+    parser.add_argument("--history", type=int, default=0, help="extra measurements per log")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "parameters": {
+            "rounds": args.rounds,
+            "latency": args.latency,
+            "scale": args.scale,
+            "history": args.history,
+        },
+        "gateways": {},
+    }
+    for gateway, legacy in (("anna", False), ("legacy", True)):
+        results["gateways"][gateway] = run_gateway(legacy, args)
+        for name, result in results["gateways"][gateway].items():
+            print("{:<8} {:<32} {:9.3f} ms".format(gateway, name, result["best"] * 1000))
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as previous:
+            compare(results, json.load(previous))
+
+
+if __name__ == "__main__":
+    main()
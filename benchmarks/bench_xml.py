@@ -0,0 +1,91 @@
+"""Compare the XML backends on parsing and a full getter sweep of large fixtures."""
+
+import time
+
+from fixtures import load_fixture
+
+from haanna import Haanna
+from haanna.stream import parse_stream
+from haanna.xmlbackend import get_backend
+
+SCALES = (0, 50, 200)
+ROUNDS = 10
+CHUNK_SIZE = 16384
+GETTERS = (
+    "get_presets",
+    "get_schema_names",
+    "get_active_schema_name",
+    "get_last_active_schema_name",
+    "get_schema_state",
+    "get_current_preset",
+    "get_schedule_temperature",
+    "get_current_temperature",
+    "get_target_temperature",
+    "get_thermostat_temperature",
+    "get_outdoor_temperature",
+    "get_illuminance",
+    "get_boiler_temperature",
+    "get_water_pressure",
+    "get_state",
+)
+
+
+def best(call):
+    """Get the best seconds of ROUNDS calls."""
+    times = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def sweep(anna, text, backend):
+    """Parse a response and read every value from the fresh tree."""
+    root = Haanna.parse_xml(text, backend)
+    for name in GETTERS:
+        getattr(anna, name)(root)
+
+
+def run(backend, text):
+    """Time a backend on one fixture."""
+    anna = Haanna("smile", "short_id", "127.0.0.1", 80, xml_backend=backend)
+    data = text.encode()
+    chunks = [data[index:index + CHUNK_SIZE] for index in range(0, len(data), CHUNK_SIZE)]
+    return {
+        "parse": best(lambda: Haanna.parse_xml(text, backend)),
+        "stream": best(lambda: parse_stream(chunks, backend=backend)),
+        "sweep": best(lambda: sweep(anna, text, backend)),
+    }
+
+
+def main():
+    """Run every backend that can be imported on growing fixtures."""
+    backends = ["etree"]
+    try:
+        get_backend("lxml")
+    except ImportError:
+        print("lxml is not installed, only ElementTree is timed")
+    else:
+        backends.append("lxml")
+    for scale in SCALES:
+        text = load_fixture("anna_domain_objects", scale)
+        results = {backend: run(backend, text) for backend in backends}
+        for backend, result in results.items():
+            print("{:>7} KB {:<6} {}".format(
+                len(text) // 1024,
+                backend,
+                "  ".join(
+                    "{} {:8.3f} ms".format(name, seconds * 1000)
+                    for name, seconds in result.items()
+                ),
+            ))
+        if len(results) > 1:
+            print("{:>10} speedup {}".format("", "  ".join(
+                "{} {:.2f}x".format(name, results["etree"][name] / seconds)
+                for name, seconds in results["lxml"].items()
+            )))
+
+
+if __name__ == "__main__":
+    main()
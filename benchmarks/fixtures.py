@@ -0,0 +1,58 @@
+"""Load the recorded gateway fixtures, optionally inflated to a large gateway."""
+
+import copy
+import os
+import xml.etree.ElementTree as Etree
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "haanna", "fixtures")
+
+
+def fixture_path(name):
+    """Get the path of a recorded fixture."""
+    return os.path.join(FIXTURES, name + ".xml")
+
+
+def load_fixture(name, scale=0, history=0):
+    """Get the fixture text with scale extra plug appliances, modules and rules.
+
+    With history every period gets that many older measurements appended,
+    like a gateway with a long log history.
+    """
+    with open(fixture_path(name), encoding="utf-8") as fixture:
+        text = fixture.read()
+    if not scale and not history:
+        return text
+    root = Etree.fromstring(text.replace(" & ", " &amp; "))
+    for period in root.iter("period"):
+        latest = period.find("measurement")
+        for index in range(history):
+            measurement = copy.deepcopy(latest)
+            measurement.attrib["log_date"] = "2020-03-{:02d}T{:02d}:00:00+01:00".format(
+                1 + index // 24 % 28, index % 24
+            )
+            period.append(measurement)
+    templates = [
+        element
+        for element in root
+        if element.tag in ("appliance", "module", "rule", "location")
+    ]
+    extra = []
+    for index in range(scale):
+        for template in templates:
+            element = copy.deepcopy(template)
+            for node in element.iter():
+                if "id" in node.attrib:
+                    node.attrib["id"] = "{}{:08x}".format(node.attrib["id"][:24], index)
+                if "log_type" in node.attrib:
+                    node.attrib["log_type"] = "plug_" + node.attrib["log_type"]
+                if node.tag == "type" and node.text:
+                    node.text = "plug_" + node.text
+                if node.tag == "name" and element.tag == "rule":
+                    node.text = "{} {}".format(node.text, index)
+                if node.tag == "template" and "tag" in node.attrib:
+                    node.attrib["tag"] = "plug_" + node.attrib["tag"]
+            extra.append(element)
+    for position, element in enumerate(extra):
+        root.insert(position, element)
+    return Etree.tostring(root, encoding="unicode")
+
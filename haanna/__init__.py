@@ -1 +1,35 @@
-from .haanna import Haanna
+# The classes are imported on first use, so `import haanna` stays light
+_EXPORTS = {
+    "Haanna": "haanna",
+    "HaannaFleet": "fleet",
+    "ChangeTracker": "diff",
+    "Metrics": "metrics",
+    "UpdatePoller": "poller",
+    "CircuitBreaker": "health",
+    "ParseOffload": "offload",
+    "RateLimiter": "ratelimit",
+    "AsyncHaanna": "aio",
+}
+
+# Exports needing an extra, a star-import leaves them out so it works without it
+_OPTIONAL = {"AsyncHaanna"}
+
+__all__ = [name for name in _EXPORTS if name not in _OPTIONAL]
+
+
+def __getattr__(name):
+    """Import an exported class on first use."""
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError("module 'haanna' has no attribute {!r}".format(name))
+    try:
+        value = getattr(__import__(module, globals(), None, [name], 1), name)
+    except ImportError as err:  # aiohttp is an optional dependency
+        raise AttributeError("{} is not available: {}".format(name, err)) from err
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the exported classes with the module attributes."""
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,544 @@
+"""Plugwise Anna asyncio client."""
+
+import asyncio
+import base64
+import functools
+import time
+
+import aiohttp
+
+from .batch import SetterBatch
+from .health import CircuitOpenError
+from .poller import UpdatePoller
+from .ratelimit import RateLimitedError, background
+from .haanna import (
+    ANNA_DIRECT_OBJECTS_ENDPOINT,
+    ANNA_DOMAIN_OBJECTS_ENDPOINT,
+    ANNA_PING_ENDPOINT,
+    DEFAULT_BACKOFF_FACTOR,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT,
+    HTTP_OK,
+    RETRY_STATUS_CODES,
+    STREAM_CHUNK_SIZE,
+    CouldNotSetPresetException,
+    CouldNotSetTemperatureException,
+    Haanna,
+)
+
+DEFAULT_MAX_CONCURRENCY = 2
+
+
+class AsyncResponse:
+    """Define the status and body of a finished gateway request."""
+
+    __slots__ = ("status_code", "content")
+
+    def __init__(self, status_code, content):
+        """Set the constructor for this class."""
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        """Get the body decoded, as the gateway sends UTF-8."""
+        return self.content.decode("utf-8", "replace")
+
+
+class AsyncSetterBatch(SetterBatch):
+    """Define a batch of thermostat changes for AsyncHaanna, flush is awaitable."""
+
+    def __init__(self, anna, root, timeout=None, debounce=None):
+        """Set the constructor for this class."""
+        super().__init__(anna, root, timeout, debounce)
+        self._send_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        """Enter the async context manager."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Send the queued changes, unless the block raised."""
+        if exc_type is None:
+            await self.flush()
+        else:
+            self.cancel()
+
+    def _schedule(self):
+        """Restart the debounce timer on the running event loop."""
+        if self.debounce is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(
+            self.debounce, lambda: asyncio.ensure_future(self._flush_debounced())
+        )
+
+    async def _flush_debounced(self):
+        """Send the changes from the timer, an error is raised by the next flush."""
+        try:
+            await self._send()
+        except Exception as err:  # pylint: disable=broad-except
+            self._error = err
+
+    async def flush(self):
+        """Send the queued changes, returns the response text of each PUT."""
+        self._take_error()
+        return await self._send()
+
+    async def _send(self):
+        """Send the queued changes in order."""
+        async with self._send_lock:
+            results = []
+            puts = self._take_requests()
+            try:
+                for uri, data, exception in puts:
+                    xml = await self._anna._request(
+                        "PUT",
+                        uri,
+                        timeout=self._timeout,
+                        data=data,
+                        headers={"Content-Type": "text/xml"},
+                    )
+                    self._anna._check_put(xml)
+                    if xml.status_code != 200:
+                        raise exception("Could not send the batch: " + xml.text)
+                    results.append(xml.text)
+            finally:
+                if puts:
+                    self._anna._after_write()
+            return results
+
+
+class AsyncUpdatePoller(UpdatePoller):
+    """Define the adaptive update engine of AsyncHaanna, iterate with async for."""
+
+    @staticmethod
+    def _create_event():
+        """Create the event that wakes the poller."""
+        return asyncio.Event()
+
+    async def _fetch(self):
+        """Fetch and track the domain objects."""
+        try:
+            with background():
+                root = await self.anna.get_domain_objects(timeout=self.timeout)
+        except Exception as err:  # pylint: disable=broad-except
+            return self._fetched(None, err)
+        return self._fetched(root, None)
+
+    async def _probe(self):
+        """Ping the gateway, returns whether it is reachable."""
+        try:
+            with background():
+                return await self.anna.ping_anna_thermostat(timeout=self.timeout)
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+    async def _wait(self, interval=None):
+        """Wait until the next fetch is due, returns False when stopped."""
+        if interval is None:
+            interval = self.interval
+        deadline = time.monotonic() + interval
+        while not self._stopped:
+            timeout = self._next_timeout(deadline)
+            if timeout is None:
+                return True
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                self._wake.clear()
+                return not self._stopped
+            if deadline > time.monotonic() and self._probed(await self._probe()):
+                return True
+        return False
+
+    async def updates(self):
+        """Yield the Changes of every update that changed something, until stop()."""
+        self._stopped = False
+        self.anna.add_write_listener(self.wake)
+        try:
+            stale = self._restore()
+            if stale:
+                yield stale
+                if not await self._wait(self._stagger_delay()):
+                    return
+            while not self._stopped:
+                changes = await self._fetch()
+                if changes:
+                    yield changes
+                if not await self._wait():
+                    break
+        finally:
+            self.anna.remove_write_listener(self.wake)
+
+    def __aiter__(self):
+        """Iterate over the updates."""
+        return self.updates()
+
+    async def run(self, callback):
+        """Call callback with the Changes of every update, until stop()."""
+        async for changes in self.updates():
+            callback(changes)
+
+
+class AsyncHaanna(Haanna):
+    """Define the asyncio Haanna object, all getters are shared with Haanna."""
+
+    def __init__(
+        self,
+        username,
+        password,
+        host,
+        port,
+        legacy_anna=False,
+        timeout=DEFAULT_TIMEOUT,
+        pool_size=DEFAULT_POOL_SIZE,
+        keep_alive=True,
+        retries=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        session=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        metrics=None,
+        xml_backend=None,
+        circuit_breaker=None,
+        snapshot_path=None,
+        rate_limiter=None,
+    ):
+        """Set the constructor for this class."""
+        self._pool_size = pool_size
+        self._keep_alive = keep_alive
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._authorization = "Basic " + base64.b64encode(
+            "{}:{}".format(username, password).encode()
+        ).decode()
+        super().__init__(
+            username,
+            password,
+            host,
+            port,
+            legacy_anna,
+            timeout,
+            pool_size,
+            keep_alive,
+            retries,
+            backoff_factor,
+            session,
+            metrics=metrics,
+            xml_backend=xml_backend,
+            circuit_breaker=circuit_breaker,
+            snapshot_path=snapshot_path,
+            rate_limiter=rate_limiter,
+        )
+
+    def _open_session(self, session, pool_size, keep_alive, retries, backoff_factor):
+        """Defer creating the session until an event loop is running."""
+        return session
+
+    @staticmethod
+    def create_session(pool_size=DEFAULT_POOL_SIZE, keep_alive=True):
+        """Create a pooled aiohttp session, it can be shared between instances."""
+        connector = aiohttp.TCPConnector(
+            limit=pool_size, limit_per_host=pool_size, force_close=not keep_alive
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        """Close the pooled connections, a shared session is left open."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        """Enter the async context manager."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Close the connections when leaving the async context manager."""
+        await self.close()
+
+    @staticmethod
+    def _client_timeout(timeout):
+        """Convert a requests-style (connect, read) timeout for aiohttp."""
+        if isinstance(timeout, tuple):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def _request(self, method, endpoint, timeout=None, **kwargs):
+        """Send a request to the gateway, through the circuit breaker if there is one."""
+        if self.rate_limiter is not None:
+            delay = self._reserve(method)
+            if delay:
+                await asyncio.sleep(delay)
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return await self._send(method, endpoint, timeout, **kwargs)
+        if breaker.acquire():
+            await self._probe()
+        start = time.monotonic()
+        try:
+            response = await self._send(method, endpoint, timeout, **kwargs)
+        except Exception as err:
+            breaker.record_failure(time.monotonic() - start, err)
+            raise
+        breaker.record_response(response.status_code, time.monotonic() - start)
+        return response
+
+    async def _probe(self):
+        """Ping the gateway before a half-open circuit breaker lets a request through."""
+        breaker = self.circuit_breaker
+        start = time.monotonic()
+        try:
+            ping = await self._send("GET", ANNA_PING_ENDPOINT, breaker.probe_timeout)
+        except Exception as err:  # pylint: disable=broad-except
+            breaker.record_failure(time.monotonic() - start, err)
+            raise CircuitOpenError("The gateway is still offline: {}".format(err)) from err
+        except BaseException as err:
+            # A cancelled or interrupted probe must not leave the circuit half-open
+            breaker.record_failure(
+                time.monotonic() - start, "Probe interrupted: {!r}".format(err)
+            )
+            raise
+        if ping.status_code != 404:
+            breaker.record_failure(time.monotonic() - start, "HTTP {}".format(ping.status_code))
+            raise CircuitOpenError("The gateway is still offline.")
+        breaker.record_success(time.monotonic() - start)
+
+    async def _send(self, method, endpoint, timeout=None, reader=None, **kwargs):
+        """Send a request to the gateway, limited to max_concurrency at a time.
+
+        reader is awaited with a 200 response instead of reading its body,
+        what it returns is the content of the AsyncResponse.
+        """
+        if self._session is None:
+            self._session = self.create_session(self._pool_size, self._keep_alive)
+        client_timeout = self._client_timeout(
+            self._timeout if timeout is None else timeout
+        )
+        headers = dict(kwargs.pop("headers", {}))
+        headers["Authorization"] = self._authorization
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                start = time.perf_counter()
+                try:
+                    async with self._session.request(
+                        method,
+                        self._endpoint + endpoint,
+                        headers=headers,
+                        timeout=client_timeout,
+                        **kwargs
+                    ) as response:
+                        status = response.status
+                        if reader is not None and status == HTTP_OK:
+                            # The reader counts the bytes it receives
+                            content = await reader(response)
+                            size = 0
+                        else:
+                            content = await response.read()
+                            size = len(content)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if self._metrics is not None:
+                        self._metrics.record_request(
+                            endpoint, None, time.perf_counter() - start
+                        )
+                    if attempt >= self._retries:
+                        raise
+                else:
+                    if self._metrics is not None:
+                        self._metrics.record_request(
+                            endpoint,
+                            status,
+                            time.perf_counter() - start,
+                            size,
+                        )
+                    if status not in RETRY_STATUS_CODES or attempt >= self._retries:
+                        return AsyncResponse(status, content)
+                await asyncio.sleep(self._backoff_factor * (2 ** attempt))
+                attempt += 1
+
+    async def ping_anna_thermostat(self, timeout=None):
+        """Ping the thermostat to see if it's online."""
+        ping = await self._request("GET", ANNA_PING_ENDPOINT, timeout=timeout)
+
+        if ping.status_code != 404:
+            raise ConnectionError("Could not connect to the gateway.")
+
+        return True
+
+    async def get_direct_objects(self, timeout=None):
+        """Collect the direct_objects XML-data."""
+        return await self._get_objects_async(
+            ANNA_DIRECT_OBJECTS_ENDPOINT, "direct", timeout
+        )
+
+    async def get_domain_objects(self, timeout=None):
+        """Collect the domain_objects XML-data."""
+        return await self._get_objects_async(
+            ANNA_DOMAIN_OBJECTS_ENDPOINT, "domain", timeout
+        )
+
+    async def _get_objects_async(self, endpoint, name, timeout):
+        """Fetch and parse objects XML-data, the latest ones when the read is shed."""
+        try:
+            xml = await self._request("GET", endpoint, timeout=timeout)
+        except RateLimitedError as err:
+            return self._latest_objects(endpoint, err)
+
+        if xml.status_code != 200:
+            raise ConnectionError("Could not get the {} objects.".format(name))
+
+        return self._remember(endpoint, self._parse_response(endpoint, xml.content))
+
+    async def get_domain_objects_data(self, timeout=None):
+        """Collect the domain_objects XML-data as bytes, without parsing it."""
+        xml = await self._request("GET", ANNA_DOMAIN_OBJECTS_ENDPOINT, timeout=timeout)
+
+        if xml.status_code != 200:
+            raise ConnectionError("Could not get the domain objects.")
+
+        return xml.content
+
+    async def iter_point_log_history(
+        self,
+        log_types,
+        start=None,
+        end=None,
+        page_size=None,
+        timeout=None,
+    ):
+        """Yield the measurements of the point logs of the given type(s) page by page.
+
+        The domain objects are parsed while they are received, the pages are
+        yielded once the response is complete.
+        """
+        log_types, start, end = self._history_range(log_types, start, end)
+        reader = functools.partial(
+            self._read_history, log_types=log_types, start=start, end=end,
+            page_size=page_size,
+        )
+        xml = await self._request(
+            "GET", ANNA_DOMAIN_OBJECTS_ENDPOINT, timeout=timeout, reader=reader
+        )
+        if xml.status_code != HTTP_OK:
+            raise ConnectionError("Could not get the domain objects.")
+
+        for page in xml.content:
+            yield page
+
+    async def _read_history(self, response, log_types, start, end, page_size):
+        """Parse the point log history of a response while it is received."""
+        from .history import DEFAULT_PAGE_SIZE, HistoryParser
+
+        parser = HistoryParser(
+            log_types, start, end, page_size or DEFAULT_PAGE_SIZE, self.xml_backend
+        )
+        pages = []
+        size = 0
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            size += len(chunk)
+            pages.extend(parser.feed(chunk))
+        pages.extend(parser.close())
+        if self._metrics is not None:
+            self._metrics.record_received(ANNA_DOMAIN_OBJECTS_ENDPOINT, size)
+        return pages
+
+    async def get_point_log_history(
+        self, log_types, start=None, end=None, timeout=None
+    ):
+        """Get the measurements of the point logs of the given type(s) by point log id."""
+        history = {}
+        async for page in self.iter_point_log_history(
+            log_types, start, end, timeout=timeout
+        ):
+            series = history.get(page.point_log_id)
+            if series is None:
+                history[page.point_log_id] = page
+            else:
+                series.extend(page)
+        return history
+
+    async def refresh_topology(self, root=None, timeout=None):
+        """Resolve the ids used by the setters again, from root or a new fetch."""
+        if root is None:
+            root = await self.get_domain_objects(timeout=timeout)
+        return super().refresh_topology(root)
+
+    async def set_schema_state(self, root, schema, state, timeout=None):
+        """Send a set request to the schema with the given name."""
+        uri, data = self._schema_state_request(root, schema, state)
+
+        xml = await self._request(
+            "PUT", uri, timeout=timeout, data=data, headers={"Content-Type": "text/xml"}
+        )
+        self._check_put(xml)
+
+        if xml.status_code != 200:
+            raise CouldNotSetTemperatureException(
+                "Could not set the schema to {}.".format(state) + xml.text
+            )
+        self._after_write()
+
+        return "{} {}".format(xml.text, data)
+
+    async def set_preset(self, root, preset, timeout=None):
+        """Set the given preset on the thermostat."""
+        if self.legacy_anna:
+            uri, data = self._preset_v1_request(root, preset)
+        else:
+            uri, data = self._preset_request(root, preset)
+
+        xml = await self._request(
+            "PUT", uri, timeout=timeout, data=data, headers={"Content-Type": "text/xml"}
+        )
+        self._check_put(xml)
+
+        if xml.status_code != 200:
+            raise CouldNotSetPresetException(
+                "Could not set the " "given preset: " + xml.text
+            )
+        self._after_write()
+        return xml.text
+
+    async def set_temperature(self, root, temperature, timeout=None):
+        """Send a set request to the temperature with the given temperature."""
+        uri, data = self._temperature_request(root, temperature)
+
+        xml = await self._request(
+            "PUT", uri, timeout=timeout, data=data, headers={"Content-Type": "text/xml"}
+        )
+        self._check_put(xml)
+
+        if xml.status_code != 200:
+            raise CouldNotSetTemperatureException(
+                "Could not set the temperature." + xml.text
+            )
+        self._after_write()
+
+        return xml.text
+
+    async def _put_change(self, uri, data, timeout, exception, message):
+        """Send a change to the gateway, returns the response text."""
+        xml = await self._request(
+            "PUT", uri, timeout=timeout, data=data, headers={"Content-Type": "text/xml"}
+        )
+        self._check_put(xml)
+        if xml.status_code != 200:
+            raise exception(message + xml.text)
+        self._after_write()
+        return xml.text
+
+    def batch(self, root, timeout=None, debounce=None):
+        """Queue setpoint, preset and schema changes, sent with the fewest PUTs."""
+        return AsyncSetterBatch(self, root, timeout, debounce)
+
+    def command_queue(self, root, timeout=None, **kwargs):
+        """Refuse a command queue, its worker thread cannot await the requests."""
+        raise TypeError(
+            "AsyncHaanna has no command queue, use batch() with a debounce instead."
+        )
@@ -0,0 +1,127 @@
+"""Coalesced thermostat writes."""
+
+import threading
+
+
+class SetterBatch:
+    """Define a batch of thermostat changes, sent with the fewest PUTs.
+
+    A repeated change of the same setting keeps the last value. With a
+    debounce (in seconds) the changes are also sent once none was queued for
+    that long, e.g. while a temperature slider is dragged.
+    """
+
+    def __init__(self, anna, root, timeout=None, debounce=None):
+        """Set the constructor for this class."""
+        self.debounce = debounce
+        self._anna = anna
+        self._root = root
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._temperature = None
+        self._preset = None
+        self._schemas = {}
+        self._timer = None
+        self._error = None
+
+    def __enter__(self):
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Send the queued changes, unless the block raised."""
+        if exc_type is None:
+            self.flush()
+        else:
+            self.cancel()
+
+    def set_temperature(self, temperature):
+        """Queue a setpoint for the thermostat."""
+        with self._lock:
+            self._temperature = temperature
+            self._schedule()
+
+    def set_preset(self, preset):
+        """Queue a preset for the thermostat."""
+        with self._lock:
+            self._preset = preset
+            self._schedule()
+
+    def set_schema_state(self, schema, state):
+        """Queue the state of the schema with the given name."""
+        with self._lock:
+            self._schemas[str(schema)] = state
+            self._schedule()
+
+    def _schedule(self):
+        """Restart the debounce timer."""
+        if self.debounce is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.debounce, self._flush_debounced)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_debounced(self):
+        """Send the changes from the timer, an error is raised by the next flush."""
+        try:
+            self._send()
+        except Exception as err:  # pylint: disable=broad-except
+            self._error = err
+
+    def _take(self):
+        """Take the queued changes and stop the debounce timer."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            changes = (self._temperature, self._preset, self._schemas)
+            self._temperature = None
+            self._preset = None
+            self._schemas = {}
+        return changes
+
+    def _take_error(self):
+        """Raise the error of a debounced flush once."""
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _take_requests(self):
+        """Take the queued changes as (uri, payload, exception) PUTs."""
+        temperature, preset, schemas = self._take()
+        return self._anna._batch_requests(self._root, temperature, preset, schemas)
+
+    def cancel(self):
+        """Drop the queued changes."""
+        self._take()
+
+    def flush(self):
+        """Send the queued changes, returns the response text of each PUT."""
+        self._take_error()
+        return self._send()
+
+    def _send(self):
+        """Send the queued changes in order."""
+        with self._send_lock:
+            results = []
+            puts = self._take_requests()
+            try:
+                for uri, data, exception in puts:
+                    xml = self._anna._request(
+                        "PUT",
+                        uri,
+                        timeout=self._timeout,
+                        data=data,
+                        headers={"Content-Type": "text/xml"},
+                    )
+                    self._anna._check_put(xml)
+                    if xml.status_code != 200:
+                        raise exception("Could not send the batch: " + xml.text)
+                    results.append(xml.text)
+            finally:
+                if puts:
+                    self._anna._after_write()
+            return results
@@ -0,0 +1,70 @@
+"""Short-lived response cache for gateway objects."""
+
+from concurrent.futures import Future
+import threading
+import time
+
+
+class ResponseCache:
+    """Define a TTL cache where concurrent misses share one in-flight fetch."""
+
+    def __init__(self, ttl):
+        """Set the constructor for this class."""
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._in_flight = {}
+        self._generation = 0
+
+    def get(self, key, fetch):
+        """Get the cached value for key, or fetch it once for all waiting callers."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._in_flight[key] = Future()
+                generation = self._generation
+            else:
+                self.coalesced += 1
+        if leader:
+            return self._fetch(key, fetch, flight, generation)
+        return flight.result()
+
+    def _fetch(self, key, fetch, flight, generation):
+        """Fetch the value and hand it to the callers waiting for the flight."""
+        try:
+            value = fetch()
+        except BaseException as err:
+            with self._lock:
+                del self._in_flight[key]
+            flight.set_exception(err)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            # A value fetched before an invalidation may already be outdated
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        flight.set_result(value)
+        return value
+
+    def invalidate(self):
+        """Drop all cached values, fetches in flight are not stored."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get_stats(self):
+        """Get the hit, miss and coalesced counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
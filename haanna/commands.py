@@ -0,0 +1,245 @@
+"""Write-behind queue of thermostat changes."""
+
+import collections
+import threading
+from concurrent.futures import Future
+
+from .haanna import (
+    HTTP_OK,
+    RETRY_STATUS_CODES,
+    CouldNotSetPresetException,
+    CouldNotSetTemperatureException,
+)
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30
+
+
+class Command:
+    """Define a queued change of one setting and the futures waiting for it."""
+
+    __slots__ = ("build", "exception", "futures")
+
+    def __init__(self, build, exception, futures):
+        """Set the constructor for this class."""
+        self.build = build
+        self.exception = exception
+        self.futures = futures
+
+
+class CommandQueue:
+    """Define a queue that sends the thermostat changes of a gateway in the background.
+
+    The setters return a Future of the response text right away. The changes
+    are sent one at a time in the order they were queued. A change of a
+    setting that is still queued (e.g. the setpoints of a dragged slider)
+    supersedes it: it moves to the end of the queue and the futures of both
+    get its result. A PUT that fails to connect or gets a 5xx is retried with
+    an exponential backoff, after a 404 the ids are resolved again from a new
+    fetch and the PUT is retried once, any other failure is raised by the
+    futures.
+    """
+
+    def __init__(
+        self,
+        anna,
+        root,
+        timeout=None,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+    ):
+        """Set the constructor for this class."""
+        self.anna = anna
+        self.root = root
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = {"queued": 0, "superseded": 0, "sent": 0, "retries": 0, "failed": 0}
+        self._condition = threading.Condition()
+        # setting -> Command, in the order they are sent
+        self._pending = collections.OrderedDict()
+        self._busy = False
+        self._closed = False
+        self._abort = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Send the queued changes and stop the queue."""
+        self.close()
+
+    @property
+    def depth(self):
+        """Get the number of changes that are queued or being sent."""
+        with self._condition:
+            return len(self._pending) + self._busy
+
+    def set_temperature(self, temperature):
+        """Queue a setpoint for the thermostat."""
+        return self._queue(
+            "temperature",
+            lambda root: self.anna._temperature_request(root, temperature),
+            CouldNotSetTemperatureException,
+        )
+
+    def set_preset(self, preset):
+        """Queue a preset for the thermostat."""
+        if self.anna.legacy_anna:
+            request = self.anna._preset_v1_request
+        else:
+            request = self.anna._preset_request
+        return self._queue(
+            "preset", lambda root: request(root, preset), CouldNotSetPresetException
+        )
+
+    def set_schema_state(self, schema, state):
+        """Queue the state of the schema with the given name."""
+        return self._queue(
+            ("schema", str(schema)),
+            lambda root: self.anna._schema_state_request(root, schema, state),
+            CouldNotSetTemperatureException,
+        )
+
+    def _queue(self, setting, build, exception):
+        """Queue a change, superseding a queued change of the same setting."""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The command queue is closed.")
+            futures = [future]
+            superseded = self._pending.pop(setting, None)
+            if superseded is not None:
+                self.stats["superseded"] += 1
+                futures = superseded.futures + futures
+            self._pending[setting] = Command(build, exception, futures)
+            self.stats["queued"] += 1
+            self._record_depth()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._work, name="haanna-commands", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify_all()
+        return future
+
+    def _record_depth(self):
+        """Record the queue depth when metrics are enabled, with the lock held."""
+        if self.anna._metrics is not None:
+            self.anna._metrics.record_queue_depth(
+                self.anna.get_anna_endpoint(), len(self._pending) + self._busy
+            )
+
+    def _take(self):
+        """Wait for the next change, None when the queue is closed and empty."""
+        with self._condition:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._condition.wait()
+            dummy, command = self._pending.popitem(last=False)
+            self._busy = True
+            return command
+
+    def _done(self):
+        """Mark the change being sent as done."""
+        with self._condition:
+            self._busy = False
+            self._record_depth()
+            self._condition.notify_all()
+
+    def _work(self):
+        """Send the queued changes until the queue is closed."""
+        while True:
+            command = self._take()
+            if command is None:
+                return
+            futures = [
+                future for future in command.futures if future.set_running_or_notify_cancel()
+            ]
+            try:
+                if futures:
+                    result = self._send(command)
+            except Exception as err:  # pylint: disable=broad-except
+                self.stats["failed"] += 1
+                for future in futures:
+                    future.set_exception(err)
+            else:
+                for future in futures:
+                    future.set_result(result)
+            finally:
+                self._done()
+
+    def _retry(self, uri, attempt):
+        """Wait before a retry, returns False when the queue was closed meanwhile."""
+        self.stats["retries"] += 1
+        if self.anna._metrics is not None:
+            self.anna._metrics.record_retry(uri)
+        return not self._abort.wait(min(self.backoff * 2 ** attempt, self.max_backoff))
+
+    def _send(self, command):
+        """Send a change, returns the response text or raises the last failure."""
+        attempt = 0
+        resolved = False
+        while True:
+            uri, data = command.build(self.root)
+            try:
+                xml = self.anna._request(
+                    "PUT",
+                    uri,
+                    timeout=self.timeout,
+                    data=data,
+                    headers={"Content-Type": "text/xml"},
+                )
+            except Exception as err:  # pylint: disable=broad-except
+                error = err
+            else:
+                self.anna._check_put(xml)
+                if xml.status_code == HTTP_OK:
+                    self.anna._after_write()
+                    self.stats["sent"] += 1
+                    return xml.text
+                error = command.exception("Could not send the change: " + xml.text)
+                if xml.status_code == 404 and not resolved:
+                    resolved = True
+                    self.anna.refresh_topology(timeout=self.timeout)
+                    if self._retry(uri, 0):
+                        continue
+                    raise error
+                if xml.status_code not in RETRY_STATUS_CODES:
+                    raise error
+            if attempt >= self.retries or not self._retry(uri, attempt):
+                raise error
+            attempt += 1
+
+    def join(self, timeout=None):
+        """Wait until every queued change is sent or failed, False on a timeout."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._busy, timeout
+            )
+
+    def close(self, wait=True):
+        """Stop the queue after sending the queued changes.
+
+        Without wait the queued changes are cancelled, a retry is given up
+        and close returns right away.
+        """
+        with self._condition:
+            self._closed = True
+            if not wait:
+                for command in self._pending.values():
+                    for future in command.futures:
+                        future.cancel()
+                self._pending.clear()
+                self._abort.set()
+                self._record_depth()
+            self._condition.notify_all()
+            thread = self._thread
+        if wait and thread is not None:
+            thread.join()
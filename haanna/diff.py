@@ -0,0 +1,115 @@
+"""Changes between successive gateway snapshots."""
+
+import threading
+
+from .snapshot import DomainSnapshot
+
+
+class Changes:
+    """Define the changes between two updates as {key: (old, new)}.
+
+    measurements holds the changed point log measurements by point log id,
+    state the changed ThermostatState values by name. stale tells that the
+    values were saved earlier and not fetched from the gateway.
+    """
+
+    __slots__ = ("measurements", "state", "current", "stale")
+
+    def __init__(self, measurements, state, current, stale=False):
+        """Set the constructor for this class."""
+        self.measurements = measurements
+        self.state = state
+        self.current = current
+        self.stale = stale
+
+    def __bool__(self):
+        """Tell whether anything changed."""
+        return bool(self.measurements or self.state)
+
+    def __repr__(self):
+        """Represent the changes for logging."""
+        return "<Changes measurements={!r} state={!r}{}>".format(
+            self.measurements, self.state, " stale" if self.stale else ""
+        )
+
+
+def diff_measurements(previous, current):
+    """Get the changed point log measurements of two trees."""
+    old = {} if previous is None else DomainSnapshot.of(previous).measurements
+    new = DomainSnapshot.of(current).measurements
+    changes = {}
+    for point_log_id, measurement in new.items():
+        before = old.get(point_log_id)
+        before = None if before is None else before.text
+        if before != measurement.text:
+            changes[point_log_id] = (before, measurement.text)
+    for point_log_id in old.keys() - new.keys():
+        changes[point_log_id] = (old[point_log_id].text, None)
+    return changes
+
+
+def diff_states(previous, current):
+    """Get the changed values of two ThermostatStates, previous may be None."""
+    changes = {}
+    for name, value in current.as_dict().items():
+        before = None if previous is None else getattr(previous, name)
+        if before != value:
+            changes[name] = (before, value)
+    return changes
+
+
+class ChangeTracker:
+    """Define a tracker of the updates of a gateway that reports only the changes.
+
+    The first update reports every value as changed from None.
+    """
+
+    def __init__(self, anna):
+        """Set the constructor for this class."""
+        self._anna = anna
+        self._lock = threading.Lock()
+        self._root = None
+        self._state = None
+        self._subscribers = []
+
+    def subscribe(self, callback, names=None):
+        """Call callback with the Changes of an update, returns an unsubscribe function.
+
+        With names (ThermostatState value names) the callback is only called
+        when one of them changed.
+        """
+        subscriber = (callback, None if names is None else frozenset(names))
+        self._subscribers.append(subscriber)
+        return lambda: self._subscribers.remove(subscriber)
+
+    def restore(self, state):
+        """Start from a saved ThermostatState, returns its stale Changes.
+
+        The next update reports the changes from the saved state.
+        """
+        with self._lock:
+            changes = Changes({}, diff_states(self._state, state), state, stale=True)
+            self._state = state
+        self._notify(changes)
+        return changes
+
+    def update(self, root, direct_root=None):
+        """Compare a new update with the previous one and notify the subscribers."""
+        state = self._anna.get_state(root, direct_root)
+        with self._lock:
+            changes = Changes(
+                diff_measurements(self._root, root),
+                diff_states(self._state, state),
+                state,
+            )
+            self._root = root
+            self._state = state
+        self._notify(changes)
+        return changes
+
+    def _notify(self, changes):
+        """Call the subscribers interested in the changes."""
+        if changes:
+            for callback, names in list(self._subscribers):
+                if names is None or not names.isdisjoint(changes.state):
+                    callback(changes)
@@ -0,0 +1,519 @@
+"""Emulated Smile gateways for tests, development and load generation.
+
+Run ``python -m haanna.emulator --help`` to serve one or many gateways.
+"""
+
+import argparse
+import base64
+import datetime
+import http.server
+import json
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as Etree
+
+from .stream import escape_ampersands
+from .zones import SCHEMA_TAG, THERMOSTAT_TYPES
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+COLLECTIONS = {
+    "/core/locations": "location",
+    "/core/rules": "rule",
+    "/core/appliances": "appliance",
+}
+PADDING_MEASUREMENTS = 24
+# Seconds for stop() to take effect
+POLL_INTERVAL = 0.1
+
+
+def _now():
+    """Get the current time the way the gateway writes dates."""
+    return datetime.datetime.now().astimezone().isoformat(timespec="milliseconds")
+
+
+def _tag(rule):
+    """Get the template tag of a rule, None without a template."""
+    template = rule.find("template")
+    return None if template is None else template.get("tag")
+
+
+def _serialize(element):
+    """Serialize an element like the gateway, it does not escape "&" in names."""
+    return Etree.tostring(element, encoding="UTF-8", xml_declaration=True).replace(
+        b" &amp; ", b" & "
+    )
+
+
+def _attributes(uri):
+    """Split "/core/locations;id=a/thermostat;id=b" into the path and its ids."""
+    parts = uri.split("?", 1)[0].split("/")
+    ids = {}
+    path = []
+    for part in parts:
+        name, dummy, value = part.partition(";id=")
+        path.append(name)
+        if value:
+            ids[name] = value
+    return "/".join(path), ids
+
+
+class BadRequest(Exception):
+    """Raise an exception for a PUT the gateway would refuse, with its status code."""
+
+    def __init__(self, status, message):
+        """Set the constructor for this class."""
+        super().__init__(message)
+        self.status = status
+
+
+class SmileState:
+    """Define the objects of an emulated gateway, changed by the PUTs of the setters.
+
+    A change of a location preset or setpoint is also written to the point
+    logs of the thermostats in the location, like the gateway reports the
+    new values, and an activated schema deactivates the other schemas.
+    """
+
+    def __init__(self, domain_objects, padding=0):
+        """Parse a domain_objects document (bytes or str).
+
+        padding adds unrelated appliances with a log history until the
+        document is about that many bytes larger.
+        """
+        if isinstance(domain_objects, str):
+            domain_objects = domain_objects.encode()
+        self.root = Etree.fromstring(escape_ampersands(domain_objects))
+        self.legacy = self.root.find("location") is None
+        self._lock = threading.Lock()
+        self._body = None
+        if padding:
+            self._pad(padding)
+
+    def _pad(self, padding):
+        """Append padding appliances of a few kB each."""
+        index = 0
+        size = 0
+        while size < padding:
+            appliance = Etree.SubElement(
+                self.root, "appliance", id="{:032x}".format(0xFADE0000 + index)
+            )
+            Etree.SubElement(appliance, "name").text = "Plug {}".format(index)
+            Etree.SubElement(appliance, "type").text = "plug"
+            logs = Etree.SubElement(appliance, "logs")
+            point_log = Etree.SubElement(
+                logs, "point_log", id="{:032x}".format(0xFEED0000 + index)
+            )
+            Etree.SubElement(point_log, "type").text = "electricity_consumed"
+            period = Etree.SubElement(point_log, "period")
+            for hour in range(PADDING_MEASUREMENTS):
+                measurement = Etree.SubElement(
+                    period,
+                    "measurement",
+                    log_date="2020-03-24T{:02d}:00:00+01:00".format(hour),
+                )
+                measurement.text = "{:.2f}".format(hour * 1.5)
+            size += len(Etree.tostring(appliance))
+            index += 1
+
+    def body(self, path):
+        """Get the body of a GET, None for an unknown path."""
+        with self._lock:
+            if path in ("/core/domain_objects", "/core/direct_objects"):
+                if self._body is None:
+                    self._body = _serialize(self.root)
+                return self._body
+            tag = COLLECTIONS.get(path)
+            if tag is None:
+                return None
+            collection = Etree.Element(path.rsplit("/", 1)[1])
+            collection.extend(self.root.findall(tag))
+            return _serialize(collection)
+
+    def put(self, uri, data):
+        """Apply the payload of a setter, raises BadRequest when it is refused."""
+        path, ids = _attributes(uri)
+        try:
+            payload = Etree.fromstring(escape_ampersands(data))
+        except Etree.ParseError as err:
+            raise BadRequest(400, "Malformed payload: {}".format(err)) from err
+        with self._lock:
+            if path == "/core/locations/thermostat":
+                self._set_location_setpoint(
+                    ids["locations"], ids["thermostat"], payload
+                )
+            elif path == "/core/locations":
+                self._set_location(ids.get("locations"), payload)
+            elif path == "/core/appliances/thermostat":
+                self._set_appliance_setpoint(ids["appliances"], payload)
+            elif path == "/core/rules":
+                self._set_rules(payload)
+            else:
+                raise BadRequest(404, "Unknown uri {}".format(uri))
+            self._body = None
+
+    def _find(self, tag, element_id):
+        """Get a top level element by id, a 404 when there is none."""
+        for element in self.root.iterfind(tag):
+            if element.get("id") == element_id:
+                return element
+        raise BadRequest(404, "Unknown {} {}".format(tag, element_id))
+
+    def _thermostats(self, location_id):
+        """Get the thermostat appliances in a location."""
+        return [
+            appliance
+            for appliance in self.root.findall("appliance")
+            if appliance.findtext("type") in THERMOSTAT_TYPES
+            and appliance.find("location") is not None
+            and appliance.find("location").get("id") == location_id
+        ]
+
+    @staticmethod
+    def _log(element, log_type, value):
+        """Write the latest measurement of the point logs of a type."""
+        for point_log in element.iterfind("logs/point_log"):
+            if point_log.findtext("type") != log_type:
+                continue
+            measurement = point_log.find("period/measurement")
+            if measurement is not None:
+                measurement.text = value
+                measurement.set("log_date", _now())
+
+    def _set_location(self, location_id, payload):
+        """Apply the name, type and preset of <locations><location id>."""
+        for change in payload.iterfind("location"):
+            location_id = change.get("id", location_id)
+            location = self._find("location", location_id)
+            for field in ("name", "type", "preset"):
+                value = change.findtext(field)
+                if value is None:
+                    continue
+                element = location.find(field)
+                if element is None:
+                    element = Etree.SubElement(location, field)
+                element.text = value
+                if field == "preset":
+                    for thermostat in [location] + self._thermostats(location_id):
+                        self._log(thermostat, "preset_state", value)
+
+    def _set_location_setpoint(self, location_id, functionality_id, payload):
+        """Apply <thermostat_functionality><setpoint/></thermostat_functionality>."""
+        location = self._find("location", location_id)
+        functionality = location.find(
+            "actuator_functionalities/thermostat_functionality"
+        )
+        if functionality is None or functionality.get("id") != functionality_id:
+            raise BadRequest(404, "Unknown thermostat {}".format(functionality_id))
+        setpoint = self._setpoint(payload)
+        functionality.find("setpoint").text = setpoint
+        for thermostat in [location] + self._thermostats(location_id):
+            self._log(thermostat, "thermostat", setpoint)
+            self._log(thermostat, "target_temperature", setpoint)
+
+    def _set_appliance_setpoint(self, appliance_id, payload):
+        """Apply the setpoint of a legacy Anna to its appliance."""
+        appliance = self._find("appliance", appliance_id)
+        setpoint = self._setpoint(payload)
+        self._log(appliance, "thermostat", setpoint)
+        self._log(appliance, "target_temperature", setpoint)
+
+    @staticmethod
+    def _setpoint(payload):
+        """Get the setpoint of a payload, a 400 when it is not a number."""
+        setpoint = payload.findtext("setpoint")
+        try:
+            float(setpoint)
+        except (TypeError, ValueError) as err:
+            raise BadRequest(400, "Invalid setpoint {!r}".format(setpoint)) from err
+        return setpoint
+
+    def _set_rules(self, payload):
+        """Apply <rules><rule id><active/></rule></rules>."""
+        for change in payload.iterfind("rule"):
+            rule = self._find("rule", change.get("id"))
+            active = change.findtext("active")
+            if active not in ("true", "false"):
+                continue
+            if active == "true" and _tag(rule) == SCHEMA_TAG:
+                # Only one schema is active
+                for other in self.root.iterfind("rule"):
+                    if other is not rule and _tag(other) == SCHEMA_TAG:
+                        other.find("active").text = "false"
+            rule.find("active").text = active
+            modified = rule.find("modified_date")
+            if modified is not None:
+                modified.text = _now()
+        if not self.legacy:
+            scheduled = any(
+                rule.findtext("active") == "true"
+                for rule in self.root.iterfind("rule")
+                if _tag(rule) == SCHEMA_TAG
+            )
+            for appliance in self.root.iterfind("appliance"):
+                self._log(appliance, "schedule_state", "on" if scheduled else "off")
+
+
+class SmileHandler(http.server.BaseHTTPRequestHandler):
+    """Answer the requests of Haanna like a Smile gateway does."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _fault(self):
+        """Inject the latency and failures, returns True when they answered."""
+        emulator = self.server.emulator
+        latency = emulator.latency
+        if isinstance(latency, tuple):
+            latency = emulator.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+        emulator.count(self.command)
+        if emulator.drop_rate and emulator.random.random() < emulator.drop_rate:
+            emulator.count("dropped")
+            self.close_connection = True
+            return True
+        if emulator.error_rate and emulator.random.random() < emulator.error_rate:
+            emulator.count("errors")
+            self._reply(503)
+            return True
+        if emulator.credentials is not None and not self._authorized(
+            emulator.credentials
+        ):
+            self._reply(401)
+            return True
+        return False
+
+    def _authorized(self, credentials):
+        """Check the basic authentication of the request."""
+        expected = "Basic " + base64.b64encode(
+            "{}:{}".format(*credentials).encode()
+        ).decode()
+        return self.headers.get("Authorization") == expected
+
+    def _reply(self, status, body=b""):
+        """Send a response."""
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serve the objects, /ping answers 404 like the gateway."""
+        if self._fault():
+            return
+        body = self.server.emulator.state.body(self.path.split("?", 1)[0])
+        if body is None:
+            self._reply(404)
+        else:
+            self._reply(200, body)
+
+    def do_PUT(self):  # pylint: disable=invalid-name
+        """Apply a change of a location, thermostat or rule."""
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._fault():
+            return
+        try:
+            self.server.emulator.state.put(self.path, data)
+        except BadRequest as err:
+            self._reply(err.status, str(err).encode())
+            return
+        self._reply(200)
+
+    def log_message(self, *args):
+        """Keep the output clean."""
+
+
+class SmileEmulator:
+    """Define an emulated Smile gateway on a local port.
+
+    latency is seconds or a (min, max) range per request. error_rate of the
+    requests are answered with a 503 and drop_rate closed without an answer.
+    With credentials (username, password) other requests get a 401.
+    """
+
+    def __init__(
+        self,
+        domain_objects,
+        latency=0,
+        error_rate=0,
+        drop_rate=0,
+        padding=0,
+        credentials=None,
+        host="127.0.0.1",
+        port=0,
+        seed=None,
+    ):
+        """Set the constructor for this class."""
+        self.state = SmileState(domain_objects, padding)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.credentials = credentials
+        self.random = random.Random(seed)
+        self.stats = {"GET": 0, "PUT": 0, "errors": 0, "dropped": 0}
+        self._stats_lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer((host, port), SmileHandler)
+        self._server.daemon_threads = True
+        self._server.emulator = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    @classmethod
+    def from_fixture(cls, legacy=False, **kwargs):
+        """Emulate the recorded modern or legacy Anna of the repository fixtures."""
+        name = "legacy_anna_domain_objects" if legacy else "anna_domain_objects"
+        with open(os.path.join(FIXTURES, name + ".xml"), "rb") as fixture:
+            return cls(fixture.read(), **kwargs)
+
+    def count(self, name):
+        """Count a request or a fault."""
+        with self._stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def config(self, name=None):
+        """Get the keyword arguments of a Haanna for this gateway, with a fleet name."""
+        username, password = self.credentials or ("smile", "short_id")
+        config = {
+            "username": username,
+            "password": password,
+            "host": self.host,
+            "port": self.port,
+            "legacy_anna": self.state.legacy,
+        }
+        if name is not None:
+            config["name"] = name
+        return config
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            args=(POLL_INTERVAL,),
+            name="smile-emulator",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the port."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        """Start serving when entering the context manager."""
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop serving when leaving the context manager."""
+        self.stop()
+
+
+def serve_fleet(count, domain_objects=None, legacy=False, **kwargs):
+    """Start count emulators, returns them, the keyword arguments are of SmileEmulator.
+
+    Without domain_objects they emulate the recorded fixtures. A seed is
+    varied per gateway so the faults are not in lock step.
+    """
+    seed = kwargs.pop("seed", None)
+    emulators = []
+    for index in range(count):
+        gateway_seed = None if seed is None else seed + index
+        if domain_objects is None:
+            emulator = SmileEmulator.from_fixture(legacy, seed=gateway_seed, **kwargs)
+        else:
+            emulator = SmileEmulator(domain_objects, seed=gateway_seed, **kwargs)
+        emulators.append(emulator.start())
+    return emulators
+
+
+def stop_fleet(emulators):
+    """Stop many emulators at once."""
+    threads = [threading.Thread(target=emulator.stop) for emulator in emulators]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def soak(emulators, duration, interval, max_workers, deadline):
+    """Poll the emulators with a HaannaFleet for duration seconds, get the totals."""
+    from .fleet import HaannaFleet
+
+    configs = [
+        emulator.config("gw{}".format(index))
+        for index, emulator in enumerate(emulators)
+    ]
+    totals = {"polls": 0, "ok": 0, "failed": 0, "seconds": 0.0}
+    end = time.monotonic() + duration
+    with HaannaFleet(configs, max_workers=max_workers, deadline=deadline) as fleet:
+        while time.monotonic() < end:
+            start = time.monotonic()
+            results = fleet.poll()
+            totals["seconds"] += time.monotonic() - start
+            for result in results.values():
+                totals["polls"] += 1
+                totals["ok" if result.ok else "failed"] += 1
+            time.sleep(max(interval - (time.monotonic() - start), 0))
+    return totals
+
+
+def main(argv=None):
+    """Serve emulated gateways until interrupted, or soak test them."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gateways", type=int, default=1)
+    parser.add_argument("--fixture", help="domain_objects XML file to serve")
+    parser.add_argument("--legacy", action="store_true", help="emulate a legacy Anna")
+    parser.add_argument("--port", type=int, default=0, help="port of a single gateway")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0])
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--drop-rate", type=float, default=0)
+    parser.add_argument("--padding", type=int, default=0, help="extra bytes to serve")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--soak", type=float, help="seconds to poll with a fleet")
+    parser.add_argument("--interval", type=float, default=1)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--deadline", type=float, default=5)
+    args = parser.parse_args(argv)
+
+    domain_objects = None
+    if args.fixture:
+        with open(args.fixture, "rb") as fixture:
+            domain_objects = fixture.read()
+    latency = args.latency[0] if len(args.latency) == 1 else tuple(args.latency[:2])
+    options = {
+        "latency": latency,
+        "error_rate": args.error_rate,
+        "drop_rate": args.drop_rate,
+        "padding": args.padding,
+        "seed": args.seed,
+    }
+    if args.gateways == 1:
+        options["port"] = args.port
+    emulators = serve_fleet(args.gateways, domain_objects, args.legacy, **options)
+    try:
+        if args.soak:
+            totals = soak(
+                emulators, args.soak, args.interval, args.workers, args.deadline
+            )
+            totals["polls_per_second"] = totals["polls"] / max(totals["seconds"], 1e-9)
+            print(json.dumps(totals))
+        else:
+            for index, emulator in enumerate(emulators):
+                print(json.dumps(emulator.config("gw{}".format(index))))
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_fleet(emulators)
+
+
+if __name__ == "__main__":
+    main()
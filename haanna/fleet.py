@@ -0,0 +1,264 @@
+"""Poll many Plugwise gateways with a bounded worker pool."""
+
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import threading
+import time
+
+from .haanna import Haanna
+from .health import CircuitOpenError
+from .ratelimit import background
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_DEADLINE = 5
+
+
+class GatewayResult:
+    """Define the outcome of polling one gateway.
+
+    With a ParseOffload the state holds the ThermostatState parsed by a
+    worker process and domain_objects is None.
+    """
+
+    __slots__ = ("name", "domain_objects", "error", "duration", "state")
+
+    def __init__(
+        self, name, domain_objects=None, error=None, duration=None, state=None
+    ):
+        """Set the constructor for this class."""
+        self.name = name
+        self.domain_objects = domain_objects
+        self.error = error
+        self.duration = duration
+        self.state = state
+
+    @property
+    def ok(self):
+        """Tell whether the gateway answered in time."""
+        return self.error is None
+
+    def __repr__(self):
+        """Represent the result for logging."""
+        if self.error is not None:
+            return "<GatewayResult {} error={!r}>".format(self.name, self.error)
+        return "<GatewayResult {} {:.3f}s>".format(self.name, self.duration)
+
+
+class HaannaFleet:
+    """Define a fleet of gateways polled by a bounded pool of workers.
+
+    Gateways are given as dicts with the keyword arguments of Haanna and an
+    optional "name" (the host by default), or as (name, Haanna) pairs. A
+    gateway whose circuit breaker is open is not polled, its result is a
+    CircuitOpenError right away. With a ParseOffload the responses are
+    parsed into ThermostatStates by its worker processes, the fleet does
+    not close it. The polls are background reads for a rate limiter.
+
+    The deadline of a gateway starts when a worker starts its poll, a
+    gateway waiting for a free worker is not timed out by the others.
+    """
+
+    def __init__(
+        self,
+        gateways,
+        max_workers=DEFAULT_MAX_WORKERS,
+        deadline=DEFAULT_DEADLINE,
+        offload=None,
+    ):
+        """Set the constructor for this class."""
+        self.deadline = deadline
+        self.max_workers = max_workers
+        self.offload = offload
+        self.gateways = {}
+        for gateway in gateways:
+            if isinstance(gateway, dict):
+                config = dict(gateway)
+                name = config.pop("name", config["host"])
+                gateway = (name, Haanna(**config))
+            name, anna = gateway
+            if name in self.gateways:
+                raise ValueError("Duplicate gateway name {}.".format(name))
+            self.gateways[name] = anna
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="haanna-fleet"
+        )
+        # Submitted gateways, and the start of the running polls
+        self._busy = set()
+        self._running = {}
+        self._changed = threading.Condition()
+
+    def close(self):
+        """Stop the workers and close the gateway sessions."""
+        self._executor.shutdown(wait=False)
+        for anna in self.gateways.values():
+            anna.close()
+
+    def __enter__(self):
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop the fleet when leaving the context manager."""
+        self.close()
+
+    def _poll_gateway(self, name):
+        """Fetch the domain objects of one gateway, errors become results."""
+        start = time.monotonic()
+        with self._changed:
+            self._running[name] = start
+            self._changed.notify_all()
+        anna = self.gateways[name]
+        state = None
+        try:
+            with background():
+                if self.offload is None:
+                    domain_objects = anna.get_domain_objects(timeout=self.deadline)
+                else:
+                    domain_objects = None
+                    data = anna.get_domain_objects_data(timeout=self.deadline)
+            if self.offload is not None:
+                state = self.offload.submit(data, anna.legacy_anna).result()
+        except Exception as err:  # pylint: disable=broad-except
+            return GatewayResult(name, error=err, duration=time.monotonic() - start)
+        finally:
+            with self._changed:
+                self._busy.discard(name)
+                del self._running[name]
+                self._changed.notify_all()
+        duration = time.monotonic() - start
+        if duration > self.deadline:
+            return GatewayResult(name, error=self._timeout(), duration=duration)
+        return GatewayResult(name, domain_objects, duration=duration, state=state)
+
+    def _timeout(self):
+        """Create the error of a gateway that did not answer within the deadline."""
+        return TimeoutError("No answer within {}s.".format(self.deadline))
+
+    def _notify(self, future):
+        """Wake a sweep waiting for the polls."""
+        with self._changed:
+            self._changed.notify_all()
+
+    def health(self):
+        """Get the CircuitBreaker of each gateway, None for a gateway without one."""
+        return {
+            name: getattr(anna, "circuit_breaker", None)
+            for name, anna in self.gateways.items()
+        }
+
+    def _offline(self, name):
+        """Get the result of a gateway whose circuit is open, None when it can be polled."""
+        breaker = getattr(self.gateways[name], "circuit_breaker", None)
+        if breaker is None or not breaker.is_open:
+            return None
+        return GatewayResult(
+            name, error=CircuitOpenError("The gateway is offline."), duration=0
+        )
+
+    def _submit(self, name):
+        """Submit a poll unless the previous poll of the gateway is still running."""
+        with self._changed:
+            if name in self._busy:
+                return None
+            self._busy.add(name)
+        return self._executor.submit(self._poll_gateway, name)
+
+    def _stuck(self, now):
+        """Tell whether every worker is held by a poll past its deadline, with the lock held."""
+        return len(self._running) >= self.max_workers and all(
+            now >= start + self.deadline for start in self._running.values()
+        )
+
+    def poll(self, names=None):
+        """Poll the gateways at once, returns {name: GatewayResult}.
+
+        A gateway still waiting for a worker when every worker is held by a
+        poll past its deadline is not polled, its result is a TimeoutError.
+        """
+        futures = {}
+        results = {}
+        for name in self.gateways if names is None else names:
+            results[name] = self._offline(name)
+            if results[name] is not None:
+                continue
+            future = self._submit(name)
+            if future is None:
+                results[name] = GatewayResult(
+                    name, error=TimeoutError("The previous poll is still running.")
+                )
+            else:
+                futures[future] = name
+        for future in futures:
+            future.add_done_callback(self._notify)
+        with self._changed:
+            while futures:
+                self._collect(futures, results)
+                if futures:
+                    self._wait_for(futures, results)
+        return results
+
+    def _collect(self, futures, results):
+        """Move the finished and timed out polls to the results, with the lock held."""
+        now = time.monotonic()
+        for future, name in list(futures.items()):
+            start = self._running.get(name)
+            if future.done():
+                results[name] = future.result()
+            elif start is not None and now >= start + self.deadline:
+                # The worker stays busy until the request gives up
+                results[name] = GatewayResult(
+                    name, error=self._timeout(), duration=now - start
+                )
+            else:
+                continue
+            del futures[future]
+
+    def _wait_for(self, futures, results):
+        """Wait for a change of the polls, with the lock held.
+
+        The polls that did not start yet are cancelled when no worker is
+        going to be free for them.
+        """
+        now = time.monotonic()
+        if self._stuck(now):
+            for future, name in list(futures.items()):
+                if future.cancel():
+                    self._busy.discard(name)
+                    results[name] = GatewayResult(
+                        name, error=TimeoutError("No worker is free."), duration=0
+                    )
+                    del futures[future]
+            if not futures:
+                return
+        expiries = [
+            start + self.deadline
+            for name, start in self._running.items()
+            if name in futures.values() and start + self.deadline > now
+        ]
+        self._changed.wait(min(expiries) - now if expiries else None)
+
+    def run(self, interval, callback, stop_event=None):
+        """Poll every gateway once per interval, spread evenly over the interval.
+
+        The callback is called from the workers with each GatewayResult, this
+        blocks until the stop_event is set.
+        """
+        if stop_event is None:
+            stop_event = threading.Event()
+        names = list(self.gateways)
+        step = interval / max(len(names), 1)
+        now = time.monotonic()
+        schedule = [(now + index * step, name) for index, name in enumerate(names)]
+        heapq.heapify(schedule)
+        while schedule and not stop_event.is_set():
+            due, name = schedule[0]
+            if stop_event.wait(max(due - time.monotonic(), 0)):
+                break
+            heapq.heapreplace(schedule, (due + interval, name))
+            offline = self._offline(name)
+            if offline is not None:
+                callback(offline)
+                continue
+            future = self._submit(name)
+            if future is not None:
+                future.add_done_callback(lambda done: callback(done.result()))
@@ -1,13 +1,18 @@
 """Plugwise Anna Home Assistant component."""
 
-import requests
-import xml.etree.cElementTree as Etree
-# Time related
-import datetime
-import pytz
-from dateutil.parser import parse
 # For XML corrections
 import re
+import time
+
+from .batch import SetterBatch
+from .health import CircuitOpenError
+from .ratelimit import BACKGROUND, RateLimitedError, request_priority
+from .snapshot import DomainSnapshot
+from .state import ThermostatState
+from .stream import escape_ampersands, parse_stream
+from .topology import Topology
+from .zones import SCHEMA_TAG
+from .xmlbackend import get_backend
 
 ANNA_PING_ENDPOINT = "/ping"
 ANNA_DIRECT_OBJECTS_ENDPOINT = "/core/direct_objects"
@@ -16,70 +21,553 @@ ANNA_LOCATIONS_ENDPOINT = "/core/locations"
 ANNA_APPLIANCES = "/core/appliances"
 ANNA_RULES = "/core/rules"
 
+DEFAULT_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 0
+DEFAULT_BACKOFF_FACTOR = 0.5
+HTTP_OK = 200
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+STREAM_CHUNK_SIZE = 16384
+
+# The getters timed when metrics are enabled
+TIMED_GETTERS = (
+    "get_state",
+    "get_zones",
+    "get_zone",
+    "get_thermostats",
+    "get_presets",
+    "get_schema_names",
+    "get_active_schema_name",
+    "get_last_active_schema_name",
+    "get_schema_state",
+    "get_rule_id_by_template_tag",
+    "get_boiler_status",
+    "get_heating_status",
+    "get_cooling_status",
+    "get_domestic_hot_water_status",
+    "get_current_preset",
+    "get_schedule_temperature",
+    "get_current_temperature",
+    "get_target_temperature",
+    "get_thermostat_temperature",
+    "get_outdoor_temperature",
+    "get_illuminance",
+    "get_boiler_temperature",
+    "get_water_pressure",
+    "get_point_log_id",
+    "get_measurement_from_point_log",
+    "get_rule_id_by_name",
+    "get_preset_dictionary",
+    "get_active_mode",
+    "get_active_name",
+    "get_last_active_name",
+)
+
 
 class Haanna:
     """Define the Haanna object."""
 
     def __init__(
-        self, username, password, host, port, legacy_anna=False,
+        self,
+        username,
+        password,
+        host,
+        port,
+        legacy_anna=False,
+        timeout=DEFAULT_TIMEOUT,
+        pool_size=DEFAULT_POOL_SIZE,
+        keep_alive=True,
+        retries=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        session=None,
+        streaming=False,
+        cache_ttl=None,
+        metrics=None,
+        xml_backend=None,
+        circuit_breaker=None,
+        snapshot_path=None,
+        rate_limiter=None,
     ):
-        """Set the constructor for this class."""
+        """Set the constructor for this class.
+
+        xml_backend is "lxml" or "etree", by default lxml when it is installed.
+        With a CircuitBreaker the requests fail fast while the gateway is
+        offline. snapshot_path is the file of save_snapshot and load_snapshot.
+        With a RateLimiter the requests share a budget, a shed background read
+        of the objects returns the latest objects that were fetched.
+        """
         self.legacy_anna = legacy_anna
+        self.snapshot_path = snapshot_path
+        self.streaming = streaming
+        self.xml_backend = get_backend(xml_backend).name
         self._username = username
         self._password = password
         self._endpoint = "http://" + host + ":" + str(port)
+        self._timeout = timeout
+        self._owns_session = session is None
+        self._session = self._open_session(
+            session, pool_size, keep_alive, retries, backoff_factor
+        )
+        self._cache = None
+        if cache_ttl:
+            from .cache import ResponseCache
+
+            self._cache = ResponseCache(cache_ttl)
+        self._topology = None
+        self._write_listeners = []
+        self._metrics = metrics
+        if metrics is not None:
+            self._time_getters(metrics)
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        # The latest objects by endpoint, served when a background read is shed
+        self._latest = {}
+        # The time.time() of the latest objects by endpoint
+        self.last_fetched = {}
+
+    def _time_getters(self, metrics):
+        """Shadow the getters with timed ones on this object only."""
+
+        def timed(name, getter):
+            def timed_getter(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return getter(*args, **kwargs)
+                finally:
+                    metrics.record_getter(name, time.perf_counter() - start)
+
+            return timed_getter
+
+        for name in TIMED_GETTERS:
+            setattr(self, name, timed(name, getattr(self, name)))
+
+    def _open_session(self, session, pool_size, keep_alive, retries, backoff_factor):
+        """Return the given session or create a pooled one."""
+        if session is None:
+            session = self.create_session(
+                pool_size, keep_alive, retries, backoff_factor
+            )
+        return session
 
-    def ping_anna_thermostat(self):
-        """Ping the thermostat to see if it's online."""
-        ping = requests.get(
-            self._endpoint + ANNA_PING_ENDPOINT,
+    @staticmethod
+    def create_session(
+        pool_size=DEFAULT_POOL_SIZE,
+        keep_alive=True,
+        retries=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+    ):
+        """Create a pooled keep-alive session, it can be shared between instances."""
+        # requests is imported on first use, it dominates the import time
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET", "PUT"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def close(self):
+        """Close the pooled connections, a shared session is left open."""
+        if self._owns_session:
+            self._session.close()
+
+    def __enter__(self):
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the connections when leaving the context manager."""
+        self.close()
+
+    def _request(self, method, endpoint, timeout=None, **kwargs):
+        """Send a request to the gateway, through the circuit breaker if there is one."""
+        if self.rate_limiter is not None:
+            delay = self._reserve(method)
+            if delay:
+                time.sleep(delay)
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return self._send(method, endpoint, timeout, **kwargs)
+        if breaker.acquire():
+            self._probe()
+        start = time.monotonic()
+        try:
+            response = self._send(method, endpoint, timeout, **kwargs)
+        except Exception as err:
+            breaker.record_failure(time.monotonic() - start, err)
+            raise
+        breaker.record_response(response.status_code, time.monotonic() - start)
+        return response
+
+    def _reserve(self, method):
+        """Take a token of the rate limiter, returns the seconds to wait first."""
+        request_class = request_priority(method)
+        try:
+            delay = self.rate_limiter.reserve(request_class)
+        except RateLimitedError:
+            if self._metrics is not None:
+                self._metrics.record_rate_limit(request_class, "shed")
+            raise
+        if delay and self._metrics is not None:
+            self._metrics.record_rate_limit(request_class, "delayed")
+        return delay
+
+    def _latest_objects(self, endpoint, err):
+        """Get the latest objects for a shed background read, raises err otherwise.
+
+        The time they were fetched is in last_fetched. An interactive read asked
+        for fresh objects, so err is raised when it is shed.
+        """
+        root = self._latest.get(endpoint)
+        if root is None or request_priority("GET") != BACKGROUND:
+            raise err
+        return root
+
+    def _remember(self, endpoint, root):
+        """Keep fetched objects to serve a shed background read, with a rate limiter."""
+        if self.rate_limiter is not None and self._latest.get(endpoint) is not root:
+            self._latest[endpoint] = root
+            self.last_fetched[endpoint] = time.time()
+        return root
+
+    def get_rate_limit_stats(self):
+        """Get the tokens and the counters of the rate limiter, None without one."""
+        if self.rate_limiter is None:
+            return None
+        return self.rate_limiter.get_stats()
+
+    def _probe(self):
+        """Ping the gateway before a half-open circuit breaker lets a request through."""
+        breaker = self.circuit_breaker
+        start = time.monotonic()
+        try:
+            ping = self._send("GET", ANNA_PING_ENDPOINT, breaker.probe_timeout)
+        except Exception as err:  # pylint: disable=broad-except
+            breaker.record_failure(time.monotonic() - start, err)
+            raise CircuitOpenError("The gateway is still offline: {}".format(err)) from err
+        except BaseException as err:
+            # A cancelled or interrupted probe must not leave the circuit half-open
+            breaker.record_failure(
+                time.monotonic() - start, "Probe interrupted: {!r}".format(err)
+            )
+            raise
+        if ping.status_code != 404:
+            breaker.record_failure(time.monotonic() - start, "HTTP {}".format(ping.status_code))
+            raise CircuitOpenError("The gateway is still offline.")
+        breaker.record_success(time.monotonic() - start)
+
+    def _send(self, method, endpoint, timeout=None, **kwargs):
+        """Send a request to the gateway over the pooled session."""
+        if self._metrics is not None:
+            return self._timed_request(method, endpoint, timeout, **kwargs)
+        return self._session.request(
+            method,
+            self._endpoint + endpoint,
             auth=(self._username, self._password),
-            timeout=10,
+            timeout=self._timeout if timeout is None else timeout,
+            **kwargs
         )
 
+    def _timed_request(self, method, endpoint, timeout=None, **kwargs):
+        """Send a request and record its latency, status code and size."""
+        start = time.perf_counter()
+        try:
+            response = self._session.request(
+                method,
+                self._endpoint + endpoint,
+                auth=(self._username, self._password),
+                timeout=self._timeout if timeout is None else timeout,
+                **kwargs
+            )
+        except Exception:
+            self._metrics.record_request(endpoint, None, time.perf_counter() - start)
+            raise
+        # A streamed body is counted while it is parsed
+        size = 0 if kwargs.get("stream") else len(response.content)
+        self._metrics.record_request(
+            endpoint, response.status_code, time.perf_counter() - start, size
+        )
+        return response
+
+    def get_metrics(self):
+        """Get the metrics in the Prometheus text format, None when disabled."""
+        if self._metrics is None:
+            return None
+        return self._metrics.export()
+
+    def ping_anna_thermostat(self, timeout=None):
+        """Ping the thermostat to see if it's online."""
+        ping = self._request("GET", ANNA_PING_ENDPOINT, timeout=timeout)
+
         if ping.status_code != 404:
             raise ConnectionError("Could not connect to the gateway.")
 
         return True
 
-    def get_direct_objects(self):
+    def get_direct_objects(self, timeout=None):
         """Collect the direct_objects XML-data."""
-        xml = requests.get(
-              self._endpoint + ANNA_DIRECT_OBJECTS_ENDPOINT,
-              auth=(self._username, self._password),
-              timeout=10,
+        return self._get_objects(ANNA_DIRECT_OBJECTS_ENDPOINT, "direct", timeout)
+
+    def get_domain_objects(self, timeout=None):
+        """Collect the domain_objects XML-data."""
+        return self._get_objects(ANNA_DOMAIN_OBJECTS_ENDPOINT, "domain", timeout)
+
+    def get_domain_objects_data(self, timeout=None):
+        """Collect the domain_objects XML-data as bytes, without parsing it."""
+        xml = self._request("GET", ANNA_DOMAIN_OBJECTS_ENDPOINT, timeout=timeout)
+
+        if xml.status_code != HTTP_OK:
+            raise ConnectionError("Could not get the domain objects.")
+
+        return xml.content
+
+    def _get_objects(self, endpoint, name, timeout):
+        """Collect objects XML-data, from the cache when it is enabled."""
+        try:
+            if self._cache is None:
+                root = self._fetch_objects(endpoint, name, timeout)
+            else:
+                root = self._cache.get(
+                    endpoint, lambda: self._fetch_objects(endpoint, name, timeout)
+                )
+        except RateLimitedError as err:
+            return self._latest_objects(endpoint, err)
+        return self._remember(endpoint, root)
+
+    def _fetch_objects(self, endpoint, name, timeout):
+        """Fetch and parse objects XML-data from the gateway."""
+        if self.streaming:
+            return self._get_streamed_objects(endpoint, name, timeout)
+        xml = self._request("GET", endpoint, timeout=timeout)
+
+        if xml.status_code != HTTP_OK:
+            raise ConnectionError("Could not get the {} objects.".format(name))
+
+        return self._parse_response(endpoint, xml.content)
+
+    def _parse_response(self, endpoint, text):
+        """Parse a response, timed when metrics are enabled."""
+        if self._metrics is None:
+            return self.parse_xml(text, self.xml_backend)
+        start = time.perf_counter()
+        root = self.parse_xml(text, self.xml_backend)
+        self._metrics.record_parse(endpoint, time.perf_counter() - start)
+        return root
+
+    def invalidate_cache(self):
+        """Drop the cached objects, e.g. after changing the thermostat."""
+        if self._cache is not None:
+            self._cache.invalidate()
+
+    def add_write_listener(self, callback):
+        """Call callback after every successful change of the thermostat."""
+        self._write_listeners.append(callback)
+
+    def remove_write_listener(self, callback):
+        """Stop calling a write listener."""
+        self._write_listeners.remove(callback)
+
+    def _after_write(self):
+        """Drop the cached objects and tell the listeners the thermostat changed."""
+        self.invalidate_cache()
+        for callback in list(self._write_listeners):
+            callback()
+
+    def get_cache_stats(self):
+        """Get the hit, miss and coalesced counters of the cache."""
+        if self._cache is None:
+            return None
+        return self._cache.get_stats()
+
+    def refresh_topology(self, root=None, timeout=None):
+        """Resolve the ids used by the setters again, from root or a new fetch."""
+        if root is None:
+            root = self.get_domain_objects(timeout=timeout)
+        self._topology = Topology(root)
+        return self._topology
+
+    def save_snapshot(self, root, path=None):
+        """Save the state, ids, presets and schema names of a tree for a warm start."""
+        from .persist import StoredSnapshot, write_snapshot
+
+        try:
+            presets = self.get_presets(root)
+        except RuleIdNotFoundException:
+            presets = None
+        stored = StoredSnapshot(
+            self.get_state(root),
+            Topology(root),
+            presets,
+            self.get_schema_names(root),
+            time.time(),
         )
+        write_snapshot(path or self.snapshot_path, stored)
+        return stored
 
-        if xml.status_code != requests.codes.ok:  # pylint: disable=no-member
-            raise ConnectionError("Could not get the direct objects.")
+    def load_snapshot(self, path=None):
+        """Load the saved StoredSnapshot, None when there is no usable one.
 
-        return Etree.fromstring(self.escape_illegal_xml_characters(xml.text))
+        Until the ids are resolved from a fetched tree the setters use the
+        saved ones.
+        """
+        from .persist import read_snapshot
+
+        stored = read_snapshot(path or self.snapshot_path)
+        if stored is not None and self._topology is None:
+            self._topology = stored.topology
+        return stored
+
+    def invalidate_topology(self):
+        """Drop the resolved ids, the next setter resolves them from its root."""
+        self._topology = None
+
+    def _lookup(self, root, lookup):
+        """Look up in the resolved ids, they are resolved from root again on a miss."""
+        if self._topology is not None:
+            found = lookup(self._topology)
+            if found is not None:
+                return found
+        self._topology = Topology(root)
+        return lookup(self._topology)
+
+    def _check_put(self, xml):
+        """Drop the resolved ids and the cached objects they came from on a 404."""
+        if xml.status_code == 404:
+            self.invalidate_topology()
+            self.invalidate_cache()
+
+    def _get_streamed_objects(self, endpoint, name, timeout):
+        """Parse the objects while they are received, keeping what the getters use."""
+        with self._request("GET", endpoint, timeout=timeout, stream=True) as xml:
+            if xml.status_code != HTTP_OK:
+                raise ConnectionError("Could not get the {} objects.".format(name))
+
+            chunks = xml.iter_content(STREAM_CHUNK_SIZE)
+            if self._metrics is None:
+                return parse_stream(chunks, backend=self.xml_backend)
+            # The parse time includes receiving the body
+            start = time.perf_counter()
+            root = parse_stream(
+                self._count_received(endpoint, chunks), backend=self.xml_backend
+            )
+            self._metrics.record_parse(endpoint, time.perf_counter() - start)
+            return root
+
+    def _count_received(self, endpoint, chunks):
+        """Yield the chunks of a streamed response, recording the bytes received."""
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self._metrics.record_received(endpoint, size)
+
+    def iter_point_log_history(
+        self,
+        log_types,
+        start=None,
+        end=None,
+        page_size=None,
+        timeout=None,
+    ):
+        """Yield the measurements of the point logs of the given type(s) page by page.
 
-    def get_domain_objects(self):
-        """Collect the domain_objects XML-data."""
-        xml = requests.get(
-              self._endpoint + ANNA_DOMAIN_OBJECTS_ENDPOINT,
-              auth=(self._username, self._password),
-              timeout=10,
+        The domain objects are parsed while they are received, each page is a
+        PointLogSeries of at most page_size measurements of one point log.
+        start and end (datetimes or epoch seconds) limit the time range.
+        """
+        from .history import iter_history
+
+        log_types, start, end = self._history_range(log_types, start, end)
+        with self._request(
+            "GET", ANNA_DOMAIN_OBJECTS_ENDPOINT, timeout=timeout, stream=True
+        ) as xml:
+            if xml.status_code != HTTP_OK:
+                raise ConnectionError("Could not get the domain objects.")
+
+            chunks = xml.iter_content(STREAM_CHUNK_SIZE)
+            if self._metrics is not None:
+                chunks = self._count_received(ANNA_DOMAIN_OBJECTS_ENDPOINT, chunks)
+            yield from iter_history(
+                chunks, log_types, start, end, page_size, self.xml_backend
+            )
+
+    @staticmethod
+    def _history_range(log_types, start, end):
+        """Get the log types as a list and start and end as epoch seconds."""
+        if isinstance(log_types, str):
+            log_types = [log_types]
+        start, end = (
+            value.timestamp() if hasattr(value, "timestamp") else value
+            for value in (start, end)
         )
+        return log_types, start, end
+
+    def get_point_log_history(self, log_types, start=None, end=None, timeout=None):
+        """Get the measurements of the point logs of the given type(s) by point log id."""
+        history = {}
+        for page in self.iter_point_log_history(
+            log_types, start, end, timeout=timeout
+        ):
+            series = history.get(page.point_log_id)
+            if series is None:
+                history[page.point_log_id] = page
+            else:
+                series.extend(page)
+        return history
 
-        if xml.status_code != requests.codes.ok:  # pylint: disable=no-member
-            raise ConnectionError("Could not get the domain objects.")
+    @classmethod
+    def parse_xml(cls, text, backend=None):
+        """Parse a gateway response (bytes or str) into an XML tree with the named XML backend.
+
+        Bytes are handed to the parser without decoding, it reads the
+        encoding from the XML declaration.
+        """
+        return get_backend(backend).fromstring(cls.escape_illegal_xml_characters(text))
+
+    @classmethod
+    def parse_state(cls, data, legacy_anna=False, xml_backend=None):
+        """Parse a domain_objects response (bytes or str) into a ThermostatState.
 
-        return Etree.fromstring(self.escape_illegal_xml_characters(xml.text))
+        The getters of get_state run on the objects without a client, no
+        session is opened, e.g. in the worker process of a ParseOffload.
+        """
+        # get_state only reads legacy_anna, the connection is not set up
+        anna = cls.__new__(cls)
+        anna.legacy_anna = legacy_anna
+        return anna.get_state(cls.parse_xml(data, xml_backend))
 
     @staticmethod
     def escape_illegal_xml_characters(root):
-        """Replace illegal &-characters."""
+        """Replace illegal &-characters of bytes or str, unchanged when there are none."""
+        if not isinstance(root, str):
+            return escape_ampersands(root)
+        if "&" not in root:
+            return root
         return re.sub(r"&([^a-zA-Z#])", r"&amp;\1", root)
 
     def get_presets(self, root):
         """Get the presets from the thermostat."""
         if self.legacy_anna:
             return self.__get_preset_dictionary_v1(root)
-        rule_id = self.get_rule_id_by_template_tag(
+        rule_ids = self.get_rule_id_by_template_tag(
             root, "zone_setpoint_and_state_based_on_preset",
-        )[0]
+        )
+        rule_id = rule_ids[0] if rule_ids else None
 
         if rule_id is None:
             rule_id = self.get_rule_id_by_name(root, "Thermostat presets")
@@ -91,7 +579,7 @@ class Haanna:
 
     def get_schema_names(self, root):
         """Get schemas or schedules available."""
-        schemas = root.findall(".//rule")
+        schemas = DomainSnapshot.of(root).rules.values()
         result = []
         for schema in schemas:
             rule_name = schema.find("name").text
@@ -106,42 +594,65 @@ class Haanna:
             return None
         return result
 
-    def set_schema_state(self, root, schema, state):
+    def set_schema_state(self, root, schema, state, timeout=None):
         """Send a set request to the schema with the given name."""
-        schema_rule_id = self.get_rule_id_by_name(root, str(schema))
-        templates = root.findall(".//*[@id='{}']/template".format(schema_rule_id))
-        template_id = None
-        for rule in templates:
-            template_id = rule.attrib["id"]
+        uri, data = self._schema_state_request(root, schema, state)
 
-        uri = "{};id={}".format(ANNA_RULES, schema_rule_id)
-
-        state = str(state)
-        data = (
-            '<rules><rule id="{}"><name><![CDATA[{}]]></name>'
-            '<template id="{}" /><active>{}</active></rule>'
-            "</rules>".format(schema_rule_id, schema, template_id, state)
-        )
-
-        xml = requests.put(
-              self._endpoint + uri,
-              auth=(self._username, self._password),
+        xml = self._request(
+              "PUT",
+              uri,
+              timeout=timeout,
               data=data,
               headers={"Content-Type": "text/xml"},
-              timeout=10,
         )
 
-        if xml.status_code != requests.codes.ok:  # pylint: disable=no-member
-            CouldNotSetTemperatureException(
+        self._check_put(xml)
+        if xml.status_code != HTTP_OK:
+            raise CouldNotSetTemperatureException(
                 "Could not set the schema to {}.".format(state) + xml.text
             )
+        self._after_write()
 
         return "{} {}".format(xml.text, data)
 
+    def _schema_state_request(self, root, schema, state):
+        """Build the uri and payload to set the state of a schema."""
+        schema_rule_id, rule = self._schema_state_rule(root, schema, state)
+        uri = "{};id={}".format(ANNA_RULES, schema_rule_id)
+        return uri, "<rules>" + rule + "</rules>"
+
+    def _schema_state_rule(self, root, schema, state):
+        """Build the rule id and rule element to set the state of a schema."""
+        schema_rule_id, template_id = self._lookup(
+            root, lambda topology: self._schema_ids(topology, str(schema))
+        ) or (None, None)
+
+        return schema_rule_id, self._schema_rule(
+            schema_rule_id, schema, template_id, state
+        )
+
+    @staticmethod
+    def _schema_rule(rule_id, schema, template_id, state):
+        """Build the rule element to set the state of a schema."""
+        return (
+            '<rule id="{}"><name><![CDATA[{}]]></name>'
+            '<template id="{}" /><active>{}</active></rule>'.format(
+                rule_id, schema, template_id, str(state)
+            )
+        )
+
+    @staticmethod
+    def _schema_ids(topology, schema):
+        """Get the rule and template id of a schema."""
+        rule_id = topology.rule_ids_by_name.get(schema)
+        if rule_id is None:
+            return None
+        return rule_id, topology.template_ids[rule_id]
+
     def get_active_schema_name(self, root):
         """Get active schema."""
         if self.legacy_anna:
-            schemas = root.findall(".//rule")
+            schemas = DomainSnapshot.of(root).rules.values()
             result = []
             for schema in schemas:
                 rule_name = schema.find("name").text
@@ -169,170 +680,173 @@ class Haanna:
     @staticmethod
     def get_schema_state(root):
         """Get the mode the thermostat is in (active schedule is true or false)."""
-        log_type = "schedule_state"
-        locator = (
-            "appliance[type='thermostat']/logs/point_log[type='"
-            + log_type
-            + "']/period/measurement"
-        )
-        if root.find(locator) is not None:
-            return root.find(locator).text == "on"
+        measurement = DomainSnapshot.of(root).appliance_measurement(
+            "thermostat", "schedule_state"
+        )
+        if measurement is not None:
+            return measurement.text == "on"
         return None
 
     @staticmethod
     def get_rule_id_by_template_tag(root, rule_name):
         """Get the rule ID based on template_tag."""
-        schema_ids = []
-        rules = root.findall("rule")
-        for rule in rules:
-            if rule.find("template").attrib["tag"] == rule_name:
-                schema_ids.append(rule.attrib["id"])
-        if schema_ids == []:
+        schema_ids = DomainSnapshot.of(root).rule_ids_by_tag.get(rule_name)
+        if not schema_ids:
             return None
-        return schema_ids
+        return list(schema_ids)
 
-    def set_preset(self, root, preset):
+    def set_preset(self, root, preset, timeout=None):
         """Set the given preset on the thermostat."""
         if self.legacy_anna:
-            return self.__set_preset_v1(root, preset)
-        locator = "appliance[type='thermostat']/location"
-        location_id = root.find(locator).attrib["id"]
+            return self.__set_preset_v1(root, preset, timeout)
 
-        locations_root = Etree.fromstring(
-            requests.get(
-                self._endpoint + ANNA_LOCATIONS_ENDPOINT,
-                auth=(self._username, self._password),
-                timeout=10,
-            ).text
-        )
-
-        current_location = locations_root.find("location[@id='" + location_id + "']")
-        location_name = current_location.find("name").text
-        location_type = current_location.find("type").text
-
-        xml = requests.put(
-              self._endpoint + ANNA_LOCATIONS_ENDPOINT + ";id=" + location_id,
-              auth=(self._username, self._password),
-              data="<locations>"
-              + '<location id="'
-              + location_id
-              + '">'
-              + "<name>"
-              + location_name
-              + "</name>"
-              + "<type>"
-              + location_type
-              + "</type>"
-              + "<preset>"
-              + preset
-              + "</preset>"
-              + "</location>"
-              + "</locations>",
+        uri, data = self._preset_request(root, preset)
+
+        xml = self._request(
+              "PUT",
+              uri,
+              timeout=timeout,
+              data=data,
               headers={"Content-Type": "text/xml"},
-              timeout=10,
         )
 
-        if xml.status_code != requests.codes.ok:  # pylint: disable=no-member
+        self._check_put(xml)
+        if xml.status_code != HTTP_OK:
             raise CouldNotSetPresetException(
                 "Could not set the " "given preset: " + xml.text
             )
+        self._after_write()
         return xml.text
 
-    def __set_preset_v1(self, root, preset):
-        """Set the given preset on the thermostat for V1."""
-        locator = "rule/directives/when/then[@icon='" + preset + "'].../.../..."
-        rule = root.find(locator)
-        if rule is None:
-            raise CouldNotSetPresetException("Could not find preset '" + preset + "'")
+    def _preset_request(self, root, preset):
+        """Build the uri and payload to set a preset on the thermostat location."""
+        location_id, location_name, location_type = self._lookup(
+            root, self._location_ids
+        )
+        return self._location_preset_request(
+            location_id, location_name, location_type, preset
+        )
 
-        rule_id = rule.attrib["id"]
-        xml = requests.put(
-              self._endpoint + ANNA_RULES,
-              auth=(self._username, self._password),
-              data="<rules>"
-              + '<rule id="'
-              + rule_id
-              + '">'
-              + "<active>true</active>"
-              + "</rule>"
-              + "</rules>",
+    @staticmethod
+    def _location_preset_request(location_id, location_name, location_type, preset):
+        """Build the uri and payload to set a preset on a location."""
+        uri = ANNA_LOCATIONS_ENDPOINT + ";id=" + location_id
+        data = (
+            "<locations>"
+            + '<location id="'
+            + location_id
+            + '">'
+            + "<name>"
+            + location_name
+            + "</name>"
+            + "<type>"
+            + location_type
+            + "</type>"
+            + "<preset>"
+            + preset
+            + "</preset>"
+            + "</location>"
+            + "</locations>"
+        )
+        return uri, data
+
+    @staticmethod
+    def _location_ids(topology):
+        """Get the id, name and type of the thermostat location."""
+        if topology.location_name is None:
+            return None
+        return topology.location_id, topology.location_name, topology.location_type
+
+    def __set_preset_v1(self, root, preset, timeout=None):
+        """Set the given preset on the thermostat for V1."""
+        uri, data = self._preset_v1_request(root, preset)
+        xml = self._request(
+              "PUT",
+              uri,
+              timeout=timeout,
+              data=data,
               headers={"Content-Type": "text/xml"},
-              timeout=10,
         )
-        if xml.status_code != requests.codes.ok:  # pylint: disable=no-member
+        self._check_put(xml)
+        if xml.status_code != HTTP_OK:
             raise CouldNotSetPresetException(
                 "Could not set the given " "preset: " + xml.text
             )
+        self._after_write()
         return xml.text
 
+    def _preset_v1_request(self, root, preset):
+        """Build the uri and payload to activate a preset rule for V1."""
+        return ANNA_RULES, "<rules>" + self._preset_v1_rule(root, preset) + "</rules>"
+
+    def _preset_v1_rule(self, root, preset):
+        """Build the rule element to activate a preset rule for V1."""
+        rule_id = self._lookup(
+            root, lambda topology: topology.preset_rule_ids.get(preset)
+        )
+        if rule_id is None:
+            raise CouldNotSetPresetException("Could not find preset '" + preset + "'")
+
+        data = '<rule id="' + rule_id + '">' + "<active>true</active>" + "</rule>"
+        return data
+
     @staticmethod
     def get_boiler_status(root):
         """Get the active boiler-heating status (On-Off control)."""
-        log_type = "boiler_state"
-        locator = (
-            "appliance[type='heater_central']/logs/point_log[type='"
-            + log_type
-            + "']/period/measurement"
-        )
-        if root.find(locator) is not None:
-            return root.find(locator).text == "on"
+        measurement = DomainSnapshot.of(root).appliance_measurement(
+            "heater_central", "boiler_state"
+        )
+        if measurement is not None:
+            return measurement.text == "on"
         return None
 
     @staticmethod
     def get_heating_status(root):
         """Get the active heating status (OpenTherm control)."""
-        log_type = "central_heating_state"
-        locator = (
-            "appliance[type='heater_central']/logs/point_log[type='"
-            + log_type
-            + "']/period/measurement"
-        )
-        if root.find(locator) is not None:
-            return root.find(locator).text == "on"
+        measurement = DomainSnapshot.of(root).appliance_measurement(
+            "heater_central", "central_heating_state"
+        )
+        if measurement is not None:
+            return measurement.text == "on"
         return None
 
     @staticmethod
     def get_cooling_status(root):
         """Get the active cooling status."""
-        log_type = "cooling_state"
-        locator = (
-            "appliance[type='heater_central']/logs/point_log[type='"
-            + log_type
-            + "']/period/measurement"
-        )
-        if root.find(locator) is not None:
-            return root.find(locator).text == "on"
+        measurement = DomainSnapshot.of(root).appliance_measurement(
+            "heater_central", "cooling_state"
+        )
+        if measurement is not None:
+            return measurement.text == "on"
         return None
 
     def get_domestic_hot_water_status(self, root):
         """Get the domestic hot water status."""
         if self.legacy_anna:
             return None
-        log_type = "domestic_hot_water_state"
-        locator = (
-            "appliance[type='heater_central']/logs/point_log[type='"
-            + log_type
-            + "']/period/measurement"
-        )
-        if root.find(locator) is not None:
-            return root.find(locator).text == "on"
+        measurement = DomainSnapshot.of(root).appliance_measurement(
+            "heater_central", "domestic_hot_water_state"
+        )
+        if measurement is not None:
+            return measurement.text == "on"
         return None
 
     def get_current_preset(self, root):
         """Get the current active preset."""
         if self.legacy_anna:
-            active_rule = root.find("rule[active='true']/directives/when/then")
+            active_rule = None
+            for rule in DomainSnapshot.of(root).rules.values():
+                if rule.findtext("active") == "true":
+                    active_rule = rule.find("directives/when/then")
+                    if active_rule is not None:
+                        break
             if active_rule is None or "icon" not in active_rule.keys():
                 return "none"
             return active_rule.attrib["icon"]
 
-        log_type = "preset_state"
-        locator = (
-            "appliance[type='thermostat']/logs/point_log[type='"
-            + log_type
-            + "']/period/measurement"
-        )
-        return root.find(locator).text
+        return DomainSnapshot.of(root).appliance_measurement(
+            "thermostat", "preset_state"
+        ).text
 
     def get_schedule_temperature(self, root):
         """Get the temperature setting from the selected schedule."""
@@ -413,51 +927,234 @@ class Haanna:
             return value
         return None
 
+    def get_state(self, root, direct_root=None):
+        """Get all thermostat values in one ThermostatState.
+
+        The statuses are read from direct_root when it is given, like the
+        status getters are called with the direct objects.
+        """
+        snapshot = DomainSnapshot.of(root)
+        direct = snapshot if direct_root is None else DomainSnapshot.of(direct_root)
+
+        def measurement(log_type):
+            value = snapshot.measurement(log_type)
+            return float(value) if value else None
+
+        def status(log_type):
+            value = direct.appliance_measurement("heater_central", log_type)
+            return None if value is None else value.text == "on"
+
+        schema_state = snapshot.appliance_measurement("thermostat", "schedule_state")
+        if self.legacy_anna:
+            preset = self.get_current_preset(root)
+        else:
+            preset = snapshot.appliance_measurement("thermostat", "preset_state")
+            preset = None if preset is None else preset.text
+        return ThermostatState(
+            measurement("temperature"),
+            measurement("target_temperature"),
+            measurement("thermostat"),
+            measurement("schedule_temperature"),
+            measurement("outdoor_temperature"),
+            measurement("illuminance"),
+            measurement("boiler_temperature"),
+            measurement("central_heater_water_pressure"),
+            status("boiler_state"),
+            status("central_heating_state"),
+            status("cooling_state"),
+            None if self.legacy_anna else status("domestic_hot_water_state"),
+            None if schema_state is None else schema_state.text == "on",
+            preset,
+            self.get_active_schema_name(root),
+        )
+
+    @staticmethod
+    def get_zones(root):
+        """Get the Zone of each location id, all zones are read from one fetch."""
+        return DomainSnapshot.of(root).zones
+
+    @staticmethod
+    def get_zone(root, location_id):
+        """Get the Zone of a location id, None when there is no such location."""
+        return DomainSnapshot.of(root).zones.get(location_id)
+
+    @staticmethod
+    def get_thermostats(root):
+        """Get the location id of each thermostat appliance id."""
+        return {
+            thermostat_id: zone.location_id
+            for zone in DomainSnapshot.of(root).zones.values()
+            for thermostat_id in zone.thermostat_ids
+        }
+
     def __get_temperature_uri(self, root):
         """Determine the set_temperature uri for different versions of Anna."""
         if self.legacy_anna:
-            locator = "appliance[type='thermostat']"
-            appliance_id = root.find(locator).attrib["id"]
+            appliance_id = self._lookup(root, lambda topology: topology.appliance_id)
             return ANNA_APPLIANCES + ";id=" + appliance_id + "/thermostat"
-        locator = "appliance[type='thermostat']/location"
-        location_id = root.find(locator).attrib["id"]
-        locator = (
-            "location[@id='"
-            + location_id
-            + "']/actuator_functionalities/thermostat_functionality"
-        )
-        thermostat_functionality_id = root.find(locator).attrib["id"]
+        return self._lookup(root, self._location_temperature_uri)
 
-        temperature_uri = (
+    @staticmethod
+    def _location_temperature_uri(topology):
+        """Get the uri of the thermostat functionality of the thermostat location."""
+        if topology.thermostat_functionality_id is None:
+            return None
+        return (
             ANNA_LOCATIONS_ENDPOINT
             + ";id="
-            + location_id
+            + topology.location_id
             + "/thermostat;id="
-            + thermostat_functionality_id
+            + topology.thermostat_functionality_id
         )
-        return temperature_uri
 
-    def set_temperature(self, root, temperature):
+    def set_temperature(self, root, temperature, timeout=None):
         """Send a set request to the temperature with the given temperature."""
-        uri = self.__get_temperature_uri(root)
-
-        temperature = str(temperature)
+        uri, data = self._temperature_request(root, temperature)
 
-        xml = requests.put(
-              self._endpoint + uri,
-              auth=(self._username, self._password),
-              data="<thermostat_functionality><setpoint>"
-              + temperature
-              + "</setpoint></thermostat_functionality>",
+        xml = self._request(
+              "PUT",
+              uri,
+              timeout=timeout,
+              data=data,
               headers={"Content-Type": "text/xml"},
-              timeout=10,
         )
 
-        if xml.status_code != requests.codes.ok:  # pylint: disable=no-member
-            CouldNotSetTemperatureException("Could not set the temperature." + xml.text)
+        self._check_put(xml)
+        if xml.status_code != HTTP_OK:
+            raise CouldNotSetTemperatureException(
+                "Could not set the temperature." + xml.text
+            )
+        self._after_write()
+
+        return xml.text
+
+    def _temperature_request(self, root, temperature):
+        """Build the uri and payload to set the thermostat setpoint."""
+        return self.__get_temperature_uri(root), self._setpoint_data(temperature)
 
+    @staticmethod
+    def _setpoint_data(temperature):
+        """Build the payload to set a setpoint."""
+        return (
+            "<thermostat_functionality><setpoint>"
+            + str(temperature)
+            + "</setpoint></thermostat_functionality>"
+        )
+
+    @staticmethod
+    def _zone(root, location_id, exception):
+        """Get the Zone of a location id, raises exception when there is none."""
+        zone = DomainSnapshot.of(root).zones.get(location_id)
+        if zone is None:
+            raise exception("Could not find location {}.".format(location_id))
+        return zone
+
+    def _put_change(self, uri, data, timeout, exception, message):
+        """Send a change to the gateway, returns the response text."""
+        xml = self._request(
+            "PUT", uri, timeout=timeout, data=data, headers={"Content-Type": "text/xml"}
+        )
+        self._check_put(xml)
+        if xml.status_code != HTTP_OK:
+            raise exception(message + xml.text)
+        self._after_write()
         return xml.text
 
+    def set_zone_temperature(self, root, location_id, temperature, timeout=None):
+        """Set the setpoint of the thermostat of a location."""
+        zone = self._zone(root, location_id, CouldNotSetTemperatureException)
+        if zone.functionality_id is None:
+            raise CouldNotSetTemperatureException(
+                "Location {} has no thermostat.".format(location_id)
+            )
+        uri = "{};id={}/thermostat;id={}".format(
+            ANNA_LOCATIONS_ENDPOINT, location_id, zone.functionality_id
+        )
+        return self._put_change(
+            uri,
+            self._setpoint_data(temperature),
+            timeout,
+            CouldNotSetTemperatureException,
+            "Could not set the temperature.",
+        )
+
+    def set_zone_preset(self, root, location_id, preset, timeout=None):
+        """Set the given preset on a location."""
+        zone = self._zone(root, location_id, CouldNotSetPresetException)
+        uri, data = self._location_preset_request(
+            location_id, zone.name, zone.type, preset
+        )
+        return self._put_change(
+            uri, data, timeout, CouldNotSetPresetException, "Could not set the given preset: "
+        )
+
+    def set_zone_schema_state(self, root, location_id, schema, state, timeout=None):
+        """Set the state of the schema with the given name of a location."""
+        snapshot = DomainSnapshot.of(root)
+        rule_index = snapshot.rule_index
+        for rule_id in snapshot.rule_ids_by_tag.get(SCHEMA_TAG, ()):
+            entry = rule_index[rule_id]
+            if entry.name == str(schema) and location_id in entry.location_ids:
+                break
+        else:
+            raise RuleIdNotFoundException(
+                "Could not find schema {} of location {}.".format(schema, location_id)
+            )
+        template_id = snapshot.rules[rule_id].find("template").attrib["id"]
+        data = "<rules>" + self._schema_rule(rule_id, schema, template_id, state) + "</rules>"
+        return self._put_change(
+            "{};id={}".format(ANNA_RULES, rule_id),
+            data,
+            timeout,
+            CouldNotSetTemperatureException,
+            "Could not set the schema to {}.".format(state),
+        )
+
+    def batch(self, root, timeout=None, debounce=None):
+        """Queue setpoint, preset and schema changes, sent with the fewest PUTs."""
+        return SetterBatch(self, root, timeout, debounce)
+
+    def command_queue(self, root, timeout=None, **kwargs):
+        """Queue setpoint, preset and schema changes, sent in the background.
+
+        The keyword arguments (retries, backoff, max_backoff) configure the
+        retries of the CommandQueue.
+        """
+        from .commands import CommandQueue
+
+        return CommandQueue(self, root, timeout, **kwargs)
+
+    def _batch_requests(self, root, temperature=None, preset=None, schemas=None):
+        """Build the (uri, payload, exception) of each PUT for a set of changes.
+
+        The schema changes and a V1 preset share one PUT to the rules, the
+        preset and the setpoint go to the thermostat location last, so the
+        setpoint is not overridden by the preset.
+        """
+        puts = []
+        rules = [
+            self._schema_state_rule(root, schema, state)
+            for schema, state in (schemas or {}).items()
+        ]
+        exception = CouldNotSetTemperatureException
+        if preset is not None and self.legacy_anna:
+            rules.append((None, self._preset_v1_rule(root, preset)))
+            exception = CouldNotSetPresetException
+        if len(rules) == 1 and rules[0][0] is not None:
+            uri = "{};id={}".format(ANNA_RULES, rules[0][0])
+        else:
+            uri = ANNA_RULES
+        if rules:
+            data = "<rules>" + "".join(rule for dummy, rule in rules) + "</rules>"
+            puts.append((uri, data, exception))
+        if preset is not None and not self.legacy_anna:
+            uri, data = self._preset_request(root, preset)
+            puts.append((uri, data, CouldNotSetPresetException))
+        if temperature is not None:
+            uri, data = self._temperature_request(root, temperature)
+            puts.append((uri, data, CouldNotSetTemperatureException))
+        return puts
+
     def get_anna_endpoint(self):
         """Get the ANNA Endpoint."""
         return self._endpoint
@@ -465,34 +1162,26 @@ class Haanna:
     @staticmethod
     def get_point_log_id(root, log_type):
         """Get the point log ID based on log type."""
-        locator = (
-            "module/services/*[@log_type='" + log_type + "']/functionalities/point_log"
-        )
-        if root.find(locator) is not None:
-            return root.find(locator).attrib["id"]
-        return None
+        return DomainSnapshot.of(root).point_log_ids.get(log_type)
 
     @staticmethod
     def get_measurement_from_point_log(root, point_log_id):
         """Get the measurement from a point log based on point log ID."""
-        locator = "*/logs/point_log[@id='" + point_log_id + "']/period/measurement"
-        if root.find(locator) is not None:
-            return root.find(locator).text
+        measurement = DomainSnapshot.of(root).measurements.get(point_log_id)
+        if measurement is not None:
+            return measurement.text
         return None
 
     @staticmethod
     def get_rule_id_by_name(root, rule_name):
         """Get the rule ID based on name."""
-        rules = root.findall("rule")
-        for rule in rules:
-            if rule.find("name").text == rule_name:
-                return rule.attrib["id"]
+        return DomainSnapshot.of(root).rule_ids_by_name.get(rule_name)
 
     @staticmethod
     def get_preset_dictionary(root, rule_id):
         """Get the presets from a rule based on rule ID and returns a dictionary with all the key-value pairs."""
         preset_dictionary = {}
-        directives = root.find("rule[@id='" + rule_id + "']/directives")
+        directives = DomainSnapshot.of(root).rules[rule_id].find("directives")
         for directive in directives:
             preset = directive.find("then").attrib
             keys, dummy = zip(*preset.items())
@@ -512,48 +1201,40 @@ class Haanna:
         'no_frost': 10.0, 'asleep': 15.0}.
         """
         preset_dictionary = {}
-        directives = root.findall("rule/directives/when/then")
-        for directive in directives:
-            if directive is not None and "icon" in directive.keys():
-                preset_dictionary[directive.attrib["icon"]] = float(
-                    directive.attrib["temperature"]
-                )
+        for dummy, directive in DomainSnapshot.of(root).icon_directives:
+            preset_dictionary[directive.attrib["icon"]] = float(
+                directive.attrib["temperature"]
+            )
         return preset_dictionary
 
     @staticmethod
     def get_active_mode(root, schema_ids):
         """Get the mode from a (list of) rule id(s)."""
-        active = False
-        for schema_id in schema_ids:
-            if root.find("rule[@id='" + schema_id + "']/active").text == "true":
-                active = True
-                break
-        return active
+        rule_index = DomainSnapshot.of(root).rule_index
+        return any(rule_index[schema_id].active for schema_id in schema_ids)
 
     @staticmethod
     def get_active_name(root, schema_ids):
         """Get the active schema from a (list of) rule id(s)."""
-        active = None
+        rule_index = DomainSnapshot.of(root).rule_index
         for schema_id in schema_ids:
-            locator = root.find("rule[@id='" + schema_id + "']/active")
+            entry = rule_index[schema_id]
             # Only one can be active
-            if locator.text == "true":
-                active = root.find("rule[@id='" + schema_id + "']/name").text
-                return active
+            if entry.active:
+                return entry.name
+        return None
 
     @staticmethod
     def get_last_active_name(root, schema_ids):
         """Get the last active schema from a (list of) rule id(s)."""
-        schemas = {}
-        epoch = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
-        date_format = "%Y-%m-%dT%H:%M:%S.%f%z"
+        rule_index = DomainSnapshot.of(root).rule_index
+        last = None
         for schema_id in schema_ids:
-            schema_name = root.find("rule[@id='" + schema_id + "']/name").text
-            schema_date = root.find("rule[@id='" + schema_id + "']/modified_date").text
-            schema_time = parse(schema_date)
-            schemas[schema_name] = (schema_time - epoch).total_seconds()
-        last_modified = sorted(schemas.items(), key=lambda kv: kv[1])[-1][0]
-        return last_modified
+            entry = rule_index[schema_id]
+            # The last of equally modified schemas wins, like a stable sort
+            if last is None or entry.modified >= last.modified:
+                last = entry
+        return None if last is None else last.name
 
 
 class AnnaException(Exception):
@@ -0,0 +1,124 @@
+"""Health tracking and circuit breaking of a gateway."""
+
+import collections
+import threading
+import time
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30
+DEFAULT_PROBE_TIMEOUT = 3
+DEFAULT_WINDOW = 20
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raise an exception for a request to a gateway that is considered offline."""
+
+
+class CircuitBreaker:
+    """Define the health of a gateway, which fails requests fast while it is offline.
+
+    The circuit opens after failure_threshold failed requests in a row (no
+    answer or a 5xx) and requests raise CircuitOpenError right away. After
+    reset_timeout seconds one request pings the gateway with probe_timeout
+    first: the circuit closes when it answers and opens again when it does
+    not. The latency and error rate are kept over the last window requests.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout=DEFAULT_RESET_TIMEOUT,
+        probe_timeout=DEFAULT_PROBE_TIMEOUT,
+        window=DEFAULT_WINDOW,
+    ):
+        """Set the constructor for this class."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.last_error = None
+        self.opened_at = None
+        self._lock = threading.Lock()
+        # (seconds, ok) of the last requests
+        self._window = collections.deque(maxlen=window)
+
+    @property
+    def is_open(self):
+        """Tell whether requests fail fast, until the next probe is due."""
+        with self._lock:
+            return self._failing_fast(time.monotonic())
+
+    def _failing_fast(self, now):
+        """Tell whether a request has to fail fast, with the lock held."""
+        if self.state == HALF_OPEN:
+            return True
+        return self.state == OPEN and now < self.opened_at + self.reset_timeout
+
+    def acquire(self):
+        """Check that a request may be sent, returns True when it has to probe first.
+
+        Raises CircuitOpenError while the circuit is open or another request
+        is probing.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            if self._failing_fast(time.monotonic()):
+                raise CircuitOpenError(
+                    "The gateway is offline: {}".format(self.last_error)
+                )
+            self.state = HALF_OPEN
+            return True
+
+    def record_success(self, seconds):
+        """Record an answered request and close the circuit."""
+        with self._lock:
+            self._window.append((seconds, True))
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, seconds, error):
+        """Record a failed request, opens the circuit after too many in a row."""
+        with self._lock:
+            self._window.append((seconds, False))
+            self.failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def record_response(self, status_code, seconds):
+        """Record a response, a 5xx is a failure."""
+        if status_code >= 500:
+            self.record_failure(seconds, "HTTP {}".format(status_code))
+        else:
+            self.record_success(seconds)
+
+    @property
+    def error_rate(self):
+        """Get the share of failed requests in the window, None without requests."""
+        with self._lock:
+            if not self._window:
+                return None
+            return sum(1 for dummy, ok in self._window if not ok) / len(self._window)
+
+    @property
+    def latency(self):
+        """Get the mean seconds of the answered requests in the window, or None."""
+        with self._lock:
+            answered = [seconds for seconds, ok in self._window if ok]
+        if not answered:
+            return None
+        return sum(answered) / len(answered)
+
+    def __repr__(self):
+        """Represent the health for logging."""
+        return "<CircuitBreaker {} failures={} error_rate={} latency={}>".format(
+            self.state, self.failures, self.error_rate, self.latency
+        )
@@ -0,0 +1,152 @@
+"""Point log history extracted from the gateway objects."""
+
+from array import array
+
+from .stream import AmpersandEscaper
+from .timestamps import to_epoch
+from .xmlbackend import get_backend
+
+DEFAULT_PAGE_SIZE = 4096
+STATE_VALUES = {"on": 1.0, "off": 0.0}
+
+
+class PointLogSeries:
+    """Define a page of the measurements of one point log.
+
+    timestamps (epoch seconds) and values are array("d") buffers, e.g. for
+    numpy.frombuffer, in the order of the gateway (newest first).
+    """
+
+    __slots__ = ("point_log_id", "log_type", "unit", "timestamps", "values")
+
+    def __init__(self, point_log_id, log_type, unit):
+        """Set the constructor for this class."""
+        self.point_log_id = point_log_id
+        self.log_type = log_type
+        self.unit = unit
+        self.timestamps = array("d")
+        self.values = array("d")
+
+    def __len__(self):
+        """Get the number of measurements."""
+        return len(self.values)
+
+    def extend(self, other):
+        """Append the measurements of another page of the same point log."""
+        self.timestamps.extend(other.timestamps)
+        self.values.extend(other.values)
+
+    def __repr__(self):
+        """Represent the series for logging."""
+        return "<PointLogSeries {} {} {} measurements>".format(
+            self.point_log_id, self.log_type, len(self)
+        )
+
+
+class HistoryParser:
+    """Define an incremental parser of the measurements of some point log types."""
+
+    def __init__(
+        self, log_types, start=None, end=None, page_size=DEFAULT_PAGE_SIZE, backend=None
+    ):
+        """Set the constructor for this class, start and end are epoch seconds."""
+        self._log_types = frozenset(log_types)
+        self._start = start
+        self._end = end
+        self._page_size = page_size
+        self._escaper = AmpersandEscaper()
+        self._parser = get_backend(backend).pull_parser(("start", "end"))
+        self._stack = []
+        # point_log id -> the page being filled
+        self._pages = {}
+        self._point_log = None
+        self._series = None
+
+    def feed(self, chunk):
+        """Feed a chunk of the response, returns the pages that are full."""
+        self._parser.feed(self._escaper.feed(chunk))
+        return self._read()
+
+    def close(self):
+        """Finish parsing, returns the remaining pages."""
+        self._parser.feed(self._escaper.flush())
+        self._parser.close()
+        pages = self._read()
+        pages.extend(page for page in self._pages.values() if len(page))
+        self._pages.clear()
+        return pages
+
+    def _read(self):
+        """Collect the measurements of the parsed elements and drop the elements."""
+        full = []
+        stack = self._stack
+        for event, element in self._parser.read_events():
+            if event == "start":
+                stack.append(element)
+                if element.tag == "point_log":
+                    self._point_log = element
+                    self._series = None
+                continue
+            stack.pop()
+            tag = element.tag
+            if tag == "measurement":
+                if self._series is not None:
+                    self._add(element, full)
+                element.clear()
+            elif tag == "unit" and stack and stack[-1] is self._point_log:
+                if self._series is not None:
+                    self._series.unit = element.text
+            elif tag == "type" and stack and stack[-1] is self._point_log:
+                self._select(element.text)
+            elif tag == "point_log":
+                self._point_log = None
+                self._series = None
+            if len(stack) == 1:
+                # Keep the tree small, the measurements have been collected
+                stack[0].remove(element)
+        return full
+
+    def _select(self, log_type):
+        """Start collecting a point log when its type is wanted."""
+        if log_type not in self._log_types:
+            return
+        point_log_id = self._point_log.attrib.get("id")
+        series = self._pages.get(point_log_id)
+        if series is None:
+            series = self._pages[point_log_id] = PointLogSeries(
+                point_log_id, log_type, None
+            )
+        self._series = series
+
+    def _add(self, measurement, full):
+        """Add a measurement in the time range to its page."""
+        text = measurement.text
+        try:
+            value = float(text)
+        except (TypeError, ValueError):
+            value = STATE_VALUES.get(text)
+            if value is None:
+                return
+        timestamp = to_epoch(measurement.attrib["log_date"])
+        if self._start is not None and timestamp < self._start:
+            return
+        if self._end is not None and timestamp >= self._end:
+            return
+        series = self._series
+        series.timestamps.append(timestamp)
+        series.values.append(value)
+        if len(series) >= self._page_size:
+            full.append(series)
+            self._series = self._pages[series.point_log_id] = PointLogSeries(
+                series.point_log_id, series.log_type, series.unit
+            )
+
+
+def iter_history(chunks, log_types, start=None, end=None, page_size=None, backend=None):
+    """Yield PointLogSeries pages of the measurements in byte chunks of objects XML."""
+    parser = HistoryParser(
+        log_types, start, end, page_size or DEFAULT_PAGE_SIZE, backend
+    )
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -0,0 +1,173 @@
+"""Timing metrics of the gateway calls, parsing and getters."""
+
+import threading
+
+
+def endpoint_of(uri):
+    """Get the endpoint of a uri, without the ids of the resource."""
+    return uri.split(";", 1)[0]
+
+
+class Summary:
+    """Define the count and sum of the observed values."""
+
+    __slots__ = ("count", "sum")
+
+    def __init__(self):
+        """Set the constructor for this class."""
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add a value."""
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """Define the metrics of one or more Haanna objects.
+
+    Subclasses can override the record methods to forward the measurements,
+    export() renders them in the Prometheus text format.
+    """
+
+    def __init__(self):
+        """Set the constructor for this class."""
+        self._lock = threading.Lock()
+        # endpoint -> Summary of the request latency in seconds
+        self.requests = {}
+        # endpoint -> bytes received
+        self.received = {}
+        # (endpoint, status code or "error") -> responses
+        self.statuses = {}
+        # endpoint -> Summary of the escape and parse time in seconds
+        self.parses = {}
+        # getter name -> Summary of the evaluation time in seconds
+        self.getters = {}
+        # gateway -> changes queued or being sent by its command queue
+        self.queue_depths = {}
+        # endpoint -> PUTs retried by a command queue
+        self.retries = {}
+        # (priority class, "delayed" or "shed") -> requests
+        self.rate_limited = {}
+
+    @staticmethod
+    def _observe(summaries, key, value):
+        """Add a value to the summary of a key."""
+        summary = summaries.get(key)
+        if summary is None:
+            summary = summaries[key] = Summary()
+        summary.observe(value)
+
+    def record_request(self, uri, status_code, seconds, size=0):
+        """Record a request, the status code is None when it raised."""
+        endpoint = endpoint_of(uri)
+        status = "error" if status_code is None else str(status_code)
+        with self._lock:
+            self._observe(self.requests, endpoint, seconds)
+            self.statuses[endpoint, status] = self.statuses.get((endpoint, status), 0) + 1
+            self.received[endpoint] = self.received.get(endpoint, 0) + size
+
+    def record_received(self, uri, size):
+        """Record the bytes of a streamed response."""
+        endpoint = endpoint_of(uri)
+        with self._lock:
+            self.received[endpoint] = self.received.get(endpoint, 0) + size
+
+    def record_parse(self, uri, seconds):
+        """Record the time to escape and parse a response."""
+        with self._lock:
+            self._observe(self.parses, endpoint_of(uri), seconds)
+
+    def record_getter(self, name, seconds):
+        """Record the evaluation time of a getter."""
+        with self._lock:
+            self._observe(self.getters, name, seconds)
+
+    def record_queue_depth(self, gateway, depth):
+        """Record the number of changes a command queue has to send."""
+        with self._lock:
+            self.queue_depths[gateway] = depth
+
+    def record_retry(self, uri):
+        """Record a retried PUT of a command queue."""
+        endpoint = endpoint_of(uri)
+        with self._lock:
+            self.retries[endpoint] = self.retries.get(endpoint, 0) + 1
+
+    def record_rate_limit(self, priority, outcome):
+        """Record a request delayed or shed by a rate limiter."""
+        with self._lock:
+            key = (priority, outcome)
+            self.rate_limited[key] = self.rate_limited.get(key, 0) + 1
+
+    def export(self):
+        """Render the metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            self._export_summary(
+                lines, "haanna_request_seconds", "Gateway request latency.",
+                "endpoint", self.requests,
+            )
+            self._export_counter(
+                lines, "haanna_received_bytes_total", "Bytes received from the gateway.",
+                {'endpoint="{}"'.format(key): value for key, value in self.received.items()},
+            )
+            self._export_counter(
+                lines, "haanna_responses_total", "Gateway responses by status code.",
+                {
+                    'endpoint="{}",status="{}"'.format(endpoint, status): value
+                    for (endpoint, status), value in self.statuses.items()
+                },
+            )
+            self._export_summary(
+                lines, "haanna_parse_seconds", "Response escape and parse time.",
+                "endpoint", self.parses,
+            )
+            self._export_summary(
+                lines, "haanna_getter_seconds", "Getter evaluation time.",
+                "getter", self.getters,
+            )
+            self._export_values(
+                lines, "haanna_command_queue_depth", "Changes waiting in a command queue.",
+                "gauge",
+                {'gateway="{}"'.format(key): value for key, value in self.queue_depths.items()},
+            )
+            self._export_counter(
+                lines, "haanna_command_retries_total", "PUTs retried by a command queue.",
+                {'endpoint="{}"'.format(key): value for key, value in self.retries.items()},
+            )
+            self._export_counter(
+                lines, "haanna_rate_limited_total", "Requests delayed or shed by a rate limiter.",
+                {
+                    'priority="{}",outcome="{}"'.format(priority, outcome): value
+                    for (priority, outcome), value in self.rate_limited.items()
+                },
+            )
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _export_summary(lines, name, help_text, label, summaries):
+        """Render the count and sum of each summary."""
+        if not summaries:
+            return
+        lines.append("# HELP {} {}".format(name, help_text))
+        lines.append("# TYPE {} summary".format(name))
+        for key, summary in sorted(summaries.items()):
+            lines.append('{}_count{{{}="{}"}} {}'.format(name, label, key, summary.count))
+            lines.append('{}_sum{{{}="{}"}} {!r}'.format(name, label, key, summary.sum))
+
+    @classmethod
+    def _export_counter(cls, lines, name, help_text, values):
+        """Render a counter per label set."""
+        cls._export_values(lines, name, help_text, "counter", values)
+
+    @staticmethod
+    def _export_values(lines, name, help_text, kind, values):
+        """Render a value of the given metric type per label set."""
+        if not values:
+            return
+        lines.append("# HELP {} {}".format(name, help_text))
+        lines.append("# TYPE {} {}".format(name, kind))
+        for labels, value in sorted(values.items()):
+            lines.append("{}{{{}}} {}".format(name, labels, value))
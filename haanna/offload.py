@@ -0,0 +1,148 @@
+"""Parse gateway responses in a pool of worker processes."""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import os
+import threading
+
+from .haanna import Haanna
+from .state import ThermostatState
+from .xmlbackend import get_backend
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_LINGER = 0.005
+
+
+def extract_states(batch, xml_backend):
+    """Parse a batch of (data, legacy_anna) in a worker process.
+
+    Returns (True, values of the ThermostatState) or (False, error message)
+    for each response, so only a few floats and strings go back.
+    """
+    results = []
+    for data, legacy_anna in batch:
+        try:
+            state = Haanna.parse_state(data, legacy_anna, xml_backend)
+        except Exception as err:  # pylint: disable=broad-except
+            results.append((False, "{}: {}".format(type(err).__name__, err)))
+        else:
+            results.append((True, state.values()))
+    return results
+
+
+def _resolve(done, futures):
+    """Set the outcome of each response of a parsed batch."""
+    try:
+        results = done.result()
+    except Exception as err:  # pylint: disable=broad-except
+        for future in futures:
+            future.set_exception(err)
+        return
+    for future, (ok, value) in zip(futures, results):
+        if ok:
+            future.set_result(ThermostatState(*value))
+        else:
+            future.set_exception(
+                ValueError("Could not parse the objects: {}".format(value))
+            )
+
+
+class ParseOffload:
+    """Define a pool of processes that parse responses into ThermostatStates.
+
+    The responses are fetched in this process and their bytes are sent to
+    the workers, which return the values of the state instead of the XML
+    tree. Submitted responses are sent in batches of batch_size, or after
+    linger seconds when fewer come in, to share the cost of a round trip.
+    """
+
+    def __init__(
+        self,
+        max_workers=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        linger=DEFAULT_LINGER,
+        xml_backend=None,
+        mp_context=None,
+    ):
+        """Set the constructor for this class."""
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.linger = linger
+        # Resolved here, so every worker parses with the same backend
+        self.xml_backend = get_backend(xml_backend).name
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=mp_context
+        )
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+
+    def close(self, wait=True):
+        """Send the pending responses and stop the workers."""
+        self.flush()
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop the workers when leaving the context manager."""
+        self.close()
+
+    def submit(self, data, legacy_anna=False):
+        """Queue a response (bytes or str), returns a Future of its ThermostatState.
+
+        The Future raises ValueError when the response can not be parsed.
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((data, legacy_anna, future))
+            batch = None
+            if len(self._pending) >= self.batch_size:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.linger, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._send(batch)
+        return future
+
+    def flush(self):
+        """Send the pending responses to a worker now."""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def _take(self):
+        """Take the pending responses, with the lock held."""
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _send(self, batch):
+        """Parse a batch in a worker."""
+        futures = [future for dummy, dummy, future in batch]
+        try:
+            done = self._executor.submit(
+                extract_states,
+                [(data, legacy_anna) for data, legacy_anna, dummy in batch],
+                self.xml_backend,
+            )
+        except RuntimeError as err:  # The pool is shut down
+            for future in futures:
+                future.set_exception(err)
+            return
+        done.add_done_callback(lambda done: _resolve(done, futures))
+
+    def map(self, payloads):
+        """Parse (data, legacy_anna) pairs, returns their ThermostatStates in order.
+
+        Raises the ValueError of the first response that can not be parsed.
+        """
+        futures = [self.submit(data, legacy_anna) for data, legacy_anna in payloads]
+        self.flush()
+        return [future.result() for future in futures]
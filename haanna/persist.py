@@ -0,0 +1,85 @@
+"""Last known values of a gateway, saved to a file for a warm start."""
+
+import json
+import mmap
+import os
+import struct
+import time
+
+from .state import ThermostatState
+from .topology import Topology
+
+MAGIC = b"HAANNA"
+VERSION = 1
+# magic, version, saved at (seconds since the epoch), payload length
+HEADER = struct.Struct("<6sHdI")
+
+
+class StoredSnapshot:
+    """Define the values of a gateway as they were saved, they may be outdated.
+
+    presets is None when the gateway has no preset rule.
+    """
+
+    __slots__ = ("state", "topology", "presets", "schema_names", "saved_at")
+
+    def __init__(self, state, topology, presets, schema_names, saved_at):
+        """Set the constructor for this class."""
+        self.state = state
+        self.topology = topology
+        self.presets = presets
+        self.schema_names = schema_names
+        self.saved_at = saved_at
+
+    @property
+    def age(self):
+        """Get the seconds since the values were saved."""
+        return time.time() - self.saved_at
+
+    def __repr__(self):
+        """Represent the snapshot for logging."""
+        return "<StoredSnapshot age={:.0f}s {!r}>".format(self.age, self.state)
+
+
+def write_snapshot(path, stored):
+    """Write a StoredSnapshot, the file is replaced at once."""
+    payload = json.dumps(
+        {
+            "state": stored.state.as_dict(),
+            "topology": stored.topology.as_dict(),
+            "presets": stored.presets,
+            "schema_names": stored.schema_names,
+        },
+        separators=(",", ":"),
+    ).encode()
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, stored.saved_at, len(payload)))
+        file.write(payload)
+    os.replace(temporary, path)
+
+
+def read_snapshot(path):
+    """Read a StoredSnapshot, None when it is missing, damaged or of another version."""
+    try:
+        with open(path, "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            magic, version, saved_at, length = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                return None
+            if HEADER.size + length != len(data):
+                return None
+            values = json.loads(data[HEADER.size :])
+        state = ThermostatState()
+        for name, value in values["state"].items():
+            setattr(state, name, value)
+        return StoredSnapshot(
+            state,
+            Topology.from_dict(values["topology"]),
+            values["presets"],
+            values["schema_names"],
+            saved_at,
+        )
+    except (OSError, ValueError, KeyError, AttributeError, struct.error):
+        return None
@@ -0,0 +1,203 @@
+"""Adaptive polling of a gateway for changes."""
+
+import random
+import threading
+import time
+
+from .diff import ChangeTracker
+from .ratelimit import background
+
+DEFAULT_MIN_INTERVAL = 5
+DEFAULT_MAX_INTERVAL = 300
+DEFAULT_BACKOFF = 2
+DEFAULT_PROBE_INTERVAL = 30
+DEFAULT_STAGGER = 10
+
+
+class UpdatePoller:
+    """Define an update engine that polls fast only while the gateway changes.
+
+    The domain objects are fetched min_interval after a change and right
+    after a setter of the Haanna object, the interval grows by backoff up to
+    max_interval while nothing changes. Between the fetches a /ping every
+    probe_interval (None to disable) notices when an unreachable gateway is
+    back, which triggers a fetch.
+
+    With a snapshot_path on the Haanna object the saved values are reported
+    first as stale Changes, and the first fetch follows a random delay of up
+    to stagger seconds so a restarting fleet does not hit every gateway at
+    once. The values are saved again after every change. The fetches and
+    pings are background reads for a rate limiter.
+    """
+
+    def __init__(
+        self,
+        anna,
+        min_interval=DEFAULT_MIN_INTERVAL,
+        max_interval=DEFAULT_MAX_INTERVAL,
+        backoff=DEFAULT_BACKOFF,
+        probe_interval=DEFAULT_PROBE_INTERVAL,
+        timeout=None,
+        stagger=DEFAULT_STAGGER,
+    ):
+        """Set the constructor for this class."""
+        self.anna = anna
+        self.stagger = stagger
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.probe_interval = probe_interval
+        self.timeout = timeout
+        self.interval = min_interval
+        self.online = True
+        self.error = None
+        self.stats = {
+            "fetches": 0,
+            "probes": 0,
+            "changes": 0,
+            "errors": 0,
+            "restores": 0,
+            "save_errors": 0,
+        }
+        self.tracker = ChangeTracker(anna)
+        self._stopped = False
+        self._wake = self._create_event()
+
+    @staticmethod
+    def _create_event():
+        """Create the event that wakes the poller."""
+        return threading.Event()
+
+    def wake(self):
+        """Fetch now and poll fast again, e.g. after a change of the thermostat."""
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def stop(self):
+        """Stop the updates after the current one."""
+        self._stopped = True
+        self._wake.set()
+
+    def _slow_down(self):
+        """Grow the interval while nothing changes."""
+        self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def _fetched(self, root, error):
+        """Track a fetched tree, returns the Changes or None when the fetch failed."""
+        self.stats["fetches"] += 1
+        if error is not None:
+            self.stats["errors"] += 1
+            self.error = error
+            self.online = False
+            self._slow_down()
+            return None
+        self.online = True
+        self.error = None
+        changes = self.tracker.update(root)
+        if changes:
+            self.stats["changes"] += 1
+            self.interval = self.min_interval
+            self._save(root)
+        else:
+            self._slow_down()
+        return changes
+
+    def _restore(self):
+        """Get the stale Changes of the saved values, None without them."""
+        if self.anna.snapshot_path is None:
+            return None
+        stored = self.anna.load_snapshot()
+        if stored is None:
+            return None
+        self.stats["restores"] += 1
+        return self.tracker.restore(stored.state)
+
+    def _save(self, root):
+        """Save the values of a changed tree, a failed save loses the warm start."""
+        if self.anna.snapshot_path is None:
+            return
+        try:
+            self.anna.save_snapshot(root)
+        except Exception:  # pylint: disable=broad-except
+            self.stats["save_errors"] += 1
+
+    def _stagger_delay(self):
+        """Get the delay of the first fetch after reporting saved values."""
+        return random.uniform(0, self.stagger)
+
+    def _probed(self, online):
+        """Count a probe, returns whether the gateway came back."""
+        self.stats["probes"] += 1
+        back = online and not self.online
+        self.online = online
+        return back
+
+    def _next_timeout(self, deadline):
+        """Get how long to wait for a wake up, None when the fetch is due."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        if self.probe_interval:
+            return min(remaining, self.probe_interval)
+        return remaining
+
+    def _fetch(self):
+        """Fetch and track the domain objects."""
+        try:
+            with background():
+                root = self.anna.get_domain_objects(timeout=self.timeout)
+        except Exception as err:  # pylint: disable=broad-except
+            return self._fetched(None, err)
+        return self._fetched(root, None)
+
+    def _probe(self):
+        """Ping the gateway, returns whether it is reachable."""
+        try:
+            with background():
+                return self.anna.ping_anna_thermostat(timeout=self.timeout)
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+    def _wait(self, interval=None):
+        """Wait until the next fetch is due, returns False when stopped."""
+        if interval is None:
+            interval = self.interval
+        deadline = time.monotonic() + interval
+        while not self._stopped:
+            timeout = self._next_timeout(deadline)
+            if timeout is None:
+                return True
+            if self._wake.wait(timeout):
+                self._wake.clear()
+                return not self._stopped
+            if deadline > time.monotonic() and self._probed(self._probe()):
+                return True
+        return False
+
+    def updates(self):
+        """Yield the Changes of every update that changed something, until stop().
+
+        The first update reports every value, the saved ones are reported
+        before it with a snapshot_path.
+        """
+        self._stopped = False
+        self.anna.add_write_listener(self.wake)
+        try:
+            stale = self._restore()
+            if stale:
+                yield stale
+                if not self._wait(self._stagger_delay()):
+                    return
+            while not self._stopped:
+                changes = self._fetch()
+                if changes:
+                    yield changes
+                if not self._wait():
+                    break
+        finally:
+            self.anna.remove_write_listener(self.wake)
+
+    def run(self, callback):
+        """Call callback with the Changes of every update, blocks until stop()."""
+        for changes in self.updates():
+            callback(changes)
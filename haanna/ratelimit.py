@@ -0,0 +1,134 @@
+"""Request budget of a gateway, shared by priority classes."""
+
+import contextlib
+import contextvars
+import threading
+import time
+
+DEFAULT_RATE = 2
+DEFAULT_BURST = 6
+DEFAULT_BACKGROUND_RESERVE = 2
+DEFAULT_MAX_WAIT = 10
+
+# The priority classes, from first to last
+WRITE = "write"
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (WRITE, INTERACTIVE, BACKGROUND)
+
+_priority = contextvars.ContextVar("haanna_priority", default=INTERACTIVE)
+
+
+class RateLimitedError(ConnectionError):
+    """Raise an exception for a request that does not fit in the budget of a gateway."""
+
+
+@contextlib.contextmanager
+def priority(name):
+    """Send the reads of this thread or task with a priority class."""
+    if name not in PRIORITIES:
+        raise ValueError("Unknown priority {}.".format(name))
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def background():
+    """Send the reads of this thread or task as background polling."""
+    return priority(BACKGROUND)
+
+
+def request_priority(method):
+    """Get the priority class of a request, every change is a write."""
+    return _priority.get() if method == "GET" else WRITE
+
+
+class RateLimiter:
+    """Define a token bucket of rate requests per second with bursts of burst.
+
+    Writes are never delayed, they borrow from the budget of the reads.
+    Interactive reads wait for a token, up to max_wait seconds. Background
+    reads are shed unless background_reserve tokens are left over for the
+    other classes.
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        background_reserve=DEFAULT_BACKGROUND_RESERVE,
+        max_wait=DEFAULT_MAX_WAIT,
+    ):
+        """Set the constructor for this class."""
+        self.rate = rate
+        self.burst = burst
+        self.background_reserve = background_reserve
+        self.max_wait = max_wait
+        self.granted = dict.fromkeys(PRIORITIES, 0)
+        self.delayed = dict.fromkeys(PRIORITIES, 0)
+        self.shed = dict.fromkeys(PRIORITIES, 0)
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        """Add the tokens of the time passed, with the lock held."""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self):
+        """Get the tokens left, negative while reads wait for theirs."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def reserve(self, request_class):
+        """Take a token for a request, returns the seconds to wait before sending it.
+
+        Raises RateLimitedError when a background read is shed or an
+        interactive read would wait longer than max_wait.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = 0.0
+            if request_class == BACKGROUND:
+                if self._tokens < 1 + self.background_reserve:
+                    self.shed[request_class] += 1
+                    raise RateLimitedError("The gateway is busy, the poll is skipped.")
+            elif request_class != WRITE:
+                wait = max(0.0, (1 - self._tokens) / self.rate)
+                if wait > self.max_wait:
+                    self.shed[request_class] += 1
+                    raise RateLimitedError(
+                        "The gateway is busy for {:.1f}s.".format(wait)
+                    )
+            self._tokens -= 1
+            self.granted[request_class] += 1
+            if wait:
+                self.delayed[request_class] += 1
+                self.wait_seconds += wait
+            return wait
+
+    def get_stats(self):
+        """Get the tokens left and the granted, delayed and shed counters per class."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "tokens": self._tokens,
+                "rate": self.rate,
+                "burst": self.burst,
+                "granted": dict(self.granted),
+                "delayed": dict(self.delayed),
+                "shed": dict(self.shed),
+                "wait_seconds": self.wait_seconds,
+            }
+
+    def __repr__(self):
+        """Represent the budget for logging."""
+        return "<RateLimiter {:.1f}/{} tokens shed={}>".format(
+            self.tokens, self.burst, self.shed
+        )
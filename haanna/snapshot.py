@@ -0,0 +1,152 @@
+"""Single-pass index over the domain_objects XML-data."""
+
+import weakref
+
+from .timestamps import to_epoch
+from .xmlbackend import backend_of
+from .zones import index_zones
+
+_SNAPSHOTS = weakref.WeakKeyDictionary()
+
+
+class RuleEntry:
+    """Define the name, active flag, modified time (epoch seconds) and locations of a rule."""
+
+    __slots__ = ("name", "active", "modified", "location_ids")
+
+    def __init__(self, rule):
+        """Read the entry from a rule element."""
+        self.name = rule.findtext("name")
+        self.active = rule.findtext("active") == "true"
+        modified_date = rule.findtext("modified_date")
+        self.modified = (
+            float("-inf") if modified_date is None else to_epoch(modified_date)
+        )
+        self.location_ids = tuple(
+            location.attrib["id"] for location in rule.iterfind("locations/location")
+        )
+
+
+class DomainSnapshot:
+    """Define an index of a domain_objects tree, built in one traversal."""
+
+    def __init__(self, root):
+        """Index the point logs, appliances, rules and locations of the tree."""
+        # log_type -> point_log id, taken from the module services
+        self.point_log_ids = {}
+        # point_log id -> latest measurement element
+        self.measurements = {}
+        # (appliance type, point_log type) -> latest measurement element
+        self.appliance_measurements = {}
+        # appliance type -> appliance elements in document order
+        self.appliances = {}
+        self.locations = {}
+        self.rules = {}
+        self.rule_ids_by_name = {}
+        self.rule_ids_by_tag = {}
+        # Legacy Anna presets, (rule, then) pairs of directives with an icon
+        self.icon_directives = []
+        self._rule_index = None
+        self._zones = None
+        self._point_logs = backend_of(root).point_logs
+
+        for element in root:
+            tag = element.tag
+            if tag == "appliance":
+                self._index_appliance(element)
+            elif tag == "location":
+                self.locations[element.attrib["id"]] = element
+                self._index_logs(element, None)
+            elif tag == "module":
+                self._index_module(element)
+            elif tag == "rule":
+                self._index_rule(element)
+            else:
+                self._index_logs(element, None)
+
+    @classmethod
+    def of(cls, root):
+        """Get the snapshot of a tree, it is built once per tree."""
+        snapshot = _SNAPSHOTS.get(root)
+        if snapshot is None:
+            snapshot = _SNAPSHOTS[root] = cls(root)
+        return snapshot
+
+    def _index_logs(self, element, appliance_type):
+        """Index the point logs of an appliance or location."""
+        for point_log, measurement in self._point_logs(element):
+            if measurement is None:
+                continue
+            self.measurements.setdefault(point_log.attrib.get("id"), measurement)
+            if appliance_type is not None:
+                self.appliance_measurements.setdefault(
+                    (appliance_type, point_log.findtext("type")), measurement
+                )
+
+    def _index_appliance(self, appliance):
+        """Index an appliance by type together with its point logs."""
+        appliance_type = appliance.findtext("type")
+        self.appliances.setdefault(appliance_type, []).append(appliance)
+        self._index_logs(appliance, appliance_type)
+
+    def _index_module(self, module):
+        """Index the point log ids of the services of a module."""
+        services = module.find("services")
+        if services is None:
+            return
+        for service in services:
+            log_type = service.attrib.get("log_type")
+            if log_type is None or log_type in self.point_log_ids:
+                continue
+            point_log = service.find("functionalities/point_log")
+            if point_log is not None:
+                self.point_log_ids[log_type] = point_log.attrib["id"]
+
+    def _index_rule(self, rule):
+        """Index a rule by id, name and template tag."""
+        rule_id = rule.attrib["id"]
+        self.rules[rule_id] = rule
+        self.rule_ids_by_name.setdefault(rule.findtext("name"), rule_id)
+        self.rule_ids_by_tag.setdefault(
+            rule.find("template").attrib["tag"], []
+        ).append(rule_id)
+        for directive in rule.iterfind("directives/when/then"):
+            if "icon" in directive.keys():
+                self.icon_directives.append((rule, directive))
+
+    @property
+    def rule_index(self):
+        """Get the RuleEntry of each rule id, the dates are parsed on first use."""
+        if self._rule_index is None:
+            self._rule_index = {
+                rule_id: RuleEntry(rule) for rule_id, rule in self.rules.items()
+            }
+        return self._rule_index
+
+    @property
+    def zones(self):
+        """Get the Zone of each location id, read on first use."""
+        if self._zones is None:
+            self._zones = index_zones(self)
+        return self._zones
+
+    def appliance(self, appliance_type):
+        """Get the first appliance of a type."""
+        appliances = self.appliances.get(appliance_type)
+        if appliances:
+            return appliances[0]
+        return None
+
+    def appliance_measurement(self, appliance_type, log_type):
+        """Get the latest measurement of a point log of an appliance type."""
+        return self.appliance_measurements.get((appliance_type, log_type))
+
+    def measurement(self, log_type):
+        """Get the latest measurement text of a log type."""
+        point_log_id = self.point_log_ids.get(log_type)
+        if point_log_id is None:
+            return None
+        measurement = self.measurements.get(point_log_id)
+        if measurement is None:
+            return None
+        return measurement.text
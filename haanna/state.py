@@ -0,0 +1,56 @@
+"""Fixed-schema record of the thermostat values."""
+
+
+class ThermostatState:
+    """Define the values of one update, measurements are floats or None.
+
+    States compare equal when every value is equal, so an unchanged update
+    can be skipped.
+    """
+
+    __slots__ = (
+        "current_temperature",
+        "target_temperature",
+        "thermostat_temperature",
+        "schedule_temperature",
+        "outdoor_temperature",
+        "illuminance",
+        "boiler_temperature",
+        "water_pressure",
+        "boiler_status",
+        "heating_status",
+        "cooling_status",
+        "domestic_hot_water_status",
+        "schema_state",
+        "current_preset",
+        "active_schema",
+    )
+
+    def __init__(self, *values):
+        """Set the values in the order of __slots__, missing ones are None."""
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        for name in self.__slots__[len(values):]:
+            setattr(self, name, None)
+
+    def values(self):
+        """Get the values in the order of __slots__."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def as_dict(self):
+        """Get the values by name."""
+        return dict(zip(self.__slots__, self.values()))
+
+    def __eq__(self, other):
+        """Compare the values of two states."""
+        if not isinstance(other, ThermostatState):
+            return NotImplemented
+        return self.values() == other.values()
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Represent the state for logging."""
+        return "<ThermostatState {}>".format(
+            " ".join("{}={!r}".format(*item) for item in self.as_dict().items())
+        )
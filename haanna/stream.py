@@ -0,0 +1,91 @@
+"""Incremental parsing of gateway responses."""
+
+import re
+
+from .xmlbackend import get_backend
+
+ILLEGAL_AMPERSAND = re.compile(rb"&([^a-zA-Z#])")
+
+# The top level elements the getters read, everything else is dropped.
+DOMAIN_ELEMENTS = frozenset(["appliance", "location", "module", "rule"])
+
+
+def escape_ampersands(data):
+    """Escape the illegal &-characters of bytes, the same object when there are none."""
+    start = data.find(b"&")
+    if start < 0 or ILLEGAL_AMPERSAND.search(data, start) is None:
+        return data
+    return ILLEGAL_AMPERSAND.sub(rb"&amp;\1", data)
+
+
+class AmpersandEscaper:
+    """Define an escaper for illegal &-characters in a stream of byte chunks."""
+
+    def __init__(self):
+        """Set the constructor for this class."""
+        self._pending = b""
+
+    def feed(self, chunk):
+        """Escape a chunk, an &-run at the end waits for the next chunk."""
+        data = self._pending + chunk if self._pending else chunk
+        end = len(data)
+        while end and data[end - 1] == 0x26:  # b"&"
+            end -= 1
+        self._pending = data[end:]
+        return escape_ampersands(data[:end])
+
+    def flush(self):
+        """Get the escaped remainder at the end of the stream."""
+        data = self._pending
+        self._pending = b""
+        return escape_ampersands(data)
+
+
+class PrunedTreeParser:
+    """Define an incremental parser that keeps only the elements getters need."""
+
+    def __init__(self, keep=DOMAIN_ELEMENTS, backend=None):
+        """Set the constructor for this class, backend is the name of an XML backend."""
+        self._keep = keep
+        self._escaper = AmpersandEscaper()
+        self._parser = get_backend(backend).pull_parser(("start", "end"))
+        self._stack = []
+        self.root = None
+
+    def feed(self, chunk):
+        """Feed a chunk of the response and prune what has been parsed."""
+        self._parser.feed(self._escaper.feed(chunk))
+        self._prune()
+
+    def close(self):
+        """Finish parsing and get the pruned tree."""
+        self._parser.feed(self._escaper.flush())
+        self._parser.close()
+        self._prune()
+        return self.root
+
+    def _prune(self):
+        """Drop unused top level elements and the older measurements of a period."""
+        stack = self._stack
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self.root is None:
+                    self.root = element
+                stack.append(element)
+                continue
+            stack.pop()
+            if len(stack) == 1:
+                if element.tag not in self._keep:
+                    self.root.remove(element)
+            elif element.tag == "measurement" and stack and stack[-1].tag == "period":
+                # Only the first measurement of a period is read
+                if stack[-1][0] is not element:
+                    stack[-1].remove(element)
+
+
+def parse_stream(chunks, keep=DOMAIN_ELEMENTS, backend=None):
+    """Parse an iterable of byte chunks into a pruned XML tree."""
+    parser = PrunedTreeParser(keep, backend)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
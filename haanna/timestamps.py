@@ -0,0 +1,26 @@
+"""Parsing of the gateway timestamps."""
+
+import datetime
+
+
+def parse_timestamp(text):
+    """Parse an ISO-8601 gateway timestamp into an aware datetime.
+
+    The gateway always sends e.g. 2020-03-24T14:12:42.604+01:00, which the
+    builtin parser reads; anything else falls back to dateutil when it is
+    installed.
+    """
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    try:
+        from dateutil.parser import parse
+    except ImportError:
+        raise ValueError("Unknown timestamp format {!r}.".format(text)) from None
+    return parse(text)
+
+
+def to_epoch(text):
+    """Parse a gateway timestamp into seconds since the epoch."""
+    return parse_timestamp(text).timestamp()
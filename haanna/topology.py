@@ -0,0 +1,68 @@
+"""Static ids of a gateway, resolved once for the setters."""
+
+from .snapshot import DomainSnapshot
+
+
+class Topology:
+    """Define the ids of the thermostat, its location and the rules of a gateway."""
+
+    FIELDS = (
+        "appliance_id",
+        "location_id",
+        "location_name",
+        "location_type",
+        "thermostat_functionality_id",
+        "rule_ids_by_name",
+        "template_ids",
+        "preset_rule_ids",
+    )
+
+    def __init__(self, root):
+        """Resolve the ids from a domain_objects tree."""
+        snapshot = DomainSnapshot.of(root)
+        self.appliance_id = None
+        self.location_id = None
+        self.location_name = None
+        self.location_type = None
+        self.thermostat_functionality_id = None
+        appliance = snapshot.appliance("thermostat")
+        if appliance is not None:
+            self.appliance_id = appliance.attrib["id"]
+            location = appliance.find("location")
+            if location is not None:
+                self.location_id = location.attrib["id"]
+        location = snapshot.locations.get(self.location_id)
+        if location is not None:
+            self.update_location(location)
+
+        self.rule_ids_by_name = dict(snapshot.rule_ids_by_name)
+        self.template_ids = {
+            rule_id: rule.find("template").attrib["id"]
+            for rule_id, rule in snapshot.rules.items()
+        }
+        # Legacy Anna presets, icon -> id of the rule activating the preset
+        self.preset_rule_ids = {}
+        for rule, directive in snapshot.icon_directives:
+            self.preset_rule_ids.setdefault(directive.attrib["icon"], rule.attrib["id"])
+
+    def update_location(self, location):
+        """Take the name, type and thermostat functionality of a location element."""
+        self.location_name = location.findtext("name")
+        self.location_type = location.findtext("type")
+        functionality = location.find(
+            "actuator_functionalities/thermostat_functionality"
+        )
+        if functionality is not None:
+            self.thermostat_functionality_id = functionality.attrib["id"]
+
+    def as_dict(self):
+        """Get the ids by name."""
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, values):
+        """Restore the ids of as_dict, without a domain_objects tree."""
+        topology = cls.__new__(cls)
+        for name in cls.FIELDS:
+            setattr(topology, name, values[name])
+        return topology
@@ -0,0 +1,138 @@
+"""XML parsers for the gateway responses, lxml when it is installed."""
+
+import threading
+
+# The backends in the order of preference
+BACKENDS = ("lxml", "etree")
+
+_BACKENDS = {}
+_LOCK = threading.Lock()
+
+
+class EtreeBackend:
+    """Define the parsers of the standard library ElementTree."""
+
+    name = "etree"
+
+    def __init__(self):
+        """Set the constructor for this class."""
+        import xml.etree.ElementTree as Etree
+
+        self._etree = Etree
+
+    def fromstring(self, text):
+        """Parse a document from a str or bytes."""
+        return self._etree.fromstring(text)
+
+    def pull_parser(self, events):
+        """Create an incremental parser that reports the given events."""
+        return self._etree.XMLPullParser(events=events)
+
+    @staticmethod
+    def point_logs(element):
+        """Yield each point log of an element with its latest measurement (or None)."""
+        for point_log in element.iterfind("logs/point_log"):
+            yield point_log, point_log.find("period/measurement")
+
+
+class LxmlBackend:
+    """Define the parsers of lxml, which build the same ElementTree API in C.
+
+    The elements are of a subclass, so a tree can be weakly referenced like
+    an ElementTree one. A str is parsed as UTF-8, like the gateway sends it.
+    """
+
+    name = "lxml"
+
+    def __init__(self):
+        """Set the constructor for this class."""
+        from lxml import etree
+
+        class Element(etree.ElementBase):
+            """Define an lxml element that can be weakly referenced."""
+
+        self.element_class = Element
+        self._etree = etree
+        self._lookup = etree.ElementDefaultClassLookup(element=Element)
+        # The paths walked for every appliance, compiled once
+        self._point_logs = etree.XPath("logs/point_log")
+        self._measurement = etree.XPath("period/measurement[1]")
+        # lxml parsers must not be shared between threads
+        self._local = threading.local()
+
+    def _configure(self, parser):
+        """Use the weakly referenceable elements in a parser."""
+        parser.set_element_class_lookup(self._lookup)
+        return parser
+
+    def fromstring(self, text):
+        """Parse a document from a str or bytes."""
+        parser = getattr(self._local, "parser", None)
+        if parser is None:
+            parser = self._local.parser = self._configure(
+                self._etree.XMLParser(
+                    remove_comments=True, remove_pis=True, resolve_entities=False, huge_tree=True
+                )
+            )
+        if isinstance(text, str):
+            text = text.encode("utf-8")
+        return self._etree.fromstring(text, parser)
+
+    def pull_parser(self, events):
+        """Create an incremental parser that reports the given events."""
+        return self._configure(
+            self._etree.XMLPullParser(
+                events=events,
+                remove_comments=True,
+                remove_pis=True,
+                resolve_entities=False,
+                huge_tree=True,
+            )
+        )
+
+    def point_logs(self, element):
+        """Yield each point log of an element with its latest measurement (or None)."""
+        measurement = self._measurement
+        for point_log in self._point_logs(element):
+            found = measurement(point_log)
+            yield point_log, found[0] if found else None
+
+
+_CLASSES = {"lxml": LxmlBackend, "etree": EtreeBackend}
+
+
+def _create(name):
+    """Create a backend once, with the lock held."""
+    backend = _BACKENDS.get(name)
+    if backend is None:
+        backend = _BACKENDS[name] = _CLASSES[name]()
+    return backend
+
+
+def backend_of(element):
+    """Get the backend that built an element."""
+    lxml = _BACKENDS.get("lxml")
+    if lxml is not None and isinstance(element, lxml.element_class):
+        return lxml
+    return get_backend("etree")
+
+
+def get_backend(name=None):
+    """Get a backend by name, lxml when it is installed for None.
+
+    A named backend that can not be imported raises ImportError.
+    """
+    backend = _BACKENDS.get(name)
+    if backend is not None:
+        return backend
+    if name is not None and name not in _CLASSES:
+        raise ValueError("Unknown XML backend {!r}, use one of {}".format(name, BACKENDS))
+    with _LOCK:
+        if name is not None:
+            return _create(name)
+        try:
+            backend = _create("lxml")
+        except ImportError:
+            backend = _create("etree")
+        _BACKENDS[None] = backend
+        return backend
@@ -0,0 +1,92 @@
+"""Zones of a gateway: its locations and the thermostats in them."""
+
+from .xmlbackend import backend_of
+
+# The appliances that measure the temperature of a zone
+THERMOSTAT_TYPES = ("thermostat", "zone_thermostat", "thermostatic_radiator_valve")
+SCHEMA_TAG = "zone_preset_based_on_time_and_presence_with_override"
+
+
+def _float(text):
+    """Convert a measurement or setpoint text, None when it is empty."""
+    return float(text) if text else None
+
+
+class Zone:
+    """Define the values of one location, measurements are floats or None.
+
+    temperature is measured by the location itself, or else by its first
+    thermostat. functionality_id is the id of the thermostat functionality
+    the setpoint is set on, None for a location without one.
+    """
+
+    __slots__ = (
+        "location_id",
+        "name",
+        "type",
+        "preset",
+        "setpoint",
+        "temperature",
+        "active_schema",
+        "functionality_id",
+        "thermostat_ids",
+    )
+
+    def __init__(self, location):
+        """Read the values of a location element."""
+        self.location_id = location.attrib["id"]
+        self.name = location.findtext("name")
+        self.type = location.findtext("type")
+        self.preset = location.findtext("preset")
+        self.setpoint = None
+        self.functionality_id = None
+        functionality = location.find(
+            "actuator_functionalities/thermostat_functionality"
+        )
+        if functionality is not None:
+            self.functionality_id = functionality.attrib["id"]
+            self.setpoint = _float(functionality.findtext("setpoint"))
+        self.temperature = _temperature(location)
+        self.active_schema = None
+        self.thermostat_ids = []
+
+    def __repr__(self):
+        """Represent the zone for logging."""
+        return "<Zone {} {!r} temperature={!r} setpoint={!r} preset={!r}>".format(
+            self.location_id, self.name, self.temperature, self.setpoint, self.preset
+        )
+
+
+def _temperature(element):
+    """Get the latest temperature measured by a location or appliance."""
+    for point_log, measurement in backend_of(element).point_logs(element):
+        if measurement is not None and point_log.findtext("type") == "temperature":
+            return _float(measurement.text)
+    return None
+
+
+def index_zones(snapshot):
+    """Get the Zone of each location id of a DomainSnapshot."""
+    zones = {
+        location_id: Zone(location)
+        for location_id, location in snapshot.locations.items()
+    }
+    for appliance_type in THERMOSTAT_TYPES:
+        for appliance in snapshot.appliances.get(appliance_type, ()):
+            location = appliance.find("location")
+            zone = None if location is None else zones.get(location.attrib.get("id"))
+            if zone is None:
+                continue
+            zone.thermostat_ids.append(appliance.attrib["id"])
+            if zone.temperature is None:
+                zone.temperature = _temperature(appliance)
+    rule_index = snapshot.rule_index
+    for rule_id in snapshot.rule_ids_by_tag.get(SCHEMA_TAG, ()):
+        entry = rule_index[rule_id]
+        if not entry.active:
+            continue
+        for location_id in entry.location_ids:
+            zone = zones.get(location_id)
+            if zone is not None and zone.active_schema is None:
+                zone.active_schema = entry.name
+    return zones
@@ -15,6 +15,8 @@ setup(
     author_email='k.heruer@gmail.com',
     license='MIT',
     packages=['haanna'],
-    install_requires=['requests','datetime','pytz','python-dateutil'],
+    package_data={'haanna': ['fixtures/*.xml']},
+    install_requires=['requests','python-dateutil'],
+    extras_require={'async': ['aiohttp'], 'lxml': ['lxml']},
     zip_safe=False
 )
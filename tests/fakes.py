@@ -0,0 +1,89 @@
+"""A fake requests session answering like a Smile gateway, shared by the tests."""
+
+import os
+import threading
+
+from haanna import Haanna
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'haanna', 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name + '.xml'), encoding='utf-8') as fixture:
+        return fixture.read()
+
+
+def load(name):
+    return Haanna.parse_xml(read_fixture(name))
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=''):
+        self.status_code = status_code
+        if isinstance(body, bytes):
+            self.content, self.text = body, body.decode()
+        else:
+            self.content, self.text = body.encode(), body
+
+    def iter_content(self, size):
+        return (self.content[i:i + size] for i in range(0, len(self.content), size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeSession:
+    """A gateway serving domain_objects (the Anna fixture by default) for every GET
+
+    /ping answers 404 like the gateway. The changes are answered with the
+    queued statuses, then with put_status, a None status raises
+    ConnectionError. They wait while the gate is cleared. Every request is
+    recorded in calls as (method, path, data) and its keyword arguments in
+    kwargs.
+    """
+
+    def __init__(self, domain_objects=None, statuses=(), put_status=200):
+        if domain_objects is None:
+            domain_objects = read_fixture('anna_domain_objects')
+        self.domain_objects = domain_objects
+        self.statuses = list(statuses)
+        self.put_status = put_status
+        self.offline = False
+        self.calls = []
+        self.kwargs = []
+        self.closed = False
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def request(self, method, url, **kwargs):
+        if method != 'GET':
+            self.gate.wait()
+        path = '/' + url.split('/', 3)[-1]
+        self.calls.append((method, path, kwargs.get('data')))
+        self.kwargs.append(kwargs)
+        if self.offline:
+            raise ConnectionError('offline')
+        if path == '/ping':
+            return FakeResponse(404)
+        if method == 'GET':
+            return FakeResponse(200, self.domain_objects)
+        status = self.statuses.pop(0) if self.statuses else self.put_status
+        if status is None:
+            raise ConnectionError('offline')
+        return FakeResponse(status, 'ok' if status == 200 else 'failed')
+
+    def methods(self):
+        return [method for method, dummy, dummy in self.calls]
+
+    def paths(self):
+        return [path for dummy, path, dummy in self.calls]
+
+    def count(self, path):
+        return sum(1 for dummy, called, dummy in self.calls if called == path)
+
+    def close(self):
+        self.closed = True
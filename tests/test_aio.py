@@ -0,0 +1,154 @@
+import asyncio
+import time
+import unittest
+
+from aiohttp import web
+
+from haanna import AsyncHaanna, CircuitBreaker, Haanna
+from haanna.emulator import SmileEmulator
+from haanna.health import CLOSED, OPEN
+
+DELAY = 0.2
+DOMAIN_OBJECTS = (
+    "<domain_objects>"
+    "<appliance id='a1'><type>thermostat</type><location id='l1'/><logs>"
+    "<point_log id='p1'><type>temperature</type><period><measurement>20.5</measurement></period></point_log>"
+    "</logs></appliance>"
+    "<module id='m1'><services><thermo_meter log_type='temperature'>"
+    "<functionalities><point_log id='p1'/></functionalities></thermo_meter></services></module>"
+    "</domain_objects>"
+)
+
+
+class TestAsyncHaanna(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        async def domain_objects(request):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                await asyncio.sleep(DELAY)
+            finally:
+                self.in_flight -= 1
+            return web.Response(text=DOMAIN_OBJECTS, content_type="text/xml")
+
+        async def ping(request):
+            await asyncio.sleep(self.ping_delay)
+            return web.Response(status=404)
+
+        self.ping_delay = 0
+        self.in_flight = self.peak = 0
+        app = web.Application()
+        app.router.add_get("/core/domain_objects", domain_objects)
+        app.router.add_get("/ping", ping)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def test_shared_parsing(self):
+        """Awaited objects are parsed by the getters shared with Haanna"""
+        async with AsyncHaanna("smile", "short_id", "127.0.0.1", self.port) as haanna:
+            self.assertTrue(await haanna.ping_anna_thermostat())
+            domain_objects = await haanna.get_domain_objects()
+            self.assertEqual(20.5, haanna.get_current_temperature(domain_objects))
+
+    async def test_refresh_topology(self):
+        """The ids are resolved again from an awaited fetch"""
+        async with AsyncHaanna("smile", "short_id", "127.0.0.1", self.port) as haanna:
+            topology = await haanna.refresh_topology()
+            self.assertIs(topology, haanna._topology)
+            self.assertEqual("l1", topology.location_id)
+
+    async def test_point_log_history(self):
+        """The history is parsed from the awaited response like Haanna does"""
+        emulator = SmileEmulator.from_fixture()
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        with Haanna(**emulator.config()) as haanna:
+            expected = haanna.get_point_log_history(["temperature", "thermostat"])
+        async with AsyncHaanna(**emulator.config()) as haanna:
+            pages = [
+                page async for page in haanna.iter_point_log_history("temperature", page_size=1)
+            ]
+            history = await haanna.get_point_log_history(["temperature", "thermostat"])
+        self.assertTrue(pages)
+        self.assertTrue(all(len(page) == 1 for page in pages))
+        self.assertEqual(sorted(expected), sorted(history))
+        for point_log_id, series in expected.items():
+            self.assertEqual(list(series.values), list(history[point_log_id].values))
+            self.assertEqual(list(series.timestamps), list(history[point_log_id].timestamps))
+
+    async def test_no_command_queue(self):
+        """The command queue of the threaded client is refused"""
+        async with AsyncHaanna("smile", "short_id", "127.0.0.1", self.port) as haanna:
+            with self.assertRaises(TypeError):
+                haanna.command_queue(None)
+
+    async def test_concurrent_gateways(self):
+        """N gateways sharing one pool are polled at the same time"""
+        session = AsyncHaanna.create_session()
+        gateways = [
+            AsyncHaanna("smile", "short_id", "127.0.0.1", self.port, session=session)
+            for _ in range(20)
+        ]
+        results = await asyncio.gather(*(g.get_domain_objects() for g in gateways))
+        await session.close()
+        self.assertEqual(20, len(results))
+        self.assertGreater(self.peak, 1)
+
+    async def test_concurrency_limit(self):
+        """A single gateway never sees more than max_concurrency requests"""
+        async with AsyncHaanna(
+            "smile", "short_id", "127.0.0.1", self.port, max_concurrency=1
+        ) as haanna:
+            start = time.perf_counter()
+            await asyncio.gather(*(haanna.get_domain_objects() for _ in range(3)))
+            self.assertGreaterEqual(time.perf_counter() - start, DELAY * 3)
+
+    async def test_timeout_is_cancellation_safe(self):
+        """A timed out request releases its concurrency slot"""
+        async with AsyncHaanna(
+            "smile", "short_id", "127.0.0.1", self.port, max_concurrency=1
+        ) as haanna:
+            with self.assertRaises(asyncio.TimeoutError):
+                await haanna.get_domain_objects(timeout=DELAY / 4)
+            task = asyncio.ensure_future(haanna.get_domain_objects())
+            await asyncio.sleep(DELAY / 4)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertIsNotNone(await haanna.get_domain_objects())
+
+    async def test_cancelled_probe(self):
+        """A request cancelled while it probes opens the circuit again"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure(1.0, "timed out")
+        async with AsyncHaanna(
+            "smile", "short_id", "127.0.0.1", self.port, circuit_breaker=breaker
+        ) as haanna:
+            self.ping_delay = DELAY
+            task = asyncio.ensure_future(haanna.get_domain_objects())
+            await asyncio.sleep(DELAY / 4)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(OPEN, breaker.state)
+            self.ping_delay = 0
+            self.assertIsNotNone(await haanna.get_domain_objects())
+            self.assertEqual(CLOSED, breaker.state)
+
+    async def test_update_poller(self):
+        """The adaptive poller is an async iterator of changes"""
+        from haanna.aio import AsyncUpdatePoller
+
+        async with AsyncHaanna("smile", "short_id", "127.0.0.1", self.port) as haanna:
+            poller = AsyncUpdatePoller(haanna, min_interval=DELAY / 4, probe_interval=None)
+            async for changes in poller:
+                self.assertEqual((None, 20.5), changes.state["current_temperature"])
+                poller.stop()
+            self.assertEqual(1, poller.stats["fetches"])
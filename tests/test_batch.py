@@ -0,0 +1,67 @@
+import time
+import unittest
+
+from fakes import FakeSession, load
+from haanna import Haanna
+from haanna.haanna import CouldNotSetPresetException
+
+
+class TestSetterBatch(unittest.TestCase):
+
+    def test_batch(self):
+        """Schema, preset and setpoint changes are sent without fetching the locations"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        domain_objects = load('anna_domain_objects')
+        with haanna.batch(domain_objects) as batch:
+            batch.set_schema_state('Winter', 'false')
+            batch.set_schema_state('Zomer', 'true')
+            batch.set_preset('away')
+            batch.set_temperature(19.0)
+            batch.set_temperature(19.5)
+        self.assertEqual(['PUT'] * 3, session.methods())
+        rules_url, rules = session.calls[0][1:]
+        self.assertTrue(rules_url.endswith('/core/rules'))
+        self.assertEqual(2, rules.count('<rule '))
+        location_url, location = session.calls[1][1:]
+        self.assertIn('/core/locations;id=eb5309212bf5407bb143e5bfa3b18aee', location_url)
+        self.assertIn('<name>Living room</name><type>building</type><preset>away</preset>', location)
+        self.assertIn('/thermostat;id=', session.calls[2][1])
+        self.assertIn('<setpoint>19.5</setpoint>', session.calls[2][2])
+
+    def test_legacy_batch(self):
+        """A V1 preset shares the rules PUT with the schema change"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, legacy_anna=True, session=session)
+        with haanna.batch(load('legacy_anna_domain_objects')) as batch:
+            batch.set_schema_state('Thuis', 'false')
+            batch.set_preset('away')
+        self.assertEqual(1, len(session.calls))
+        self.assertEqual(2, session.calls[0][2].count('<rule '))
+
+    def test_debounce(self):
+        """Only the last of rapid setpoint changes is sent"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        batch = haanna.batch(load('anna_domain_objects'), debounce=0.05)
+        for temperature in (18, 18.5, 19, 19.5, 20):
+            batch.set_temperature(temperature)
+            time.sleep(0.01)
+        self.assertEqual([], session.calls)
+        time.sleep(0.1)
+        self.assertEqual(1, len(session.calls))
+        self.assertIn('<setpoint>20</setpoint>', session.calls[0][2])
+
+    def test_errors(self):
+        """A failed PUT raises, a block that raised sends nothing"""
+        session = FakeSession(put_status=500)
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        domain_objects = load('anna_domain_objects')
+        with self.assertRaises(CouldNotSetPresetException):
+            with haanna.batch(domain_objects) as batch:
+                batch.set_preset('away')
+        with self.assertRaises(KeyError):
+            with haanna.batch(domain_objects) as batch:
+                batch.set_temperature(20)
+                raise KeyError('abort')
+        self.assertEqual(1, len(session.calls))
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+
+from fakes import FakeSession
+from haanna import Haanna
+from haanna.cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_ttl(self):
+        """Values are served from the cache until the TTL expires"""
+        cache = ResponseCache(0.05)
+        self.assertEqual(1, cache.get('key', lambda: 1))
+        self.assertEqual(1, cache.get('key', lambda: 2))
+        time.sleep(0.06)
+        self.assertEqual(3, cache.get('key', lambda: 3))
+        self.assertEqual({'hits': 1, 'misses': 2, 'coalesced': 0}, cache.get_stats())
+
+    def test_single_flight(self):
+        """Concurrent misses share one fetch"""
+        cache = ResponseCache(10)
+        calls = []
+        started = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return 'value'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.get('key', fetch)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(cache.get('key', fetch)))
+                     for _ in range(5)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader] + followers:
+            thread.join()
+        self.assertEqual(['value'] * 6, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(5, cache.coalesced)
+
+    def test_errors_are_shared_and_not_cached(self):
+        """A failing fetch raises for the caller and is retried next time"""
+        cache = ResponseCache(10)
+
+        def fail():
+            raise ConnectionError('offline')
+
+        with self.assertRaises(ConnectionError):
+            cache.get('key', fail)
+        self.assertEqual('value', cache.get('key', lambda: 'value'))
+
+    def test_invalidate_during_fetch(self):
+        """A value fetched before an invalidation is not stored"""
+        cache = ResponseCache(10)
+
+        def fetch():
+            cache.invalidate()
+            return 'old'
+
+        self.assertEqual('old', cache.get('key', fetch))
+        self.assertEqual('new', cache.get('key', lambda: 'new'))
+
+
+class TestHaannaCache(unittest.TestCase):
+
+    def test_setters_invalidate(self):
+        """Successful setters drop the cached domain objects"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session, cache_ttl=60)
+        domain_objects = haanna.get_domain_objects()
+        self.assertIs(domain_objects, haanna.get_domain_objects())
+        self.assertEqual(1, session.count('/core/domain_objects'))
+        haanna.set_temperature(domain_objects, 21.0)
+        self.assertIsNot(domain_objects, haanna.get_domain_objects())
+        self.assertEqual(2, session.count('/core/domain_objects'))
+        self.assertEqual({'hits': 1, 'misses': 2, 'coalesced': 0}, haanna.get_cache_stats())
+
+    def test_disabled_by_default(self):
+        """Without a TTL every call fetches"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        haanna.get_domain_objects()
+        haanna.get_domain_objects()
+        self.assertEqual(2, session.count('/core/domain_objects'))
+        self.assertIsNone(haanna.get_cache_stats())
@@ -0,0 +1,98 @@
+import time
+import unittest
+
+from fakes import FakeSession, load
+from haanna import Haanna
+from haanna.haanna import CouldNotSetPresetException, CouldNotSetTemperatureException
+from haanna.metrics import Metrics
+
+
+class TestCommandQueue(unittest.TestCase):
+
+    def test_order_and_supersede(self):
+        """Changes are sent in order, a queued setpoint is superseded by the next one"""
+        session = FakeSession()
+        session.gate.clear()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        with haanna.command_queue(load('anna_domain_objects')) as queue:
+            schema = queue.set_schema_state('Winter', 'false')
+            first = queue.set_temperature(19.0)
+            preset = queue.set_preset('away')
+            second = queue.set_temperature(19.5)
+            self.assertFalse(first.done())
+            session.gate.set()
+            self.assertEqual('ok', second.result(timeout=5))
+            self.assertEqual('ok', first.result(timeout=5))
+        self.assertTrue(schema.done() and preset.done())
+        self.assertEqual(3, len(session.calls))
+        self.assertIn('/core/rules', session.calls[0][1])
+        self.assertIn('<preset>away</preset>', session.calls[1][2])
+        self.assertIn('<setpoint>19.5</setpoint>', session.calls[2][2])
+        self.assertEqual(1, queue.stats['superseded'])
+        self.assertEqual(0, queue.depth)
+
+    def test_retry(self):
+        """A failed connection and a 5xx are retried, a 4xx is raised by the future"""
+        session = FakeSession(statuses=[None, 503, 200, 400])
+        metrics = Metrics()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session, metrics=metrics)
+        with haanna.command_queue(load('anna_domain_objects'), backoff=0.01) as queue:
+            self.assertEqual('ok', queue.set_temperature(20.0).result(timeout=5))
+            with self.assertRaises(CouldNotSetPresetException):
+                queue.set_preset('away').result(timeout=5)
+        self.assertEqual(2, queue.stats['retries'])
+        self.assertEqual(1, queue.stats['failed'])
+        self.assertEqual(2, metrics.retries['/core/locations'])
+        text = haanna.get_metrics()
+        self.assertIn('haanna_command_retries_total{endpoint="/core/locations"} 2', text)
+        self.assertIn('haanna_command_queue_depth{gateway="http://127.0.0.1:80"} 0', text)
+
+    def test_retries_exhausted(self):
+        """The last failure is raised once the retries are used"""
+        session = FakeSession(statuses=[500, 500, 500])
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        queue = haanna.command_queue(load('anna_domain_objects'), retries=2, backoff=0.01)
+        with self.assertRaises(CouldNotSetTemperatureException):
+            queue.set_temperature(20.0).result(timeout=5)
+        self.assertTrue(queue.join(timeout=5))
+        queue.close()
+        self.assertEqual(3, len(session.calls))
+        with self.assertRaises(RuntimeError):
+            queue.set_temperature(21.0)
+
+    def test_404_resolves_again(self):
+        """After a 404 the ids are resolved from a new fetch and the PUT is retried"""
+        session = FakeSession(statuses=[404])
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        with haanna.command_queue(load('anna_domain_objects'), backoff=0.01) as queue:
+            self.assertEqual('ok', queue.set_temperature(20.0).result(timeout=5))
+        self.assertEqual(['PUT', 'GET', 'PUT'], session.methods())
+        self.assertIsNotNone(haanna._topology)
+
+    def test_404_fetches_around_the_cache(self):
+        """After a 404 the ids are not resolved from the cached objects again"""
+        session = FakeSession(statuses=[404])
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session, cache_ttl=60)
+        root = haanna.get_domain_objects()
+        with haanna.command_queue(root, backoff=0.01) as queue:
+            self.assertEqual('ok', queue.set_temperature(20.0).result(timeout=5))
+        self.assertEqual(['GET', 'PUT', 'GET', 'PUT'], session.methods())
+
+    def test_close_without_wait(self):
+        """Closing without waiting cancels the queued changes"""
+        session = FakeSession()
+        session.gate.clear()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        queue = haanna.command_queue(load('anna_domain_objects'))
+        sending = queue.set_temperature(20.0)
+        queued = queue.set_preset('away')
+        while not sending.running():
+            time.sleep(0.01)
+        queue.close(wait=False)
+        session.gate.set()
+        self.assertEqual('ok', sending.result(timeout=5))
+        self.assertTrue(queued.cancelled())
+
+
+if __name__ == '__main__':
+    unittest.main()
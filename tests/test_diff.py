@@ -0,0 +1,60 @@
+import os
+import unittest
+
+from haanna import ChangeTracker, Haanna
+from haanna.diff import diff_measurements
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'haanna', 'fixtures')
+
+with open(os.path.join(FIXTURES, 'anna_domain_objects.xml'), encoding='utf-8') as fixture:
+    DOMAIN_OBJECTS = fixture.read()
+
+
+def changed(**replacements):
+    text = DOMAIN_OBJECTS
+    for old, new in replacements.values():
+        assert old in text
+        text = text.replace(old, new, 1)
+    return Haanna.parse_xml(text)
+
+
+class TestChangeTracker(unittest.TestCase):
+
+    def test_only_changes_are_reported(self):
+        """Unchanged updates notify nobody, changes are reported as (old, new)"""
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80)
+        tracker = ChangeTracker(haanna)
+        everything, presets = [], []
+        tracker.subscribe(everything.append)
+        unsubscribe = tracker.subscribe(presets.append, ['current_preset'])
+
+        first = tracker.update(changed())
+        self.assertEqual((None, 'home'), first.state['current_preset'])
+        self.assertFalse(tracker.update(changed()))
+        self.assertEqual(1, len(everything))
+
+        update = tracker.update(changed(temperature=('>20.62<', '>20.75<')))
+        self.assertEqual({'current_temperature': (20.62, 20.75)}, update.state)
+        self.assertEqual([('20.62', '20.75')], list(update.measurements.values()))
+        self.assertEqual(1, len(presets))
+
+        update = tracker.update(changed(
+            preset=('<measurement log_date="2020-03-24T14:00:00+01:00">home<',
+                    '<measurement log_date="2020-03-24T14:00:00+01:00">away<'),
+        ))
+        self.assertEqual(('home', 'away'), update.state['current_preset'])
+        self.assertEqual(2, len(presets))
+        unsubscribe()
+        tracker.update(changed())
+        self.assertEqual(2, len(presets))
+        self.assertEqual(4, len(everything))
+
+    def test_removed_measurement(self):
+        """A point log that disappeared is reported with None"""
+        root = changed()
+        smaller = changed()
+        for appliance in smaller.findall('appliance'):
+            smaller.remove(appliance)
+        changes = diff_measurements(root, smaller)
+        self.assertTrue(changes)
+        self.assertTrue(all(new is None for dummy, new in changes.values()))
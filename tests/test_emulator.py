@@ -0,0 +1,104 @@
+import os
+import unittest
+
+from haanna import Haanna, HaannaFleet
+from haanna.emulator import SmileEmulator, serve_fleet, stop_fleet
+from haanna.haanna import CouldNotSetTemperatureException
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'haanna', 'fixtures')
+
+
+class TestSmileEmulator(unittest.TestCase):
+
+    def emulate(self, emulator):
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        haanna = Haanna(**emulator.config())
+        self.addCleanup(haanna.close)
+        return haanna
+
+    def test_modern_setters(self):
+        """The setters change what the next fetch returns"""
+        haanna = self.emulate(SmileEmulator.from_fixture())
+        root = haanna.get_domain_objects()
+        self.assertTrue(haanna.ping_anna_thermostat())
+        self.assertEqual('home', haanna.get_current_preset(root))
+        haanna.set_temperature(root, 22.5)
+        haanna.set_preset(root, 'away')
+        haanna.set_schema_state(root, 'Zomer', 'true')
+        root = haanna.get_domain_objects()
+        self.assertEqual(22.5, haanna.get_target_temperature(root))
+        self.assertEqual('away', haanna.get_current_preset(root))
+        self.assertEqual('Zomer', haanna.get_active_schema_name(root))
+        haanna.set_schema_state(root, 'Zomer', 'false')
+        self.assertFalse(haanna.get_schema_state(haanna.get_domain_objects()))
+        self.assertEqual(5, len(haanna.get_presets(haanna.get_direct_objects())))
+
+    def test_legacy_setters(self):
+        """A legacy Anna takes the setpoint on its appliance and presets as rules"""
+        emulator = SmileEmulator.from_fixture(legacy=True)
+        haanna = self.emulate(emulator)
+        self.assertTrue(emulator.state.legacy)
+        root = haanna.get_domain_objects()
+        haanna.set_temperature(root, 18)
+        haanna.set_preset(root, 'away')
+        root = haanna.get_domain_objects()
+        self.assertEqual(18.0, haanna.get_thermostat_temperature(root))
+        self.assertEqual('true', root.find("rule[@id='3333dddd3333dddd3333dddd3333dd33']/active").text)
+
+    def test_zones(self):
+        """Each location of a multi-zone gateway is set on its own"""
+        with open(os.path.join(FIXTURES, 'adam_domain_objects.xml'), 'rb') as fixture:
+            haanna = self.emulate(SmileEmulator(fixture.read()))
+        bedroom = '4d5e6f7a8b9c4d0e8f1a2b3c4d5e6f7a'
+        root = haanna.get_domain_objects()
+        haanna.set_zone_temperature(root, bedroom, 19)
+        haanna.set_zone_preset(root, bedroom, 'home')
+        zones = haanna.get_zones(haanna.get_domain_objects())
+        self.assertEqual((19.0, 'home'), (zones[bedroom].setpoint, zones[bedroom].preset))
+        self.assertEqual(21.5, zones['0c1d2e3f4a5b4c6d8e7f8a9b0c1d2e3f'].setpoint)
+
+    def test_unknown_ids(self):
+        """An unknown thermostat is refused with a 404 and the ids are resolved again"""
+        haanna = self.emulate(SmileEmulator.from_fixture())
+        root = haanna.get_domain_objects()
+        haanna.refresh_topology(root)
+        haanna._topology.thermostat_functionality_id = 'gone'
+        with self.assertRaises(CouldNotSetTemperatureException):
+            haanna.set_temperature(root, 20)
+        haanna.set_temperature(root, 20)
+
+    def test_faults(self):
+        """Errors, dropped connections and credentials are injected"""
+        self.assertRaises(ConnectionError, self.emulate(
+            SmileEmulator.from_fixture(error_rate=1)).get_domain_objects)
+        with self.assertRaises(Exception):
+            self.emulate(SmileEmulator.from_fixture(drop_rate=1)).get_domain_objects()
+        emulator = SmileEmulator.from_fixture(credentials=('smile', 'secret'))
+        self.emulate(emulator).get_domain_objects()
+        with self.assertRaises(ConnectionError):
+            Haanna('smile', 'wrong', emulator.host, emulator.port).get_domain_objects()
+
+    def test_padding(self):
+        """Padding makes the documents larger without changing the values"""
+        plain = SmileEmulator.from_fixture()
+        padded = SmileEmulator.from_fixture(padding=200000)
+        self.addCleanup(plain.stop)
+        size = len(plain.state.body('/core/domain_objects'))
+        self.assertGreater(len(padded.state.body('/core/domain_objects')), size + 200000)
+        haanna = self.emulate(padded)
+        self.assertEqual(20.62, haanna.get_current_temperature(haanna.get_domain_objects()))
+
+    def test_fleet(self):
+        """Many gateways are served for load tests"""
+        emulators = serve_fleet(20, latency=(0.01, 0.02), seed=1)
+        self.addCleanup(stop_fleet, emulators)
+        configs = [emulator.config('gw{}'.format(index)) for index, emulator in enumerate(emulators)]
+        with HaannaFleet(configs, deadline=5) as fleet:
+            results = fleet.poll()
+        self.assertTrue(all(result.ok for result in results.values()))
+        self.assertEqual([1] * 20, [emulator.stats['GET'] for emulator in emulators])
+
+
+if __name__ == '__main__':
+    unittest.main()
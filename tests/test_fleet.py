@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+
+from haanna import HaannaFleet
+
+
+class FakeGateway:
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.polls = []
+        self.closed = False
+
+    def get_domain_objects(self, timeout=None):
+        self.polls.append(time.monotonic())
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return 'domain_objects'
+
+    def close(self):
+        self.closed = True
+
+
+class TestHaannaFleet(unittest.TestCase):
+
+    def test_poll(self):
+        """Gateways are polled in parallel and errors are returned per gateway"""
+        gateways = [('gw{}'.format(i), FakeGateway(0.1)) for i in range(20)]
+        gateways.append(('broken', FakeGateway(error=ConnectionError('offline'))))
+        with HaannaFleet(gateways, max_workers=25, deadline=1) as fleet:
+            start = time.monotonic()
+            results = fleet.poll()
+            self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(21, len(results))
+        self.assertEqual('domain_objects', results['gw3'].domain_objects)
+        self.assertFalse(results['broken'].ok)
+        self.assertIsInstance(results['broken'].error, ConnectionError)
+        self.assertTrue(gateways[0][1].closed)
+
+    def test_deadline(self):
+        """A slow gateway does not stall the sweep past the deadline"""
+        gateways = [('fast', FakeGateway()), ('slow', FakeGateway(1))]
+        with HaannaFleet(gateways, deadline=0.2) as fleet:
+            start = time.monotonic()
+            results = fleet.poll()
+            self.assertLess(time.monotonic() - start, 0.5)
+            self.assertTrue(results['fast'].ok)
+            self.assertIsInstance(results['slow'].error, TimeoutError)
+            # The slow gateway is skipped while its poll is still running
+            self.assertIsInstance(fleet.poll(['slow'])['slow'].error, TimeoutError)
+            self.assertEqual(1, len(gateways[1][1].polls))
+
+    def test_deadline_per_gateway(self):
+        """The deadline starts when a worker starts the poll of a gateway"""
+        gateways = [('gw{}'.format(i), FakeGateway(0.4)) for i in range(6)]
+        with HaannaFleet(gateways, max_workers=2, deadline=1) as fleet:
+            results = fleet.poll()
+            self.assertTrue(all(result.ok for result in results.values()))
+            self.assertTrue(all(result.ok for result in fleet.poll(['gw4', 'gw5']).values()))
+
+    def test_no_free_worker(self):
+        """Polls that wait for workers held by dead gateways are cancelled"""
+        gateways = [('dead{}'.format(i), FakeGateway(0.5)) for i in range(2)]
+        gateways += [('queued{}'.format(i), FakeGateway()) for i in range(2)]
+        with HaannaFleet(gateways, max_workers=2, deadline=0.1) as fleet:
+            start = time.monotonic()
+            results = fleet.poll()
+            self.assertLess(time.monotonic() - start, 0.3)
+            for name in ('dead0', 'dead1', 'queued0', 'queued1'):
+                self.assertIsInstance(results[name].error, TimeoutError)
+            time.sleep(0.5)
+            self.assertEqual([], gateways[2][1].polls)
+            self.assertTrue(fleet.poll(['queued0', 'queued1'])['queued0'].ok)
+
+    def test_spread_schedule(self):
+        """Polls are spread evenly over the interval"""
+        gateways = [('gw{}'.format(i), FakeGateway()) for i in range(4)]
+        results = []
+        stop = threading.Event()
+        with HaannaFleet(gateways) as fleet:
+            thread = threading.Thread(target=fleet.run, args=(0.4, results.append, stop))
+            thread.start()
+            time.sleep(0.35)
+            stop.set()
+            thread.join()
+        starts = sorted(gateway.polls[0] for dummy, gateway in gateways)
+        gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+        self.assertEqual(4, len(results))
+        for gap in gaps:
+            self.assertAlmostEqual(0.1, gap, delta=0.05)
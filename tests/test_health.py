@@ -0,0 +1,106 @@
+import time
+import unittest
+
+from fakes import FakeSession
+from haanna import CircuitBreaker, Haanna, HaannaFleet
+from haanna.health import CLOSED, HALF_OPEN, OPEN, CircuitOpenError
+
+
+class InterruptedSession(FakeSession):
+    """A gateway whose pings are interrupted while interrupt is set"""
+
+    interrupt = False
+
+    def request(self, method, url, **kwargs):
+        if self.interrupt and url.endswith('/ping'):
+            raise KeyboardInterrupt
+        return super().request(method, url, **kwargs)
+
+
+def gateway(reset_timeout=60):
+    session = InterruptedSession()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+    haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session, circuit_breaker=breaker)
+    return haanna, session, breaker
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_and_fails_fast(self):
+        """The circuit opens after failures in a row and requests fail without a request"""
+        haanna, session, breaker = gateway()
+        haanna.get_domain_objects()
+        session.offline = True
+        for dummy in range(2):
+            with self.assertRaises(ConnectionError):
+                haanna.get_domain_objects()
+        self.assertEqual(OPEN, breaker.state)
+        self.assertTrue(breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            haanna.get_domain_objects()
+        self.assertEqual(3, len(session.calls))
+        self.assertAlmostEqual(2 / 3, breaker.error_rate)
+        self.assertIsNotNone(breaker.latency)
+
+    def test_half_open_probe(self):
+        """After the reset timeout a ping decides whether the circuit closes"""
+        haanna, session, breaker = gateway(reset_timeout=0.05)
+        session.offline = True
+        for dummy in range(2):
+            with self.assertRaises(ConnectionError):
+                haanna.get_domain_objects()
+        time.sleep(0.06)
+        self.assertFalse(breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            haanna.get_domain_objects()
+        self.assertEqual(OPEN, breaker.state)
+        self.assertEqual('/ping', session.paths()[-1])
+        time.sleep(0.06)
+        session.offline = False
+        session.calls.clear()
+        self.assertIsNotNone(haanna.get_domain_objects())
+        self.assertEqual(['/ping', '/core/domain_objects'], session.paths())
+        self.assertEqual(CLOSED, breaker.state)
+        self.assertEqual(0, breaker.failures)
+
+    def test_interrupted_probe(self):
+        """A probe that does not finish opens the circuit again"""
+        haanna, session, breaker = gateway(reset_timeout=0)
+        breaker.record_failure(1.0, 'timed out')
+        breaker.record_failure(1.0, 'timed out')
+        session.interrupt = True
+        with self.assertRaises(KeyboardInterrupt):
+            haanna.get_domain_objects()
+        self.assertEqual(OPEN, breaker.state)
+        session.interrupt = False
+        self.assertIsNotNone(haanna.get_domain_objects())
+        self.assertEqual(CLOSED, breaker.state)
+
+    def test_one_probe_at_a_time(self):
+        """Requests fail fast while another one probes"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure(1.0, 'timed out')
+        self.assertTrue(breaker.acquire())
+        self.assertEqual(HALF_OPEN, breaker.state)
+        with self.assertRaises(CircuitOpenError):
+            breaker.acquire()
+        breaker.record_response(200, 0.1)
+        self.assertFalse(breaker.acquire())
+        breaker.record_response(503, 0.1)
+        self.assertEqual(OPEN, breaker.state)
+
+    def test_fleet_skips_open_gateways(self):
+        """The fleet does not poll a gateway whose circuit is open"""
+        haanna, session, breaker = gateway()
+        session.offline = True
+        breaker.record_failure(1.0, 'timed out')
+        breaker.record_failure(1.0, 'timed out')
+        with HaannaFleet([('offline', haanna)]) as fleet:
+            result = fleet.poll()['offline']
+            self.assertIs(breaker, fleet.health()['offline'])
+        self.assertIsInstance(result.error, CircuitOpenError)
+        self.assertEqual([], session.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import datetime
+import unittest
+
+from fakes import FakeSession, read_fixture
+from haanna import Haanna
+from haanna.history import iter_history
+from haanna.metrics import Metrics
+
+
+HISTORY = (
+    "<domain_objects><appliance id='a1'><type>thermostat</type><logs>"
+    "<point_log id='p1'><type>temperature</type><unit>C</unit><period>"
+    + "".join(
+        "<measurement log_date='2020-03-{:02d}T12:00:00+01:00'>{}</measurement>".format(day, 18 + day / 10)
+        for day in range(10, 0, -1)
+    )
+    + "</period></point_log>"
+    "<point_log id='p2'><type>boiler_state</type><period>"
+    "<measurement log_date='2020-03-10T12:00:00+01:00'>on</measurement>"
+    "<measurement log_date='2020-03-09T12:00:00+01:00'>off</measurement>"
+    "</period></point_log>"
+    "</logs></appliance></domain_objects>"
+).encode()
+
+
+def chunked(body, size=7):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class TestHistory(unittest.TestCase):
+
+    def test_pages(self):
+        """Measurements are collected in pages of float arrays"""
+        pages = list(iter_history(chunked(HISTORY), ['temperature'], page_size=4))
+        self.assertEqual([4, 4, 2], [len(page) for page in pages])
+        self.assertEqual('C', pages[0].unit)
+        self.assertAlmostEqual(19.0, pages[0].values[0])
+        first = datetime.datetime(2020, 3, 10, 12, tzinfo=datetime.timezone(datetime.timedelta(hours=1)))
+        self.assertEqual(first.timestamp(), pages[0].timestamps[0])
+        self.assertEqual('d', pages[0].values.typecode)
+
+    def test_range_and_states(self):
+        """The time range is applied and states become 1.0 and 0.0"""
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=FakeSession(HISTORY))
+        tz = datetime.timezone(datetime.timedelta(hours=1))
+        history = haanna.get_point_log_history(
+            ['temperature', 'boiler_state'],
+            start=datetime.datetime(2020, 3, 3, tzinfo=tz),
+            end=datetime.datetime(2020, 3, 10, tzinfo=tz),
+        )
+        self.assertEqual(7, len(history['p1']))
+        self.assertEqual([0.0], list(history['p2'].values))
+
+    def test_received_bytes(self):
+        """The bytes of the streamed history are recorded with metrics"""
+        metrics = Metrics()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=FakeSession(HISTORY), metrics=metrics)
+        haanna.get_point_log_history('temperature')
+        self.assertEqual(len(HISTORY), metrics.received['/core/domain_objects'])
+
+    def test_fixture(self):
+        """The latest measurement of the recorded fixture is found"""
+        fixture = read_fixture('anna_domain_objects').encode()
+        pages = list(iter_history(chunked(fixture, 1000), ['temperature']))
+        self.assertIn(20.62, [page.values[0] for page in pages])
@@ -0,0 +1,54 @@
+import re
+import subprocess
+import sys
+import unittest
+
+# Cumulative microseconds of `from haanna import Haanna`, several times the
+# measured time so a slow CI machine does not fail it.
+IMPORT_BUDGET_US = 100000
+HEAVY_MODULES = ('requests', 'urllib3', 'aiohttp', 'dateutil', 'pytz', 'concurrent.futures', 'lxml')
+
+
+def import_times(statement):
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True,
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)', line)
+        if match:
+            times[match.group(3)] = (int(match.group(1)), len(match.group(2)))
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_heavy_modules_are_lazy(self):
+        """Importing the package does not import the HTTP and date libraries"""
+        times = import_times('from haanna import Haanna')
+        self.assertIn('haanna.haanna', times)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_budget(self):
+        """The package and its own modules import within the budget"""
+        times = import_times('from haanna import Haanna')
+        total = sum(
+            cumulative for module, (cumulative, depth) in times.items()
+            if depth == 0 and (module == 'haanna' or module.startswith('haanna.')
+                               or module.startswith('xml.'))
+        )
+        self.assertLess(total, IMPORT_BUDGET_US)
+
+    def test_star_import_without_aiohttp(self):
+        """A star-import works without the async extra and leaves aio unimported"""
+        output = subprocess.run(
+            [sys.executable, '-c', (
+                "import sys; sys.modules['aiohttp'] = None\n"
+                "from haanna import *\n"
+                "print(Haanna.__name__, 'AsyncHaanna' in dir(), 'haanna.aio' in sys.modules)"
+            )],
+            stdout=subprocess.PIPE, universal_newlines=True, check=True,
+        ).stdout
+        self.assertEqual('Haanna False False', output.strip())
@@ -0,0 +1,50 @@
+import unittest
+
+from fakes import FakeSession
+from haanna import Haanna
+from haanna.metrics import Metrics
+
+
+class DirectOfflineSession(FakeSession):
+    """A gateway whose direct objects do not answer"""
+
+    def request(self, method, url, **kwargs):
+        if url.endswith('/core/direct_objects'):
+            raise ConnectionError('offline')
+        return super().request(method, url, **kwargs)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_endpoints_and_getters(self):
+        """Requests are recorded per endpoint, getters per name"""
+        session = DirectOfflineSession()
+        metrics = Metrics()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session, metrics=metrics)
+        haanna.ping_anna_thermostat()
+        domain_objects = haanna.get_domain_objects()
+        with self.assertRaises(ConnectionError):
+            haanna.get_direct_objects()
+        haanna.get_current_temperature(domain_objects)
+        haanna.get_current_temperature(domain_objects)
+        haanna.set_temperature(domain_objects, 20.0)
+
+        self.assertEqual(1, metrics.requests['/core/domain_objects'].count)
+        self.assertEqual(len(session.domain_objects.encode()), metrics.received['/core/domain_objects'])
+        self.assertEqual(1, metrics.parses['/core/domain_objects'].count)
+        self.assertEqual(1, metrics.statuses['/ping', '404'])
+        self.assertEqual(1, metrics.statuses['/core/direct_objects', 'error'])
+        self.assertEqual(1, metrics.statuses['/core/locations', '200'])
+        self.assertEqual(2, metrics.getters['get_current_temperature'].count)
+
+        text = haanna.get_metrics()
+        self.assertIn('# TYPE haanna_request_seconds summary', text)
+        self.assertIn('haanna_request_seconds_count{endpoint="/core/domain_objects"} 1', text)
+        self.assertIn('haanna_responses_total{endpoint="/ping",status="404"} 1', text)
+        self.assertIn('haanna_getter_seconds_count{getter="get_current_temperature"} 2', text)
+
+    def test_disabled(self):
+        """Without metrics the getters are not wrapped"""
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=FakeSession())
+        self.assertNotIn('get_current_temperature', vars(haanna))
+        self.assertIsNone(haanna.get_metrics())
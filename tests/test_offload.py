@@ -0,0 +1,65 @@
+import unittest
+
+from fakes import FakeSession, load, read_fixture
+from haanna import Haanna, HaannaFleet, ParseOffload
+
+
+def expected(name, legacy):
+    haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, legacy_anna=legacy)
+    return haanna.get_state(load(name))
+
+
+class TestParseOffload(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.offload = ParseOffload(max_workers=2, batch_size=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.offload.close()
+
+    def test_map(self):
+        """Workers return the same states as parsing in this process"""
+        modern = read_fixture('anna_domain_objects').encode()
+        legacy = read_fixture('legacy_anna_domain_objects')
+        states = self.offload.map([(modern, False), (legacy, True)] * 4)
+        self.assertEqual(8, len(states))
+        self.assertEqual(expected('anna_domain_objects', False), states[0])
+        self.assertEqual(expected('legacy_anna_domain_objects', True), states[1])
+        self.assertEqual(states[:2] * 4, states)
+
+    def test_parse_state(self):
+        """The state is parsed without a client"""
+        legacy = read_fixture('legacy_anna_domain_objects').encode()
+        self.assertEqual(
+            expected('legacy_anna_domain_objects', True), Haanna.parse_state(legacy, legacy_anna=True)
+        )
+
+    def test_submit(self):
+        """A response that is not XML fails on its own"""
+        good = self.offload.submit(read_fixture('anna_domain_objects').encode())
+        bad = self.offload.submit(b'<domain_objects>')
+        # Fewer than batch_size are sent after the linger time
+        self.assertEqual(expected('anna_domain_objects', False), good.result(timeout=30))
+        with self.assertRaises(ValueError):
+            bad.result(timeout=30)
+
+    def test_fleet(self):
+        """The fleet fetches in threads and returns the states of the workers"""
+        text = read_fixture('anna_domain_objects')
+        gateways = [
+            ('gw{}'.format(i), Haanna('smile', 'short_id', '127.0.0.1', 80, session=FakeSession(text)))
+            for i in range(5)
+        ]
+        with HaannaFleet(gateways, deadline=30, offload=self.offload) as fleet:
+            results = fleet.poll()
+        state = expected('anna_domain_objects', False)
+        for result in results.values():
+            self.assertTrue(result.ok)
+            self.assertIsNone(result.domain_objects)
+            self.assertEqual(state, result.state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from fakes import FakeSession, read_fixture
+from haanna import Haanna, UpdatePoller
+from haanna.persist import HEADER, read_snapshot
+
+
+class TestPersist(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'anna.snapshot')
+
+    def gateway(self, name='anna_domain_objects', legacy=False):
+        session = FakeSession(read_fixture(name))
+        haanna = Haanna(
+            'smile', 'short_id', '127.0.0.1', 80, legacy_anna=legacy, session=session,
+            snapshot_path=self.path,
+        )
+        return haanna, session
+
+    def test_round_trip(self):
+        """The saved values load as they were"""
+        for name, legacy in (('anna_domain_objects', False), ('legacy_anna_domain_objects', True)):
+            haanna, dummy = self.gateway(name, legacy)
+            root = haanna.get_domain_objects()
+            saved = haanna.save_snapshot(root)
+            stored = self.gateway(name, legacy)[0].load_snapshot()
+            self.assertEqual(haanna.get_state(root), stored.state)
+            self.assertEqual(saved.topology.as_dict(), stored.topology.as_dict())
+            self.assertEqual(haanna.get_schema_names(root), stored.schema_names)
+            self.assertEqual(haanna.get_presets(root), stored.presets)
+            self.assertLess(stored.age, 60)
+
+    def test_without_preset_rule(self):
+        """A gateway without the preset rule is saved without presets"""
+        haanna, dummy = self.gateway('adam_domain_objects')
+        root = haanna.get_domain_objects()
+        self.assertIsNone(haanna.save_snapshot(root).presets)
+        stored = haanna.load_snapshot()
+        self.assertIsNone(stored.presets)
+        self.assertEqual(haanna.get_state(root), stored.state)
+
+    def test_poller_saves(self):
+        """The poller saves a changed tree and keeps polling when a save fails"""
+        haanna, dummy = self.gateway('adam_domain_objects')
+        next(UpdatePoller(haanna, probe_interval=None).updates())
+        self.assertIsNotNone(read_snapshot(self.path))
+
+        def fail(root):
+            raise RuntimeError('disk full')
+
+        haanna.save_snapshot = fail
+        poller = UpdatePoller(haanna, probe_interval=None, stagger=0)
+        updates = poller.updates()
+        self.assertTrue(next(updates).stale)
+        self.assertFalse(next(updates).stale)
+        self.assertEqual(1, poller.stats['save_errors'])
+
+    def test_setter_before_fetch(self):
+        """A setter uses the saved ids before anything is fetched"""
+        haanna, dummy = self.gateway()
+        haanna.save_snapshot(haanna.get_domain_objects())
+        restarted, session = self.gateway()
+        restarted.load_snapshot()
+        restarted.set_temperature(None, 20.5)
+        self.assertEqual(1, len(session.calls))
+        self.assertEqual('PUT', session.calls[0][0])
+
+    def test_unusable(self):
+        """A missing, damaged or other version file is not loaded"""
+        self.assertIsNone(read_snapshot(self.path))
+        haanna, dummy = self.gateway()
+        haanna.save_snapshot(haanna.get_domain_objects())
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        for damaged in (b'', data[:HEADER.size + 10], data[:6] + b'\x09\x00' + data[8:]):
+            with open(self.path, 'wb') as file:
+                file.write(damaged)
+            self.assertIsNone(read_snapshot(self.path))
+
+    def test_poller_warm_start(self):
+        """The poller reports the saved values first and fetches after the stagger"""
+        haanna, dummy = self.gateway()
+        haanna.save_snapshot(haanna.get_domain_objects())
+        os.utime(self.path, (0, 0))
+        restarted, session = self.gateway()
+        poller = UpdatePoller(restarted, min_interval=10, probe_interval=None, stagger=0.1)
+        updates = []
+        thread = threading.Thread(target=poller.run, args=(updates.append,))
+        start = time.monotonic()
+        thread.start()
+        while len(updates) < 2 and time.monotonic() - start < 5:
+            time.sleep(0.01)
+        poller.stop()
+        thread.join()
+        self.assertTrue(updates[0].stale)
+        self.assertEqual(haanna.get_state(haanna.get_domain_objects()), updates[0].current)
+        self.assertFalse(updates[1].stale)
+        # Unchanged values, only the measurements are reported as fetched
+        self.assertEqual({}, updates[1].state)
+        self.assertEqual(1, poller.stats['restores'])
+        self.assertNotEqual(0, os.stat(self.path).st_mtime)
+
+
+if __name__ == '__main__':
+    unittest.main()
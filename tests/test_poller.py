@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+
+from fakes import FakeSession
+from haanna import Haanna, UpdatePoller
+
+
+class ApplyingSession(FakeSession):
+    """A gateway that applies the setpoint to the current temperature"""
+
+    def request(self, method, url, **kwargs):
+        if method == 'PUT':
+            self.domain_objects = self.domain_objects.replace('>20.62<', '>21.0<')
+        return super().request(method, url, **kwargs)
+
+
+class TestUpdatePoller(unittest.TestCase):
+
+    def start(self, poller):
+        updates = []
+        thread = threading.Thread(target=poller.run, args=(updates.append,))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(poller.stop)
+        return updates
+
+    def test_backoff(self):
+        """The interval doubles while nothing changes"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        poller = UpdatePoller(haanna, min_interval=0.02, max_interval=0.16, probe_interval=None)
+        updates = self.start(poller)
+        time.sleep(0.5)
+        poller.stop()
+        self.assertEqual(1, len(updates))
+        # 0.02 + 0.04 + 0.08 + 0.16 + 0.16 ... instead of 25 fixed polls
+        self.assertLessEqual(session.count('/core/domain_objects'), 6)
+        self.assertEqual(0.16, poller.interval)
+
+    def test_setter_wakes(self):
+        """A setter triggers a fetch right away"""
+        session = ApplyingSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        poller = UpdatePoller(haanna, min_interval=5, probe_interval=None)
+        updates = self.start(poller)
+        time.sleep(0.05)
+        root = haanna.get_domain_objects()
+        start = time.monotonic()
+        haanna.set_temperature(root, 21.0)
+        while len(updates) < 2 and time.monotonic() - start < 1:
+            time.sleep(0.005)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual((20.62, 21.0), updates[1].state['current_temperature'])
+
+    def test_probe_reconnects(self):
+        """Probes notice that an unreachable gateway is back"""
+        session = FakeSession()
+        session.offline = True
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        poller = UpdatePoller(haanna, min_interval=10, probe_interval=0.02)
+        updates = self.start(poller)
+        time.sleep(0.1)
+        self.assertFalse(poller.online)
+        self.assertEqual(1, poller.stats['errors'])
+        session.offline = False
+        time.sleep(0.1)
+        self.assertEqual(1, len(updates))
+        self.assertTrue(poller.online)
+        self.assertGreater(poller.stats['probes'], 2)
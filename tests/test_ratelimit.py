@@ -0,0 +1,93 @@
+import time
+import unittest
+
+from fakes import FakeSession
+from haanna import Haanna, Metrics, RateLimiter
+from haanna.ratelimit import (
+    BACKGROUND,
+    INTERACTIVE,
+    WRITE,
+    RateLimitedError,
+    background,
+    request_priority,
+)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_priorities(self):
+        """Writes are never delayed, reads wait and background reads are shed"""
+        limiter = RateLimiter(rate=10, burst=3, background_reserve=1, max_wait=0.25)
+        self.assertEqual(0, limiter.reserve(BACKGROUND))
+        self.assertEqual(0, limiter.reserve(BACKGROUND))
+        with self.assertRaises(RateLimitedError):
+            limiter.reserve(BACKGROUND)
+        self.assertEqual(0, limiter.reserve(INTERACTIVE))
+        self.assertAlmostEqual(0.1, limiter.reserve(INTERACTIVE), places=2)
+        self.assertEqual(0, limiter.reserve(WRITE))
+        self.assertLess(limiter.tokens, -1)
+        with self.assertRaises(RateLimitedError):
+            limiter.reserve(INTERACTIVE)
+        stats = limiter.get_stats()
+        self.assertEqual({WRITE: 0, INTERACTIVE: 1, BACKGROUND: 1}, stats['shed'])
+        self.assertEqual(1, stats['granted'][WRITE])
+        self.assertGreater(stats['wait_seconds'], 0)
+
+    def test_request_priority(self):
+        """Reads are interactive unless sent as background, changes are writes"""
+        self.assertEqual(INTERACTIVE, request_priority('GET'))
+        with background():
+            self.assertEqual(BACKGROUND, request_priority('GET'))
+            self.assertEqual(WRITE, request_priority('PUT'))
+        self.assertEqual(INTERACTIVE, request_priority('GET'))
+
+    def gateway(self, **kwargs):
+        session = FakeSession()
+        haanna = Haanna(
+            'smile', 'short_id', '127.0.0.1', 80, session=session, metrics=Metrics(),
+            rate_limiter=RateLimiter(**kwargs),
+        )
+        return haanna, session
+
+    def test_shed_without_objects(self):
+        """A shed read raises when nothing was fetched yet"""
+        haanna, session = self.gateway(burst=1, background_reserve=1)
+        with background(), self.assertRaises(RateLimitedError):
+            haanna.get_domain_objects()
+        self.assertEqual([], session.methods())
+
+    def test_shed_serves_latest(self):
+        """A shed background read returns the latest objects without a request"""
+        haanna, session = self.gateway(rate=20, burst=2, background_reserve=1)
+        root = haanna.get_domain_objects()
+        with background():
+            self.assertIs(root, haanna.get_domain_objects())
+        self.assertEqual(['GET'], session.methods())
+        haanna.set_temperature(root, 20)
+        start = time.monotonic()
+        self.assertIsNot(root, haanna.get_domain_objects())
+        self.assertGreater(time.monotonic() - start, 0.03)
+        self.assertEqual(['GET', 'PUT', 'GET'], session.methods())
+        stats = haanna.get_rate_limit_stats()
+        self.assertEqual(1, stats['delayed'][INTERACTIVE])
+        self.assertEqual(1, stats['shed'][BACKGROUND])
+        self.assertIn(
+            'haanna_rate_limited_total{priority="background",outcome="shed"} 1',
+            haanna.get_metrics(),
+        )
+
+    def test_shed_interactive_raises(self):
+        """A shed interactive read raises instead of returning the latest objects"""
+        haanna, session = self.gateway(rate=1, burst=1, max_wait=0.1)
+        before = time.time()
+        root = haanna.get_domain_objects()
+        self.assertGreaterEqual(haanna.last_fetched['/core/domain_objects'], before)
+        with self.assertRaises(RateLimitedError):
+            haanna.get_domain_objects()
+        self.assertEqual(['GET'], session.methods())
+        with background():
+            self.assertIs(root, haanna.get_domain_objects())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from fakes import FakeSession
+from haanna import Haanna
+
+
+class TestHaannaSession(unittest.TestCase):
+
+    def test_session_is_pooled(self):
+        """The default session mounts a sized adapter with the retry policy"""
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, pool_size=4, retries=2)
+        adapter = haanna._session.get_adapter('http://127.0.0.1')
+        self.assertEqual(4, adapter._pool_maxsize)
+        self.assertEqual(2, adapter.max_retries.total)
+        haanna.close()
+
+    def test_timeouts(self):
+        """The configured timeout is used unless one is given per call"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, timeout=(1, 5), session=session)
+        haanna.ping_anna_thermostat()
+        haanna.ping_anna_thermostat(timeout=2)
+        self.assertEqual((1, 5), session.kwargs[0]['timeout'])
+        self.assertEqual(2, session.kwargs[1]['timeout'])
+        self.assertEqual(('smile', 'short_id'), session.kwargs[0]['auth'])
+
+    def test_context_manager(self):
+        """Leaving the context closes an owned session but not a shared one"""
+        shared = FakeSession()
+        with Haanna('smile', 'short_id', '127.0.0.1', 80, session=shared):
+            pass
+        self.assertFalse(shared.closed)
+        with Haanna('smile', 'short_id', '127.0.0.1', 80) as haanna:
+            owned = haanna._session
+        self.assertEqual({}, owned.adapters['http://'].poolmanager.pools._container)
@@ -0,0 +1,77 @@
+import os
+import unittest
+
+from haanna import Haanna
+from haanna.snapshot import DomainSnapshot
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'haanna', 'fixtures')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name + '.xml'), encoding='utf-8') as fixture:
+        return Haanna.parse_xml(fixture.read())
+
+
+class TestDomainSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.haanna = Haanna('smile', 'short_id', '127.0.0.1', 80)
+        self.domain_objects = load_fixture('anna_domain_objects')
+
+    def test_built_once_per_tree(self):
+        """The snapshot is shared by all getters of one tree"""
+        snapshot = DomainSnapshot.of(self.domain_objects)
+        self.assertIs(snapshot, DomainSnapshot.of(self.domain_objects))
+        self.assertIsNot(snapshot, DomainSnapshot.of(load_fixture('anna_domain_objects')))
+
+    def test_indexes(self):
+        """Point logs, appliances, rules and locations are indexed"""
+        snapshot = DomainSnapshot.of(self.domain_objects)
+        self.assertEqual('d2e1c8c4c5e04e12a8aa11f8de4f0e5b', snapshot.point_log_ids['temperature'])
+        self.assertEqual('20.62', snapshot.measurement('temperature'))
+        self.assertEqual(['heater_central', 'thermostat'], sorted(snapshot.appliances))
+        self.assertEqual(['eb5309212bf5407bb143e5bfa3b18aee'], list(snapshot.locations))
+        self.assertEqual(2, len(snapshot.rule_ids_by_tag['zone_preset_based_on_time_and_presence_with_override']))
+        self.assertIsNone(snapshot.measurement('unknown'))
+
+    def test_getters(self):
+        """The getters answer from the snapshot"""
+        root = self.domain_objects
+        self.assertEqual(20.62, self.haanna.get_current_temperature(root))
+        self.assertEqual(20.5, self.haanna.get_target_temperature(root))
+        self.assertEqual('10.8', self.haanna.get_outdoor_temperature(root))
+        self.assertEqual('1.2', self.haanna.get_water_pressure(root))
+        self.assertFalse(self.haanna.get_boiler_status(root))
+        self.assertTrue(self.haanna.get_heating_status(root))
+        self.assertTrue(self.haanna.get_schema_state(root))
+        self.assertEqual('home', self.haanna.get_current_preset(root))
+        self.assertEqual('Winter', self.haanna.get_active_schema_name(root))
+        self.assertEqual('Winter', self.haanna.get_last_active_schema_name(root))
+        self.assertEqual(['Winter', 'Zomer'], self.haanna.get_schema_names(root))
+        self.assertEqual(17.0, self.haanna.get_presets(root)['away'])
+
+    def test_legacy_getters(self):
+        """The legacy Anna getters answer from the snapshot"""
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, True)
+        root = load_fixture('legacy_anna_domain_objects')
+        self.assertEqual(20.4, haanna.get_current_temperature(root))
+        self.assertEqual('none', haanna.get_current_preset(root))
+        self.assertEqual('Thuis', haanna.get_active_schema_name(root))
+        self.assertEqual(
+            {'home': 20.0, 'away': 17.0, 'asleep': 15.0, 'vacation': 15.0, 'no_frost': 10.0},
+            haanna.get_presets(root),
+        )
+        self.assertTrue(haanna.get_boiler_status(root))
+        self.assertIsNone(haanna.get_cooling_status(root))
+
+    def test_rule_index(self):
+        """Rules are indexed by name, active flag and parsed modified date"""
+        rule_index = DomainSnapshot.of(self.domain_objects).rule_index
+        winter = rule_index['d34dfe6ab90b410c98068e75de3eb631']
+        self.assertEqual('Winter', winter.name)
+        self.assertTrue(winter.active)
+        self.assertEqual(1584684885.341, winter.modified)
+        ids = ['a8f2c7e1d0b94e6fb5a4c3d2e1f0a9b8', 'd34dfe6ab90b410c98068e75de3eb631']
+        self.assertEqual('Winter', Haanna.get_last_active_name(self.domain_objects, ids))
+        self.assertEqual('Winter', Haanna.get_active_name(self.domain_objects, ids))
+        self.assertTrue(Haanna.get_active_mode(self.domain_objects, ids))
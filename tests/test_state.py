@@ -0,0 +1,43 @@
+import os
+import unittest
+
+from haanna import Haanna
+from haanna.state import ThermostatState
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'haanna', 'fixtures')
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name + '.xml'), encoding='utf-8') as fixture:
+        return Haanna.parse_xml(fixture.read())
+
+
+class TestThermostatState(unittest.TestCase):
+
+    def test_matches_getters(self):
+        """The state holds the values of the getters as floats"""
+        for name, legacy in (('anna_domain_objects', False), ('legacy_anna_domain_objects', True)):
+            haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, legacy_anna=legacy)
+            root = load(name)
+            state = haanna.get_state(root)
+            self.assertEqual(haanna.get_current_temperature(root), state.current_temperature)
+            self.assertEqual(haanna.get_thermostat_temperature(root), state.thermostat_temperature)
+            self.assertEqual(haanna.get_illuminance(root), '{:.1f}'.format(state.illuminance))
+            self.assertEqual(haanna.get_water_pressure(root), '{:.1f}'.format(state.water_pressure))
+            self.assertEqual(haanna.get_boiler_status(root), state.boiler_status)
+            self.assertEqual(haanna.get_heating_status(root), state.heating_status)
+            self.assertEqual(haanna.get_domestic_hot_water_status(root), state.domestic_hot_water_status)
+            self.assertEqual(haanna.get_schema_state(root), state.schema_state)
+            self.assertEqual(haanna.get_current_preset(root), state.current_preset)
+            self.assertEqual(haanna.get_active_schema_name(root), state.active_schema)
+
+    def test_compare(self):
+        """States of unchanged updates are equal"""
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80)
+        state = haanna.get_state(load('anna_domain_objects'))
+        self.assertEqual(state, haanna.get_state(load('anna_domain_objects')))
+        changed = ThermostatState(*state.values())
+        changed.current_temperature += 0.1
+        self.assertNotEqual(state, changed)
+        self.assertFalse(hasattr(state, '__dict__'))
+        self.assertEqual(20.62, state.as_dict()['current_temperature'])
@@ -0,0 +1,57 @@
+import os
+import re
+import unittest
+
+from haanna import Haanna
+from haanna.stream import AmpersandEscaper, escape_ampersands, parse_stream
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'haanna', 'fixtures')
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestStreamingParser(unittest.TestCase):
+
+    def test_ampersands_across_chunks(self):
+        """Illegal &-characters are escaped wherever the chunks are split"""
+        data = b'<a>&& &x;&#38; a & b &</a>'
+        expected = re.sub(rb'&([^a-zA-Z#])', rb'&amp;\1', data)
+        for size in range(1, len(data) + 1):
+            escaper = AmpersandEscaper()
+            escaped = b''.join(escaper.feed(chunk) for chunk in chunked(data, size))
+            self.assertEqual(expected, escaped + escaper.flush())
+
+    def test_escape_bytes(self):
+        """Bytes without illegal &-characters are not copied, others are escaped"""
+        clean = b'<a>&amp; &#38; &x;</a>'
+        self.assertIs(clean, escape_ampersands(clean))
+        self.assertEqual(b'<a>a &amp; b &amp;1</a>', escape_ampersands(b'<a>a & b &1</a>'))
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80)
+        text = '<a><name>Caf\u00e9 & bar</name></a>'
+        for data in (text, text.encode()):
+            self.assertEqual('Caf\u00e9 & bar', haanna.parse_xml(data).findtext('name'))
+
+    def test_pruned_tree(self):
+        """Only the elements the getters read are kept"""
+        with open(os.path.join(FIXTURES, 'anna_domain_objects.xml'), 'rb') as fixture:
+            data = fixture.read()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80)
+        buffered = haanna.parse_xml(data.decode())
+        for size in (1, 17, 4096):
+            streamed = parse_stream(chunked(data, size))
+            self.assertIsNone(streamed.find('gateway'))
+            for getter in ('get_current_temperature', 'get_outdoor_temperature',
+                           'get_water_pressure', 'get_heating_status', 'get_presets',
+                           'get_active_schema_name', 'get_current_preset'):
+                self.assertEqual(getattr(haanna, getter)(buffered), getattr(haanna, getter)(streamed))
+
+    def test_history_is_dropped(self):
+        """Older measurements of a period are dropped while parsing"""
+        data = (b'<domain_objects><appliance id="a"><type>thermostat</type><logs>'
+                b'<point_log id="p"><type>temperature</type><period>'
+                + b''.join(b'<measurement>%d</measurement>' % i for i in range(100))
+                + b'</period></point_log></logs></appliance></domain_objects>')
+        root = parse_stream(chunked(data, 64))
+        self.assertEqual(['0'], [m.text for m in root.iter('measurement')])
@@ -0,0 +1,46 @@
+import unittest
+
+from fakes import FakeSession, load
+from haanna import Haanna
+from haanna.haanna import CouldNotSetTemperatureException
+from haanna.topology import Topology
+
+
+class TestTopology(unittest.TestCase):
+
+    def test_ids(self):
+        """The ids of the thermostat location and the rules are resolved"""
+        topology = Topology(load('anna_domain_objects'))
+        self.assertEqual('eb5309212bf5407bb143e5bfa3b18aee', topology.location_id)
+        self.assertEqual('Living room', topology.location_name)
+        self.assertEqual('building', topology.location_type)
+        self.assertIsNotNone(topology.thermostat_functionality_id)
+        self.assertEqual('d34dfe6ab90b410c98068e75de3eb631', topology.rule_ids_by_name['Winter'])
+        legacy = Topology(load('legacy_anna_domain_objects'))
+        self.assertEqual('3333dddd3333dddd3333dddd3333dd33', legacy.preset_rule_ids['away'])
+
+    def test_setters_resolve_once(self):
+        """The setters resolve the ids once and send only the PUT"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        haanna.set_preset(load('anna_domain_objects'), 'away')
+        topology = haanna._topology
+        haanna.set_temperature(load('anna_domain_objects'), 20.0)
+        haanna.set_schema_state(load('anna_domain_objects'), 'Winter', 'false')
+        self.assertIs(topology, haanna._topology)
+        self.assertEqual(['PUT'] * 3, session.methods())
+
+    def test_miss_and_404_resolve_again(self):
+        """An unknown schema or a 404 resolves the ids again"""
+        session = FakeSession()
+        haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=session)
+        domain_objects = load('anna_domain_objects')
+        topology = haanna.refresh_topology(domain_objects)
+        del topology.rule_ids_by_name['Zomer']
+        haanna.set_schema_state(domain_objects, 'Zomer', 'true')
+        self.assertIsNot(topology, haanna._topology)
+        self.assertIn(';id=a8f2c7e1d0b94e6fb5a4c3d2e1f0a9b8', session.calls[0][1])
+        session.put_status = 404
+        with self.assertRaises(CouldNotSetTemperatureException):
+            haanna.set_temperature(domain_objects, 20.0)
+        self.assertIsNone(haanna._topology)
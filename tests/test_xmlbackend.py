@@ -0,0 +1,104 @@
+import importlib.util
+import os
+import unittest
+
+from haanna import Haanna
+from haanna.history import iter_history
+from haanna.stream import parse_stream
+from haanna.topology import Topology
+from haanna.xmlbackend import get_backend
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'haanna', 'fixtures')
+HAS_LXML = importlib.util.find_spec('lxml') is not None
+
+GETTERS = (
+    'get_presets',
+    'get_schema_names',
+    'get_active_schema_name',
+    'get_last_active_schema_name',
+    'get_schema_state',
+    'get_current_preset',
+    'get_schedule_temperature',
+    'get_current_temperature',
+    'get_target_temperature',
+    'get_thermostat_temperature',
+    'get_outdoor_temperature',
+    'get_illuminance',
+    'get_boiler_temperature',
+    'get_water_pressure',
+    'get_boiler_status',
+    'get_heating_status',
+    'get_cooling_status',
+    'get_domestic_hot_water_status',
+)
+
+
+def read(name):
+    with open(os.path.join(FIXTURES, name + '.xml'), encoding='utf-8') as fixture:
+        return fixture.read()
+
+
+def chunked(data, size):
+    return [data[index:index + size] for index in range(0, len(data), size)]
+
+
+def sweep(haanna, root):
+    values = {name: getattr(haanna, name)(root) for name in GETTERS}
+    values['state'] = haanna.get_state(root).values()
+    topology = Topology(root)
+    values['topology'] = (
+        topology.location_id, topology.thermostat_functionality_id,
+        topology.rule_ids_by_name, topology.preset_rule_ids,
+    )
+    return values
+
+
+class TestXmlBackend(unittest.TestCase):
+
+    def test_unknown(self):
+        """An unknown backend name is refused"""
+        with self.assertRaises(ValueError):
+            get_backend('sax')
+        self.assertEqual('etree', get_backend('etree').name)
+
+    @unittest.skipUnless(HAS_LXML, 'lxml is not installed')
+    def test_default(self):
+        """lxml is used when it is installed"""
+        self.assertEqual('lxml', get_backend().name)
+        self.assertEqual('lxml', Haanna('smile', 'short_id', '127.0.0.1', 80).xml_backend)
+
+    @unittest.skipUnless(HAS_LXML, 'lxml is not installed')
+    def test_getter_parity(self):
+        """Every getter returns the same with lxml and ElementTree"""
+        for name, legacy in (('anna_domain_objects', False), ('legacy_anna_domain_objects', True)):
+            # An illegal ampersand, as some gateways send in names
+            text = read(name).replace('<name>Anna</name>', '<name>Anna & more</name>')
+            results = []
+            for backend in ('etree', 'lxml'):
+                haanna = Haanna(
+                    'smile', 'short_id', '127.0.0.1', 80, legacy_anna=legacy, xml_backend=backend
+                )
+                results.append(sweep(haanna, Haanna.parse_xml(text, backend)))
+                streamed = parse_stream(chunked(text.encode(), 100), backend=backend)
+                results.append(sweep(haanna, streamed))
+            for result in results[1:]:
+                self.assertEqual(results[0], result)
+
+    @unittest.skipUnless(HAS_LXML, 'lxml is not installed')
+    def test_history_parity(self):
+        """The history pages are the same with lxml and ElementTree"""
+        data = read('anna_domain_objects').encode()
+        pages = {}
+        for backend in ('etree', 'lxml'):
+            pages[backend] = [
+                (page.point_log_id, page.log_type, page.unit, list(page.timestamps), list(page.values))
+                for page in iter_history(
+                    chunked(data, 100), ['temperature', 'thermostat'], backend=backend
+                )
+            ]
+        self.assertTrue(pages['etree'])
+        self.assertEqual(pages['etree'], pages['lxml'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+from fakes import FakeSession, load
+from haanna import Haanna
+from haanna.haanna import (
+    CouldNotSetPresetException,
+    CouldNotSetTemperatureException,
+    RuleIdNotFoundException,
+)
+
+LIVING = '0c1d2e3f4a5b4c6d8e7f8a9b0c1d2e3f'
+BEDROOM = '4d5e6f7a8b9c4d0e8f1a2b3c4d5e6f7a'
+HOME = 'a1b2c3d4e5f64a7b8c9d0e1f2a3b4c5d'
+
+
+class TestZones(unittest.TestCase):
+
+    def setUp(self):
+        self.session = FakeSession()
+        self.haanna = Haanna('smile', 'short_id', '127.0.0.1', 80, session=self.session)
+        self.root = load('adam_domain_objects')
+
+    def test_zones(self):
+        """Every location is a zone with its own measurements and thermostats"""
+        zones = self.haanna.get_zones(self.root)
+        self.assertEqual({HOME, LIVING, BEDROOM}, set(zones))
+        living = zones[LIVING]
+        self.assertEqual(('Living room', 'home', 21.5, 20.9), (
+            living.name, living.preset, living.setpoint, living.temperature))
+        self.assertEqual('Living schedule', living.active_schema)
+        self.assertEqual(['1f2e3d4c5b6a47988a7b6c5d4e3f2a1b'], living.thermostat_ids)
+        bedroom = zones[BEDROOM]
+        # Measured by the radiator valve, its schedule is not active
+        self.assertEqual((16.0, 17.3, None), (
+            bedroom.setpoint, bedroom.temperature, bedroom.active_schema))
+        self.assertIsNone(zones[HOME].functionality_id)
+        self.assertIs(zones, self.haanna.get_zones(self.root))
+
+    def test_lookups(self):
+        """Zones and thermostats are looked up by id"""
+        self.assertEqual('Bedroom', self.haanna.get_zone(self.root, BEDROOM).name)
+        self.assertIsNone(self.haanna.get_zone(self.root, 'unknown'))
+        self.assertEqual({
+            '1f2e3d4c5b6a47988a7b6c5d4e3f2a1b': LIVING,
+            '5e6f7a8b9c0d4e1f8a2b3c4d5e6f7a8b': BEDROOM,
+        }, self.haanna.get_thermostats(self.root))
+
+    def test_single_zone(self):
+        """An Anna has one zone with a thermostat"""
+        root = load('anna_domain_objects')
+        zones = [zone for zone in self.haanna.get_zones(root).values() if zone.thermostat_ids]
+        self.assertEqual(1, len(zones))
+        self.assertEqual(
+            self.haanna.get_current_temperature(root), zones[0].temperature)
+
+    def test_set_zone_temperature(self):
+        """The setpoint goes to the thermostat functionality of the location"""
+        self.haanna.set_zone_temperature(self.root, BEDROOM, 18.5)
+        self.assertEqual([(
+            'PUT',
+            '/core/locations;id={}/thermostat;id=6f7a8b9c0d1e4f2a8b3c4d5e6f7a8b9c'.format(BEDROOM),
+            '<thermostat_functionality><setpoint>18.5</setpoint></thermostat_functionality>',
+        )], self.session.calls)
+        with self.assertRaises(CouldNotSetTemperatureException):
+            self.haanna.set_zone_temperature(self.root, HOME, 18.5)
+        with self.assertRaises(CouldNotSetTemperatureException):
+            self.haanna.set_zone_temperature(self.root, 'unknown', 18.5)
+
+    def test_set_zone_preset(self):
+        """The preset goes to the location"""
+        self.haanna.set_zone_preset(self.root, LIVING, 'away')
+        dummy, uri, data = self.session.calls[0]
+        self.assertEqual('/core/locations;id=' + LIVING, uri)
+        self.assertIn('<name>Living room</name><type>livingroom</type><preset>away</preset>', data)
+        self.session.put_status = 500
+        with self.assertRaises(CouldNotSetPresetException):
+            self.haanna.set_zone_preset(self.root, LIVING, 'away')
+
+    def test_set_zone_schema_state(self):
+        """Only a schema of the location is switched"""
+        self.haanna.set_zone_schema_state(self.root, BEDROOM, 'Bedroom schedule', 'true')
+        dummy, uri, data = self.session.calls[0]
+        self.assertEqual('/core/rules;id=6d7e8f9a0b1c4d2e8f3a4b5c6d7e8f9a', uri)
+        self.assertIn('<active>true</active>', data)
+        with self.assertRaises(RuleIdNotFoundException):
+            self.haanna.set_zone_schema_state(self.root, BEDROOM, 'Living schedule', 'true')
+
+
+if __name__ == '__main__':
+    unittest.main()